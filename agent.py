@@ -3,46 +3,98 @@ agent.py
 
 Main orchestration script for the Multi-Agent System using Google ADK.
 - Loads environment variables and sub-agents.
-- Defines a master planner agent to generate execution plans.
-- Implements a dynamic orchestrator to run sub-agents in sequence.
-- Sets up the runner and session for the application.
+- Defines a master planner agent to generate execution plans, with a local fast path.
+- Implements a dynamic orchestrator to run sub-agents as a dependency graph.
+- Sets up the runner and the persistent, per-user session store for the application.
+- Records every turn as a trace with a per-turn token and latency summary.
+- Streams a turn to the client: step progress, then the answer as it is generated.
 """
 
 # --- Import Statements ---
 import sys
 import os
+import time
+import asyncio
+import logging
+import warnings
+import dataclasses
 from dotenv import load_dotenv
 import json
-from typing import AsyncGenerator, List
+from typing import Any, AsyncGenerator, Callable, Dict, List, Optional
 from typing_extensions import override
 from google.adk.agents import BaseAgent, SequentialAgent, LlmAgent
 from google.adk.agents.invocation_context import InvocationContext
-from google.adk.events import Event
+from google.adk.events import Event, EventActions
 import json
 from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
+from google.adk.sessions import Session
 
 # --- Constants ---
 APP_NAME = "google_adk_app"
+# Default user and session for local runs (see get_or_create_session).
 USER_ID = "12345"
 SESSION_ID = "123344"
 PLANNER_MODEL_NAME = "gemini-2.0-flash"
+# "dag" runs independent plan steps concurrently, "sequential" runs them one by one.
+DEFAULT_EXECUTION_MODE = "dag"
+# Rule-based plans below this confidence fall back to the LLM planner (set above 1 to disable).
+DEFAULT_PLAN_RESOLVER_MIN_CONFIDENCE = 0.8
+# When enabled, plan steps may carry tool arguments and tool agents skip their own LLM turn.
+DIRECT_TOOL_CALLS = os.getenv("DIRECT_TOOL_CALLS", "true").lower() not in ("0", "false", "no", "off")
+# Upper bound on a user turn, in seconds (0 disables). Data-gathering steps must finish
+# SUMMARY_RESERVE_SECONDS before it, so the summarizer can still answer in time.
+DEFAULT_TURN_DEADLINE_SECONDS = 45.0
+DEFAULT_SUMMARY_RESERVE_SECONDS = 10.0
+# While the planner LLM runs, prefetch the launch/news requests the query probably needs.
+SPECULATIVE_PREFETCH = os.getenv("SPECULATIVE_PREFETCH", "true").lower() not in ("0", "false", "no", "off")
+# Rule-based candidates below this confidence are not prefetched.
+DEFAULT_PREFETCH_MIN_CONFIDENCE = 0.4
+# When enabled, each model call gets a bounded window of the conversation plus a digest
+# of older turns instead of the whole session history.
+HISTORY_WINDOW = os.getenv("HISTORY_WINDOW", "true").lower() not in ("0", "false", "no", "off")
+# When enabled, a sub-agent's module (and its tools' dependencies) is imported the first
+# time a plan needs it; otherwise every sub-agent is loaded at import.
+LAZY_AGENTS = os.getenv("LAZY_AGENTS", "true").lower() not in ("0", "false", "no", "off")
+
+logger = logging.getLogger(__name__)
 
 # --- Environment Setup ---
-print("Attempting to load .env file from coordinator_file.py...")
+# Logging and warnings are configured once here, not by each sub-agent module.
+# LOG_LEVEL=INFO shows the progress lines (turn summaries, skipped steps, digests...).
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "ERROR").upper())
+warnings.filterwarnings("ignore")
+
 dotenv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
 if os.path.exists(dotenv_path):
     load_dotenv(dotenv_path)
-    print(f".env file found at {dotenv_path} and loaded.")
+    logger.info(".env file found at %s and loaded.", dotenv_path)
     # ... (API key checks) ...
 else:
-    print(f"⚠️ .env file not found at {dotenv_path}.")
+    logger.warning(".env file not found at %s.", dotenv_path)
 
 # Add the current directory to sys.path to allow local imports
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-# --- Sub-Agent Imports ---
-from sub_agents import launches_agent, weather_agent, summarizer_agent, news_agent
+# --- Sub-Agent Registry ---
+# Sub-agents are loaded through the registry, on first use unless LAZY_AGENTS is off.
+from sub_agents import AgentRegistry, registry as agent_registry
+from utils import get_gazetteer, get_http_client, get_response_cache, get_session_service, mark, setup_telemetry
+from orchestration import (
+    STEP_COMPLETED,
+    HistoryManager,
+    HistoryPolicy,
+    PlanResolver,
+    PrefetchSpec,
+    SpeculativePrefetch,
+    build_plan_graph,
+    is_streaming,
+    prepare_direct_call,
+    progress_event,
+    run_direct_tool,
+    run_plan_graph,
+    stream_turn,
+    turn_state_keys,
+)
  
 # --- Master Planner Agent ---
 MASTER_PLANNER_INSTRUCTION = """
@@ -72,98 +124,287 @@ Examples:
   Output Plan: ["summarizer_agent"]
 
 Consider ONLY the most recent user query to make your plan.
+{tool_args_section}
+Output Plan (JSON list of agent names{output_suffix}):
+"""
 
-Output Plan (JSON list of agent names):
+# Appended to the planner instruction when DIRECT_TOOL_CALLS is enabled.
+PLANNER_TOOL_ARGS_INSTRUCTION = """
+Tool Arguments:
+Instead of a plain agent name, a plan entry may be an object that also gives the arguments of that agent's tool, so the tool can be called directly. Prefer objects whenever the arguments are clear from the query:
+- 'launches_agent' -> {"agent": "launches_agent", "tool_args": {"agency": "<agency in lowercase, default 'spacex'>", "time_filter": "upcoming" | "past" | "first", "count": <number of launches, default 1>}}
+- 'news_agent' -> {"agent": "news_agent", "tool_args": {"q": "<search keywords without the word 'news'>", "language": "en", "sort_by": "publishedAt" | "relevancy" | "popularity", "page_size": <number of articles, default 5>}}
+  If the plan also contains 'launches_agent', use "q": "$state.launch_info.0.name".
+- 'weather_agent' -> only when the plan also contains 'launches_agent':
+  {"agent": "weather_agent", "tool_args": {"lat": "$state.launch_info.0.latitude", "lon": "$state.launch_info.0.longitude", "date": "$state.launch_info.0.launch_date"}}
+  If the plan asks for more than one launch, get the weather for all of them in one call instead:
+  {"agent": "weather_agent", "tool_args": {"locations": "$state.launch_info"}}
+  Otherwise use the plain name "weather_agent".
+- 'summarizer_agent' is always a plain name.
+
+Example with tool arguments:
+- If the user's current query is "Some news on the latest SpaceX launch.",
+  Output Plan: [{"agent": "launches_agent", "tool_args": {"agency": "spacex", "time_filter": "past", "count": 1}}, {"agent": "news_agent", "tool_args": {"q": "$state.launch_info.0.name", "language": "en", "sort_by": "publishedAt", "page_size": 5}}, "summarizer_agent"]
 """
+# Resolves common queries locally so the planner LLM call can be skipped.
+plan_resolver = PlanResolver(
+    min_confidence=float(os.getenv("PLAN_RESOLVER_MIN_CONFIDENCE", DEFAULT_PLAN_RESOLVER_MIN_CONFIDENCE)),
+    emit_tool_args=DIRECT_TOOL_CALLS,
+)
+
+def sub_agent_function(agent_name: str, function_name: str) -> Callable[..., Any]:
+    """Returns a function of a sub-agent's module that loads the agent when first called."""
+    def call(*args: Any, **kwargs: Any) -> Any:
+        return getattr(agent_registry.module(agent_name), function_name)(*args, **kwargs)
+    call.__name__ = function_name
+    return call
+
+# Starts the probable tool requests while the planner LLM runs; tools pick them up.
+speculative_prefetch = SpeculativePrefetch(
+    plan_resolver,
+    specs={
+        "launches_agent": PrefetchSpec(
+            "spacedevs", sub_agent_function("launches_agent", "launch_request"), sub_agent_function("launches_agent", "request_launches")
+        ),
+        "news_agent": PrefetchSpec(
+            "newsapi", sub_agent_function("news_agent", "news_request"), sub_agent_function("news_agent", "request_news")
+        ),
+    },
+    min_confidence=float(os.getenv("PREFETCH_MIN_CONFIDENCE", DEFAULT_PREFETCH_MIN_CONFIDENCE)),
+)
+
+# Per-agent history budgets (override with e.g. HISTORY_BUDGET_SUMMARIZER_AGENT = 6000/4).
+# Plan-aware pruning gives each agent only the tool results its plan step reads.
+history_manager = HistoryManager(
+    policies={
+        "MasterPlannerAgent": HistoryPolicy(max_tokens=1000, max_turns=2),
+        "launches_agent": HistoryPolicy(max_tokens=1500, max_turns=2),
+        "weather_agent": HistoryPolicy(max_tokens=1500, max_turns=2),
+        "news_agent": HistoryPolicy(max_tokens=1500, max_turns=2),
+        "summarizer_agent": HistoryPolicy(max_tokens=4000, max_turns=3),
+    },
+    planner_name="MasterPlannerAgent",
+    plan_aware=os.getenv("PLAN_AWARE_CONTEXT", "true").lower() not in ("0", "false", "no", "off"),
+)
+
 master_planner_agent = LlmAgent(
     model=PLANNER_MODEL_NAME,
     name="MasterPlannerAgent",
-    instruction=MASTER_PLANNER_INSTRUCTION,
+    instruction=MASTER_PLANNER_INSTRUCTION.format(
+        tool_args_section=PLANNER_TOOL_ARGS_INSTRUCTION if DIRECT_TOOL_CALLS else "",
+        output_suffix=" or step objects" if DIRECT_TOOL_CALLS else "",
+    ),
     description="Analyzes user query and creates an execution plan string.",
-    output_key="agent_execution_plan_str" # Output is the JSON string of the plan
+    output_key="agent_execution_plan_str", # Output is the JSON string of the plan
+    before_agent_callback=([history_manager.before_turn_callback] if HISTORY_WINDOW else [])
+        + [plan_resolver.before_planner_callback]
+        + ([speculative_prefetch.before_planner_callback] if SPECULATIVE_PREFETCH else []),
+    after_agent_callback=plan_resolver.after_planner_callback,
 )
-print(f"✅ MasterPlannerAgent '{master_planner_agent.name}' created.")
+logger.info("MasterPlannerAgent '%s' created.", master_planner_agent.name)
+
+if HISTORY_WINDOW:
+    history_manager.attach(master_planner_agent)
+    agent_registry.on_load(history_manager.attach)
 
 # --- Dynamic Orchestrator Agent ---
 class DynamicOrchestratorAgent(BaseAgent):
     """
     Reads a JSON list of agent-names from ctx.session.state['agent_execution_plan_str'],
-    then runs each named sub-agent in sequence, carrying forward the entire session state
+    then runs the named sub-agents, carrying forward the entire session state
     (including the original user query).
+
+    Sub-agents come from the agent registry, which loads each one the first time a
+    plan names it; it then becomes one of this agent's sub_agents.
+
+    In "dag" mode the plan is treated as a dependency graph: steps that do not depend
+    on each other (e.g. weather_agent and news_agent after launches_agent) run
+    concurrently, and summarizer_agent waits for all of them. In "sequential" mode
+    every step runs strictly after the previous one.
+
+    Steps that carry 'tool_args' call their agent's tool directly (no LLM turn) when
+    direct_tool_calls is enabled, and fall back to the agent itself otherwise.
+
+    The turn has a deadline of turn_deadline_seconds from the user's message. Data
+    steps still running summary_reserve_seconds before it are cancelled, later ones
+    are skipped, and the outcome of every step is written to state['step_outcomes']
+    before summarizer_agent runs, so it can answer from partial data.
+
+    Requests prefetched while the planner ran are settled against the final plan
+    and whatever the tools did not use is cancelled when the plan is done.
+
+    In streaming mode a progress event is sent as each data step finishes, and the
+    summarizer's partial events are forwarded as they arrive.
     """
 
-    # Declare each possible sub-agent as a field so Pydantic can wire them up:
-    launches_agent: LlmAgent
-    weather_agent:  LlmAgent
-    summarizer_agent:  LlmAgent
-    news_agent: LlmAgent
-    # …and any others (if adding more sub-agents in the future, add them here)
+    # The sub-agents plans can name (add new ones to sub_agents.AGENT_MODULES):
+    agents: AgentRegistry
+    execution_mode: str = "dag"
+    direct_tool_calls: bool = True
+    turn_deadline_seconds: float = DEFAULT_TURN_DEADLINE_SECONDS
+    summary_reserve_seconds: float = DEFAULT_SUMMARY_RESERVE_SECONDS
+    speculative_prefetch: Optional[SpeculativePrefetch] = None
 
     model_config = {"arbitrary_types_allowed": True}
 
     def __init__(
         self,
         name: str,
-        launches_agent: LlmAgent,
-        weather_agent: LlmAgent,
-        summarizer_agent: LlmAgent,
-        news_agent: LlmAgent
-        # …pass any future agents here too
+        agents: AgentRegistry,
+        execution_mode: str = "dag",
+        direct_tool_calls: bool = True,
+        turn_deadline_seconds: float = DEFAULT_TURN_DEADLINE_SECONDS,
+        summary_reserve_seconds: float = DEFAULT_SUMMARY_RESERVE_SECONDS,
+        speculative_prefetch: Optional[SpeculativePrefetch] = None,
     ):
-        # Build the list of sub_agents for the ADK framework:
-        sub_agents_list = [launches_agent, weather_agent, news_agent, summarizer_agent]
         super().__init__(
             name=name,
-            launches_agent=launches_agent,
-            weather_agent=weather_agent,
-            news_agent=news_agent,
-            summarizer_agent=summarizer_agent,
-            sub_agents=sub_agents_list,
+            agents=agents,
+            execution_mode=execution_mode,
+            direct_tool_calls=direct_tool_calls,
+            turn_deadline_seconds=turn_deadline_seconds,
+            summary_reserve_seconds=summary_reserve_seconds,
+            speculative_prefetch=speculative_prefetch,
+        )
+        # Loaded sub-agents join the ADK agent tree (the already loaded ones right away).
+        agents.on_load(self._adopt)
+
+    def _adopt(self, agent: BaseAgent):
+        if agent.parent_agent is None:
+            agent.parent_agent = self
+            self.sub_agents.append(agent)
+
+    def _resolve_agent(self, agent_name: str):
+        """Looks up a plan step's sub-agent by name (loading it on first use), or None if it is unknown."""
+        agent = self.agents.get(agent_name)
+        return agent if isinstance(agent, BaseAgent) else None
+
+    def _start_step(self, step, ctx: InvocationContext, dependency_outcomes: Dict[str, str]):
+        """Starts a plan step, calling its tool directly when the plan supplied arguments."""
+        agent = self._resolve_agent(step.agent_name)
+        if agent is None:
+            return None
+        if self.direct_tool_calls:
+            # "$state." arguments may only read what a completed dependency wrote this turn.
+            fresh_keys = turn_state_keys(ctx, dependency_outcomes)
+            direct_call = prepare_direct_call(agent, step, ctx.session.state, fresh_keys)
+            if direct_call is not None:
+                func, args = direct_call
+                return run_direct_tool(agent, func, args, ctx, fallback=lambda: agent.run_async(ctx))
+        return agent.run_async(ctx)
+
+    def _step_deadline(self, ctx: InvocationContext) -> Optional[float]:
+        """Returns the time.monotonic() deadline for data steps, or None if disabled."""
+        if self.turn_deadline_seconds <= 0:
+            return None
+        # The turn started when the user's message was appended, before planning.
+        started = next(
+            (event.timestamp for event in ctx.session.events if event.invocation_id == ctx.invocation_id),
+            time.time(),
         )
-        
+        budget = self.turn_deadline_seconds - self.summary_reserve_seconds
+        return time.monotonic() + (started + budget - time.time())
+
+    def _on_step_done(self, ctx: InvocationContext, step, outcome: str) -> Optional[Event]:
+        """Tells a streaming client that a data step finished (e.g. "Launch data ready")."""
+        return progress_event(ctx, self.name, step, outcome) if is_streaming(ctx) else None
+
+    def _on_data_steps_done(self, ctx: InvocationContext, outcomes: Dict[str, str]) -> Event:
+        """Drops unused prefetches and records the step outcomes for summarizer_agent."""
+        if self.speculative_prefetch is not None:
+            self.speculative_prefetch.finish(ctx.invocation_id)
+        degraded = {name: outcome for name, outcome in outcomes.items() if outcome != STEP_COMPLETED}
+        if degraded:
+            logger.warning("Answering from partial data: %s", degraded)
+        return Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            actions=EventActions(state_delta={"step_outcomes": outcomes}),
+        )
+
     @override
     async def _run_async_impl(
         self, ctx: InvocationContext
     ) -> AsyncGenerator[Event, None]:
        
-        # 1) Parse the plan string into a Python list
+        # 1) Parse the plan string into a dependency graph of steps
         plan_str = ctx.session.state.get("agent_execution_plan_str", "[]")
         try:
-            plan: List[str] = json.loads(plan_str)
-        except json.JSONDecodeError:
+            steps = build_plan_graph(plan_str)
+        except ValueError:
             # If plan is malformed, bail out
+            if self.speculative_prefetch is not None:
+                self.speculative_prefetch.finish(ctx.invocation_id)
             return
 
-        # 2) For each agent name in the plan, look up the attribute and invoke it
-        for agent_name in plan:
-            agent = getattr(self, agent_name, None)
-            if agent is None:
-                # optionally log or yield an error event here
-                continue
+        # Keep only the prefetched requests this plan can use
+        if self.speculative_prefetch is not None:
+            self.speculative_prefetch.settle(ctx.invocation_id, steps)
 
-            # Yield all events from that agent
-            async for event in agent.run_async(ctx):
-                yield event
+        # 2a) Sequential mode: chain the steps so each one waits for the previous one
+        if self.execution_mode == "sequential":
+            steps = [
+                dataclasses.replace(step, depends_on=(steps[i - 1].index,) if i else ())
+                for i, step in enumerate(steps)
+            ]
+
+        # 2b) Run the graph: independent steps run concurrently, merging their events,
+        #     and data steps stop at the turn deadline
+        async for event in run_plan_graph(
+            steps,
+            self._start_step,
+            ctx,
+            branch_root=self.name,
+            deadline=self._step_deadline(ctx),
+            on_outcomes=lambda outcomes: self._on_data_steps_done(ctx, outcomes),
+            on_step_done=lambda step, outcome: self._on_step_done(ctx, step, outcome),
+        ):
+            yield event
 
 
 orchestrator_agent = DynamicOrchestratorAgent(
     name="DynamicOrchestratorAgent",
-    launches_agent = launches_agent,
-    weather_agent =  weather_agent,
-    news_agent = news_agent,
-    summarizer_agent = summarizer_agent,
+    agents = agent_registry,
+    execution_mode = os.getenv("ORCHESTRATOR_EXECUTION_MODE", DEFAULT_EXECUTION_MODE),
+    direct_tool_calls = DIRECT_TOOL_CALLS,
+    turn_deadline_seconds = float(os.getenv("TURN_DEADLINE_SECONDS", DEFAULT_TURN_DEADLINE_SECONDS)),
+    summary_reserve_seconds = float(os.getenv("SUMMARY_RESERVE_SECONDS", DEFAULT_SUMMARY_RESERVE_SECONDS)),
+    speculative_prefetch = speculative_prefetch if SPECULATIVE_PREFETCH else None,
 )
+if not LAZY_AGENTS:
+    agent_registry.load_all()
 
 
 # --- Runner and Session Setup ---
-session_service = InMemorySessionService()
+# Sessions persist per user in SQLite (SESSION_STORE_PATH) and are loaded on first use.
+session_service = get_session_service()
+# Spans of every turn (ADK's agent/LLM/tool spans plus plan steps and HTTP requests) go
+# to TELEMETRY_PATH, with a one-line token and latency summary per turn.
+telemetry_recorder = setup_telemetry()
+
+
+async def get_or_create_session(user_id: str = USER_ID, session_id: str = SESSION_ID) -> Session:
+    """
+    Returns a user's session, creating it on first use.
+
+    Args:
+        user_id (str): The user's id (defaults to the local development user).
+        session_id (str): The session id.
+
+    Returns:
+        Session: The session, with its persisted state and events.
+    """
+    session = await session_service.get_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
+    if session is None:
+        try:
+            session = await session_service.create_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
+        except ValueError:
+            # Created concurrently by another request.
+            session = await session_service.get_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
+    return session
+
 
-session = session_service.create_session(
-    app_name=APP_NAME,
-    user_id=USER_ID,
-    session_id=SESSION_ID,
-)
-      
 root_agent = SequentialAgent(
     name="RootPlannerOrchestrator",
     description="Orchestrates the master planner and sub-agents to fulfill user queries.",
@@ -174,4 +415,62 @@ runner = Runner(
     agent=root_agent,
     app_name=APP_NAME,
     session_service=session_service
-)
\ No newline at end of file
+)
+
+
+async def stream_query(query: str, user_id: str = USER_ID, session_id: str = SESSION_ID) -> AsyncGenerator[Dict[str, Any], None]:
+    """
+    Answers a query as a stream of client updates: a 'progress' update per finished
+    plan step, 'delta' chunks of the answer while the summarizer generates it, the
+    complete 'answer' and 'done' (see orchestration.stream_turn). Use
+    orchestration.format_sse to send them as server-sent events.
+
+    Args:
+        query (str): The user's message.
+        user_id (str): The user's id.
+        session_id (str): The session id (created on first use).
+
+    Yields:
+        Dict[str, Any]: Client updates, in order.
+    """
+    await get_or_create_session(user_id, session_id)
+    async for update in stream_turn(runner, user_id, session_id, query):
+        yield update
+
+
+async def warm_up(agent_names: Optional[List[str]] = None) -> Dict[str, float]:
+    """
+    Prepares the process for its first turn, so that turn does not pay for lazy loading.
+
+    Imports the sub-agents' modules in a worker thread (the event loop keeps serving
+    meanwhile) and attaches the agents to the tree on the loop. Then builds the lazily
+    created shared resources: the gazetteer (with its file read), the response cache,
+    the HTTP client and the User-Agent database. Makes no upstream requests.
+
+    Args:
+        agent_names (Optional[List[str]]): Sub-agents to load; defaults to all of them.
+
+    Returns:
+        Dict[str, float]: Seconds spent loading the agents and the resources.
+    """
+    names = agent_registry.names() if agent_names is None else agent_names
+    started = time.perf_counter()
+    await asyncio.to_thread(lambda: [agent_registry.preload(name) for name in names])
+    # The load hooks change the live agent tree, so they run here on the event loop.
+    for name in names:
+        agent_registry.get(name)
+    timings = {"agents": round(time.perf_counter() - started, 3)}
+
+    started = time.perf_counter()
+    await asyncio.to_thread(lambda: get_gazetteer().load())
+    get_response_cache()
+    get_http_client()
+    if agent_registry.is_loaded("launches_agent"):
+        await asyncio.to_thread(agent_registry.module("launches_agent").random_user_agent_headers)
+    timings["resources"] = round(time.perf_counter() - started, 3)
+    mark("warmed_up")
+    logger.info("Warm-up finished: %s", timings)
+    return timings
+
+
+mark("agent_imported")
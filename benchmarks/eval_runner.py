@@ -0,0 +1,516 @@
+"""
+eval_runner.py
+
+Parallel runner for the evalsets in evals/.
+- Runs the eval cases concurrently on a pool of workers, each case in its own
+  session, with a per-case timeout so a slow case does not hold up the rest.
+- Scores each turn like `adk eval`: the tool trajectory (same calls, in order, with
+  the same arguments; calls of plan steps that run concurrently may come in any
+  order) and the response match (ROUGE-1 F-measure against the expected answer,
+  computed locally).
+- Keeps the sessions of a run in a temporary database, never in the app's own.
+- Reports per case the scores, wall time, model calls and tokens.
+- Caches results by a content hash of the agent instructions and models, the
+  agent and tool code and data, the settings that change the agents' behavior,
+  and the case itself (plus the cassette when replaying); unchanged cases are
+  skipped on the next run.
+
+Run from the repository root (API keys from .env, or offline against a cassette
+recorded with `python benchmarks/load_test.py --record`):
+    python benchmarks/eval_runner.py --jobs 4
+    python benchmarks/eval_runner.py --cassette replay/cassettes/evals.jsonl --case "evalset1/*"
+"""
+
+# --- Imports ---
+import argparse
+import asyncio
+import fnmatch
+import hashlib
+import inspect
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_DIR)
+
+from evalsets import EVALS_DIR, EvalCase, load_cases
+from replay import DEFAULT_BASE_PORT
+from utils.rate_limiter import RATE_BUDGETS
+from utils.telemetry import TurnRecorder
+
+# --- Constants ---
+DEFAULT_CACHE_PATH = os.path.join(PROJECT_DIR, ".cache", "eval_results.json")
+# Code whose changes can change an answer: the agents, orchestration and tools (with their data files).
+CODE_PATHS = ("agent.py", "sub_agents", "orchestration", "utils")
+# Environment settings that change plans, prompts or the data the agents get.
+BEHAVIOR_ENV = (
+    "ORCHESTRATOR_EXECUTION_MODE",
+    "DIRECT_TOOL_CALLS",
+    "SPECULATIVE_PREFETCH",
+    "PREFETCH_MIN_CONFIDENCE",
+    "PLAN_RESOLVER_MIN_CONFIDENCE",
+    "PLAN_AWARE_CONTEXT",
+    "HISTORY_WINDOW",
+    "TURN_DEADLINE_SECONDS",
+    "SUMMARY_RESERVE_SECONDS",
+    "GAZETTEER_PATH",
+)
+BEHAVIOR_ENV_PREFIXES = ("HISTORY_BUDGET_", "RATE_LIMIT_")
+# `adk eval`'s default criteria; evals/test_config.json ({"criteria": {...}}) overrides them.
+DEFAULT_CRITERIA = {"tool_trajectory_avg_score": 1.0, "response_match_score": 0.8}
+DEFAULT_TIMEOUT = 300.0
+MAX_SUMMARIES = 10_000
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+# --- Scoring ---
+def tool_calls_match(
+    actual: List[Dict[str, Any]],
+    expected: List[Dict[str, Any]],
+    levels: Optional[Dict[str, int]] = None,
+) -> bool:
+    """
+    True if both lists have the same tool calls (name and arguments) in the same order.
+
+    With `levels` (see tool_levels), calls are compared level by level, each level as
+    an unordered multiset: concurrent plan steps finish in any order. Without them, or
+    when a call's tool has no level, the order must match exactly.
+
+    Args:
+        actual (List[Dict[str, Any]]): The turn's calls, as {"name": ..., "args": ...}.
+        expected (List[Dict[str, Any]]): The evalset's calls.
+        levels (Optional[Dict[str, int]]): Dependency level of each tool in the turn's plan.
+
+    Returns:
+        bool: Whether the trajectories match.
+    """
+    def key(call: Dict[str, Any]) -> Tuple[str, str]:
+        return call["name"], json.dumps(call.get("args") or {}, sort_keys=True, default=str)
+
+    if not levels or any(call["name"] not in levels for call in actual + expected):
+        return len(actual) == len(expected) and all(
+            a["name"] == e["name"] and (a.get("args") or {}) == (e.get("args") or {}) for a, e in zip(actual, expected)
+        )
+
+    def by_level(calls: List[Dict[str, Any]]) -> Dict[int, List[Tuple[str, str]]]:
+        grouped: Dict[int, List[Tuple[str, str]]] = {}
+        for call in calls:
+            grouped.setdefault(levels[call["name"]], []).append(key(call))
+        return {level: sorted(keys) for level, keys in grouped.items()}
+
+    return by_level(actual) == by_level(expected)
+
+
+def tool_levels(plan_str: Any) -> Dict[str, int]:
+    """
+    Maps the tools of a turn's plan to the dependency level of their step.
+
+    Steps without dependencies are level 0, the others one above their deepest
+    dependency. A tool used by several steps takes the level of the last one.
+
+    Args:
+        plan_str (Any): The turn's plan (state['agent_execution_plan_str']).
+
+    Returns:
+        Dict[str, int]: Level by tool name; empty if the plan cannot be read.
+    """
+    from orchestration import build_plan_graph
+    from sub_agents import registry
+
+    try:
+        steps = build_plan_graph(plan_str if isinstance(plan_str, str) else json.dumps(plan_str))
+    except ValueError:
+        return {}
+    step_levels: Dict[int, int] = {}
+    levels: Dict[str, int] = {}
+    for step in steps:
+        step_levels[step.index] = 1 + max((step_levels[dep] for dep in step.depends_on), default=-1)
+        if step.agent_name not in registry.names():
+            continue
+        for tool in getattr(registry.get(step.agent_name), "tools", None) or []:
+            levels[getattr(tool, "name", None) or getattr(tool, "__name__", str(tool))] = step_levels[step.index]
+    return levels
+
+
+def rouge1(candidate: str, reference: str) -> float:
+    """ROUGE-1 F-measure: unigram overlap of lowercased alphanumeric tokens."""
+    candidate_tokens = _TOKEN.findall(candidate.lower())
+    reference_tokens = _TOKEN.findall(reference.lower())
+    if not candidate_tokens or not reference_tokens:
+        return 0.0
+    counts: Dict[str, int] = {}
+    for token in reference_tokens:
+        counts[token] = counts.get(token, 0) + 1
+    overlap = 0
+    for token in candidate_tokens:
+        if counts.get(token):
+            counts[token] -= 1
+            overlap += 1
+    if not overlap:
+        return 0.0
+    precision = overlap / len(candidate_tokens)
+    recall = overlap / len(reference_tokens)
+    return 2 * precision * recall / (precision + recall)
+
+
+def load_criteria() -> Dict[str, float]:
+    path = os.path.join(EVALS_DIR, "test_config.json")
+    if not os.path.exists(path):
+        return dict(DEFAULT_CRITERIA)
+    with open(path, encoding="utf-8") as f:
+        return {**DEFAULT_CRITERIA, **json.load(f).get("criteria", {})}
+
+
+# --- Content Hashes ---
+def _sha256(*parts: Any) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+
+def code_digest(paths: tuple = CODE_PATHS) -> str:
+    """Hashes the sources and data files (e.g. utils/data/gazetteer.tsv) under `paths` (relative to the repository root)."""
+    digest = hashlib.sha256()
+    for path in paths:
+        full = os.path.join(PROJECT_DIR, path)
+        files = [full] if os.path.isfile(full) else sorted(
+            os.path.join(root, name)
+            for root, _, names in os.walk(full) if "__pycache__" not in root.split(os.sep)
+            for name in names if not name.endswith(".pyc")
+        )
+        for file in sorted(files):
+            digest.update(os.path.relpath(file, PROJECT_DIR).encode("utf-8"))
+            with open(file, "rb") as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
+def env_digest() -> str:
+    """Hashes the BEHAVIOR_ENV settings (and a custom gazetteer's contents)."""
+    env = {
+        name: value for name, value in os.environ.items()
+        if name in BEHAVIOR_ENV or name.startswith(BEHAVIOR_ENV_PREFIXES)
+    }
+    gazetteer = env.get("GAZETTEER_PATH")
+    return _sha256(env, file_digest(gazetteer) if gazetteer and os.path.isfile(gazetteer) else None)
+
+
+def agents_digest(root: Any) -> str:
+    """Hashes the name, model, description and instruction of every agent under `root`."""
+    from google.adk.agents import BaseAgent
+
+    from sub_agents import registry
+
+    # Sub-agents are loaded on first use; load them all so every one is hashed.
+    registry.load_all()
+    seen: Dict[str, Any] = {}
+    pending = [root]
+    while pending:
+        agent = pending.pop()
+        if agent.name in seen:
+            continue
+        instruction = getattr(agent, "instruction", None)
+        if callable(instruction):
+            instruction = inspect.getsource(instruction)
+        seen[agent.name] = [str(getattr(agent, "model", "")), agent.description, instruction]
+        # Custom agents (the orchestrator) also hold agents in their own fields.
+        pending.extend(agent.sub_agents)
+        pending.extend(value for value in vars(agent).values() if isinstance(value, BaseAgent))
+    return _sha256(seen)
+
+
+def file_digest(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def case_key(case: EvalCase, fingerprint: str) -> str:
+    """The cache key of a case: the run's fingerprint and the case's queries and expectations."""
+    return _sha256(fingerprint, asdict(case))
+
+
+# --- Results ---
+@dataclass
+class CaseResult:
+    """Scores and costs of one eval case."""
+    name: str
+    key: str
+    status: str = "pass"
+    scores: Dict[str, float] = field(default_factory=dict)
+    turns: List[Dict[str, Any]] = field(default_factory=list)
+    wall_s: float = 0.0
+    llm_calls: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    error: Optional[str] = None
+    cached: bool = False
+
+
+class ResultCache:
+    """Results of earlier runs, keyed by case_key, in a JSON file."""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.results: Dict[str, Dict[str, Any]] = {}
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.results = json.load(f)
+
+    def get(self, key: str) -> Optional[CaseResult]:
+        result = self.results.get(key)
+        return CaseResult(**{**result, "cached": True}) if result else None
+
+    def put(self, result: CaseResult):
+        # Errors and timeouts may be transient (upstreams, quotas), so they run again.
+        if result.error is None:
+            self.results[result.key] = {**asdict(result), "cached": False}
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(self.results, f, indent=1)
+
+
+# --- Runner ---
+class EvalRunner:
+    """Runs eval cases against the agent pipeline on a pool of concurrent workers."""
+
+    def __init__(self, agent: Any, collector: TurnRecorder, criteria: Dict[str, float], timeout: float = DEFAULT_TIMEOUT):
+        """
+        Args:
+            agent (module): The imported agent module (runner and sessions).
+            collector (TurnRecorder): Records a summary of every turn, for the model usage.
+            criteria (Dict[str, float]): Pass thresholds per metric.
+            timeout (float): Seconds a case may take before it is abandoned.
+        """
+        from orchestration import stream_turn
+
+        self.agent = agent
+        self.collector = collector
+        self.criteria = criteria
+        self.timeout = timeout
+        self._stream_turn = stream_turn
+
+    def _usage(self, invocation_ids: List[str]) -> Dict[str, int]:
+        totals = {"llm_calls": 0, "input_tokens": 0, "output_tokens": 0}
+        wanted = set(invocation_ids)
+        for summary in list(self.collector.summaries):
+            if summary["invocation_id"] in wanted:
+                totals["llm_calls"] += summary["llm"]["calls"]
+                totals["input_tokens"] += summary["llm"]["input_tokens"]
+                totals["output_tokens"] += summary["llm"]["output_tokens"]
+        return totals
+
+    async def _run_turns(self, case: EvalCase, result: CaseResult, invocation_ids: List[str]):
+        from google.adk.agents.run_config import RunConfig
+
+        user_id = "eval-user"
+        session_id = f"eval-{result.key[:16]}-{time.time_ns()}"
+        await self.agent.get_or_create_session(user_id, session_id)
+        for turn in case.turns:
+            answer = ""
+            async for update in self._stream_turn(self.agent.runner, user_id, session_id, turn.query, run_config=RunConfig()):
+                if update["type"] == "answer":
+                    answer = update["text"]
+            # The turn's tool calls, from the events stored since the user's message.
+            session = await self.agent.get_or_create_session(user_id, session_id)
+            start = max(i for i, event in enumerate(session.events) if event.author == "user")
+            events = session.events[start + 1:]
+            invocation_ids.extend({event.invocation_id for event in events})
+            tools = [{"name": call.name, "args": call.args or {}} for event in events for call in event.get_function_calls()]
+            levels = tool_levels(session.state.get("agent_execution_plan_str"))
+            result.turns.append({
+                "query": turn.query,
+                "answer": answer,
+                "tools": tools,
+                "tool_trajectory": 1.0 if tool_calls_match(tools, turn.expected_tools, levels) else 0.0,
+                "response_match": round(rouge1(answer, turn.expected_response or ""), 4),
+            })
+
+    async def run_case(self, case: EvalCase, key: str) -> CaseResult:
+        """Runs and scores one case in a new session."""
+        result = CaseResult(case.name, key)
+        invocation_ids: List[str] = []
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(self._run_turns(case, result, invocation_ids), self.timeout)
+        except asyncio.TimeoutError:
+            result.error = f"timed out after {self.timeout:.0f}s"
+        except Exception as e:
+            result.error = f"{type(e).__name__}: {str(e)[:300]}"
+        result.wall_s = round(time.monotonic() - started, 2)
+        for name, value in self._usage(invocation_ids).items():
+            setattr(result, name, value)
+        if result.turns:
+            result.scores = {
+                "tool_trajectory_avg_score": round(sum(t["tool_trajectory"] for t in result.turns) / len(result.turns), 4),
+                "response_match_score": round(sum(t["response_match"] for t in result.turns) / len(result.turns), 4),
+            }
+        if result.error:
+            result.status = "error"
+        elif any(result.scores.get(metric, 0.0) < threshold for metric, threshold in self.criteria.items()):
+            result.status = "fail"
+        return result
+
+    async def run(self, cases: List[EvalCase], keys: List[str], jobs: int, on_result) -> List[CaseResult]:
+        """
+        Runs the cases on `jobs` workers, which take the next case in file order when free.
+
+        Args:
+            cases (List[EvalCase]): Cases to run.
+            keys (List[str]): Their cache keys.
+            jobs (int): Concurrent workers.
+            on_result (Callable[[CaseResult], None]): Called as each case finishes.
+
+        Returns:
+            List[CaseResult]: Results in the order of `cases`.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        for index, item in enumerate(zip(cases, keys)):
+            queue.put_nowait((index, *item))
+        results: List[Optional[CaseResult]] = [None] * len(cases)
+
+        async def worker():
+            while not queue.empty():
+                index, case, key = queue.get_nowait()
+                results[index] = await self.run_case(case, key)
+                on_result(results[index])
+
+        await asyncio.gather(*(worker() for _ in range(max(1, min(jobs, len(cases))))))
+        return results
+
+
+# --- Reporting ---
+STATUS_ICONS = {"pass": "✅", "fail": "❌", "error": "💥"}
+
+
+def print_result(result: CaseResult, out):
+    scores = result.scores
+    print(
+        f"{STATUS_ICONS[result.status]} {result.name:<32} trajectory {scores.get('tool_trajectory_avg_score', 0):.2f}"
+        f"  response {scores.get('response_match_score', 0):.2f}  {result.wall_s:>6.1f}s"
+        f"  llm {result.llm_calls:>3}  tokens {result.input_tokens}/{result.output_tokens}"
+        + ("  (cached)" if result.cached else "")
+        + (f"  {result.error}" if result.error else ""),
+        file=out,
+    )
+
+
+# --- Entry Point ---
+async def main_async(args: argparse.Namespace, out) -> List[CaseResult]:
+    cases = [
+        case for case in load_cases(args.evalsets or None)
+        if not args.case or any(fnmatch.fnmatch(case.name, pattern) for pattern in args.case)
+    ]
+    if not cases:
+        print("❌ No eval cases matched.", file=out)
+        return []
+
+    servers = None
+    sessions_dir = None
+    if args.cassette:
+        from replay import Cassette, FaultInjector, StandinServers
+
+        servers = StandinServers(Cassette(args.cassette), FaultInjector({}), base_port=args.port)
+        await servers.start()
+        os.environ.update(servers.environment())
+        os.environ.setdefault("GOOGLE_API_KEY", "replay")
+        os.environ.setdefault("NEWS_API_KEY", "replay")
+        for name in RATE_BUDGETS:
+            os.environ["RATE_LIMIT_" + name.upper().replace("-", "_")] = "off"
+    else:
+        # Eval sessions must not end up in the app's session database.
+        sessions_dir = tempfile.TemporaryDirectory(prefix="eval-sessions-")
+        os.environ["SESSION_STORE_PATH"] = os.path.join(sessions_dir.name, "sessions.sqlite3")
+    # One collector for every turn, instead of the default recorder's file and logged lines.
+    os.environ["TELEMETRY"] = "false"
+    from opentelemetry import trace
+    from opentelemetry.sdk.trace import TracerProvider
+
+    collector = TurnRecorder(path=None, keep_summaries=MAX_SUMMARIES, log_summaries=False)
+    provider = TracerProvider()
+    provider.add_span_processor(collector)
+    trace.set_tracer_provider(provider)
+
+    try:
+        if args.verbose:
+            # The agents log at ERROR by default; show their INFO lines (on stderr).
+            os.environ["LOG_LEVEL"] = "INFO"
+        import agent
+
+        criteria = load_criteria()
+        fingerprint = _sha256(
+            agents_digest(agent.root_agent),
+            code_digest(),
+            env_digest(),
+            criteria,
+            file_digest(args.cassette) if args.cassette else None,
+        )
+        keys = [case_key(case, fingerprint) for case in cases]
+        cache = ResultCache(None if args.no_cache else args.cache)
+        results: List[Optional[CaseResult]] = [None if args.force else cache.get(key) for key in keys]
+        for result in results:
+            if result is not None:
+                print_result(result, out)
+        pending = [index for index, result in enumerate(results) if result is None]
+        runner = EvalRunner(agent, collector, criteria, timeout=args.timeout)
+
+        def finished(result: CaseResult):
+            print_result(result, out)
+            cache.put(result)
+            cache.save()
+
+        started = time.monotonic()
+        ran = await runner.run([cases[i] for i in pending], [keys[i] for i in pending], args.jobs, finished)
+        for index, result in zip(pending, ran):
+            results[index] = result
+    finally:
+        if servers is not None:
+            await servers.stop()
+        if sessions_dir is not None:
+            sessions_dir.cleanup()
+
+    counts = {status: sum(1 for r in results if r.status == status) for status in STATUS_ICONS}
+    print(
+        f"\n📋 {len(results)} case(s): {counts['pass']} passed, {counts['fail']} failed, {counts['error']} errors"
+        f" | {len(results) - len(pending)} cached, {len(pending)} run in {time.monotonic() - started:.1f}s"
+        f" with {args.jobs} worker(s) | llm {sum(r.llm_calls for r in ran)} calls,"
+        f" {sum(r.input_tokens for r in ran)}/{sum(r.output_tokens for r in ran)} tokens",
+        file=out,
+    )
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"criteria": criteria, "cases": [asdict(r) for r in results]}, f, indent=2)
+        print(f"💾 Results saved to {args.output}", file=out)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the evalsets in parallel, skipping cases whose results are cached.")
+    parser.add_argument("evalsets", nargs="*", help="Evalset files (default: evals/*.evalset.json).")
+    parser.add_argument("--case", action="append", help="Only run cases matching this pattern (e.g. 'evalset1/*'); repeatable.")
+    parser.add_argument("--jobs", type=int, default=4, help="Cases run concurrently (default: 4).")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="Seconds per case (default: 300).")
+    parser.add_argument("--cassette", help="Replay this cassette through the local stand-ins instead of calling the real upstreams.")
+    parser.add_argument("--port", type=int, default=int(os.getenv("REPLAY_PORT", DEFAULT_BASE_PORT)), help="First stand-in port with --cassette.")
+    parser.add_argument("--cache", default=os.getenv("EVAL_CACHE_PATH", DEFAULT_CACHE_PATH), help="Results cache file.")
+    parser.add_argument("--force", action="store_true", help="Run every case, even if its result is cached.")
+    parser.add_argument("--no-cache", action="store_true", help="Neither read nor write the results cache.")
+    parser.add_argument("--output", help="Also save this run's results to a JSON file.")
+    parser.add_argument("--verbose", action="store_true", help="Show the agents' INFO log lines.")
+    args = parser.parse_args()
+    results = asyncio.run(main_async(args, sys.stdout))
+    if not results or any(result.status != "pass" for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
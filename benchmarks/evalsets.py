@@ -0,0 +1,83 @@
+"""
+evalsets.py
+
+Loads the ADK evalsets in evals/ as plain conversations.
+- One EvalCase per eval case: its user queries in order, with the expected final
+  response and tool calls of each turn.
+- Reads files saved as UTF-8 or, like the bundled ones, in a Windows code page.
+"""
+
+# --- Imports ---
+import glob
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+EVALS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "evals")
+
+
+@dataclass
+class EvalTurn:
+    """One turn of a recorded conversation."""
+    query: str
+    expected_response: Optional[str] = None
+    expected_tools: List[Dict[str, Any]] = field(default_factory=list)
+
+
+@dataclass
+class EvalCase:
+    """A conversation from an evalset: its id and turns."""
+    eval_set_id: str
+    eval_id: str
+    turns: List[EvalTurn]
+
+    @property
+    def name(self) -> str:
+        return f"{self.eval_set_id}/{self.eval_id}"
+
+
+def _text(content: Optional[Dict[str, Any]]) -> Optional[str]:
+    if not content:
+        return None
+    return "".join(part.get("text") or "" for part in content.get("parts") or []) or None
+
+
+def read_evalset(path: str) -> Dict[str, Any]:
+    """Reads an evalset file, falling back to cp1252 for files that are not UTF-8."""
+    with open(path, "rb") as f:
+        raw = f.read()
+    try:
+        return json.loads(raw.decode("utf-8"))
+    except UnicodeDecodeError:
+        return json.loads(raw.decode("cp1252", errors="replace"))
+
+
+def load_cases(paths: Optional[List[str]] = None) -> List[EvalCase]:
+    """
+    Loads the eval cases that have at least one turn.
+
+    Args:
+        paths (Optional[List[str]]): Evalset files; defaults to evals/*.evalset.json.
+
+    Returns:
+        List[EvalCase]: The cases, in file order.
+    """
+    cases = []
+    for path in paths or sorted(glob.glob(os.path.join(EVALS_DIR, "*.evalset.json"))):
+        evalset = read_evalset(path)
+        for case in evalset.get("eval_cases", []):
+            turns = [
+                EvalTurn(
+                    query=_text(invocation.get("user_content")) or "",
+                    expected_response=_text(invocation.get("final_response")),
+                    expected_tools=[
+                        {"name": use.get("name"), "args": use.get("args") or {}}
+                        for use in (invocation.get("intermediate_data") or {}).get("tool_uses") or []
+                    ],
+                )
+                for invocation in case.get("conversation") or []
+            ]
+            if turns:
+                cases.append(EvalCase(evalset.get("eval_set_id", os.path.basename(path)), case["eval_id"], turns))
+    return cases
@@ -0,0 +1,406 @@
+"""
+load_test.py
+
+End-to-end load test of the agent pipeline, driven by the evalset conversations.
+- Replays the conversations in evals/ as concurrent synthetic users against the
+  runner, with every upstream served offline by the replay stand-ins.
+- Ramps concurrency in stages (default 1, 2, 4, 8) and reports each stage's
+  throughput, p50/p95/p99 turn latency, failures and a per-agent breakdown (run
+  time, model calls, tokens, plan steps, upstream requests) taken from the turn traces.
+- Saves the results as JSON and compares them with a baseline, exiting with 1
+  when throughput or tail latency regress beyond a tolerance.
+
+Record the evalset conversations once (API keys from .env), then test offline:
+    python benchmarks/load_test.py --record
+    python benchmarks/load_test.py --concurrency 1,4,16 --duration 30
+    python benchmarks/load_test.py --compare benchmarks/results/baseline.json
+"""
+
+# --- Imports ---
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_DIR)
+
+from evalsets import EvalCase, load_cases
+from replay import DEFAULT_BASE_PORT, Cassette, FaultInjector, StandinServers, parse_faults
+from utils.rate_limiter import RATE_BUDGETS
+from utils.telemetry import TurnRecorder
+
+DEFAULT_CASSETTE = os.path.join(PROJECT_DIR, "replay", "cassettes", "evals.jsonl")
+RESULTS_DIR = os.path.join(PROJECT_DIR, "benchmarks", "results")
+# Turn summaries kept for the per-agent breakdown.
+MAX_SUMMARIES = 1_000_000
+
+
+# --- Measurements ---
+@dataclass
+class TurnResult:
+    """Client-side measurements of one turn."""
+    case: str
+    turn: int
+    latency: float
+    first_update: Optional[float]
+    answered: bool
+    error: Optional[str] = None
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def distribution_ms(values: List[float]) -> Dict[str, float]:
+    """p50/p95/p99, mean and max of durations in seconds, in milliseconds."""
+    return {
+        "p50": round(percentile(values, 0.50) * 1000, 1),
+        "p95": round(percentile(values, 0.95) * 1000, 1),
+        "p99": round(percentile(values, 0.99) * 1000, 1),
+        "mean": round(statistics.fmean(values) * 1000, 1) if values else 0.0,
+        "max": round(max(values) * 1000, 1) if values else 0.0,
+    }
+
+
+def breakdown(summaries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Aggregates turn summaries (see utils.telemetry.summarize_turn) per agent, plan step and upstream.
+
+    Args:
+        summaries (List[Dict[str, Any]]): Summaries of the stage's turns.
+
+    Returns:
+        Dict[str, Any]: 'agents' (runs, run time percentiles, model calls and tokens),
+        'steps' (outcome counts and p95) and 'upstreams' (requests, retries, errors).
+    """
+    agents: Dict[str, Dict[str, Any]] = {}
+    runs: Dict[str, List[float]] = {}
+    steps: Dict[str, Dict[str, Any]] = {}
+    step_durations: Dict[str, List[float]] = {}
+    upstreams: Dict[str, Dict[str, int]] = {}
+    for summary in summaries:
+        for name, agent in summary["agents"].items():
+            runs.setdefault(name, []).append(agent["duration_ms"] / 1000)
+        for name, llm in summary["llm"]["by_agent"].items():
+            totals = agents.setdefault(name or "?", {})
+            totals["llm_calls"] = totals.get("llm_calls", 0) + llm["calls"]
+            totals["input_tokens"] = totals.get("input_tokens", 0) + llm["input_tokens"]
+            totals["output_tokens"] = totals.get("output_tokens", 0) + llm["output_tokens"]
+        for key, step in summary["steps"].items():
+            outcomes = steps.setdefault(key, {})
+            outcomes[step["outcome"]] = outcomes.get(step["outcome"], 0) + 1
+            step_durations.setdefault(key, []).append(step["duration_ms"] / 1000)
+        for name, http in summary["http"].items():
+            totals = upstreams.setdefault(name, {"requests": 0, "retries": 0, "errors": 0})
+            for key in totals:
+                totals[key] += http[key]
+    for name, durations in runs.items():
+        distribution = distribution_ms(durations)
+        agents.setdefault(name, {}).update(runs=len(durations), p50_ms=distribution["p50"], p95_ms=distribution["p95"])
+    for key, durations in step_durations.items():
+        steps[key]["p95_ms"] = distribution_ms(durations)["p95"]
+    return {"agents": dict(sorted(agents.items())), "steps": dict(sorted(steps.items())), "upstreams": upstreams}
+
+
+# --- Load ---
+class LoadTest:
+    """Runs the evalset conversations as concurrent users against the agent runner."""
+
+    def __init__(
+        self,
+        agent: Any,
+        cases: List[EvalCase],
+        collector: TurnRecorder,
+        stream: bool = False,
+        think_time: float = 0.0,
+        cold_cache: bool = False,
+    ):
+        """
+        Args:
+            agent (module): The imported agent module (runner and sessions).
+            cases (List[EvalCase]): Conversations the users replay.
+            collector (TurnRecorder): Records a summary of every turn.
+            stream (bool): Run turns in SSE streaming mode.
+            think_time (float): Seconds a user waits between two turns.
+            cold_cache (bool): Clear the response cache before every conversation, so
+                turns reach the (stand-in) upstreams instead of the cache.
+        """
+        from google.adk.agents.run_config import RunConfig, StreamingMode
+        from orchestration import stream_turn
+        from utils import get_response_cache
+
+        self.agent = agent
+        self.cases = cases
+        self.collector = collector
+        self.think_time = think_time
+        self.response_cache = get_response_cache() if cold_cache else None
+        self._stream_turn = stream_turn
+        self.run_config = RunConfig(streaming_mode=StreamingMode.SSE if stream else StreamingMode.NONE)
+        self._sessions = 0
+
+    async def run_turn(self, user_id: str, session_id: str, case: EvalCase, index: int) -> TurnResult:
+        started = time.monotonic()
+        first_update = None
+        answered = False
+        try:
+            async for update in self._stream_turn(self.agent.runner, user_id, session_id, case.turns[index].query, run_config=self.run_config):
+                if first_update is None:
+                    first_update = time.monotonic() - started
+                answered = answered or update["type"] == "answer"
+        except Exception as e:
+            return TurnResult(case.name, index, time.monotonic() - started, first_update, False, f"{type(e).__name__}: {e}")
+        return TurnResult(case.name, index, time.monotonic() - started, first_update, answered)
+
+    async def run_conversation(self, user_id: str, case: EvalCase, stop_at: Optional[float], results: List[TurnResult]):
+        """Runs a conversation in a new session, stopping early once `stop_at` has passed."""
+        self._sessions += 1
+        session_id = f"load-{self._sessions}"
+        if self.response_cache is not None:
+            self.response_cache.clear()
+        await self.agent.get_or_create_session(user_id, session_id)
+        for index in range(len(case.turns)):
+            if stop_at is not None and time.monotonic() >= stop_at:
+                return
+            results.append(await self.run_turn(user_id, session_id, case, index))
+            if self.think_time:
+                await asyncio.sleep(self.think_time)
+
+    async def user(self, number: int, stop_at: float, results: List[TurnResult]):
+        """A synthetic user: replays conversations back to back until the stage ends."""
+        conversation = number
+        while time.monotonic() < stop_at:
+            case = self.cases[conversation % len(self.cases)]
+            await self.run_conversation(f"load-user-{number}", case, stop_at, results)
+            conversation += 1
+
+    async def stage(self, concurrency: int, duration: float) -> Dict[str, Any]:
+        """
+        Runs `concurrency` users for `duration` seconds (in-flight turns finish).
+
+        Returns:
+            Dict[str, Any]: Throughput, latency distributions, failures and the breakdown.
+        """
+        results: List[TurnResult] = []
+        first_summary = len(self.collector.summaries)
+        started = time.monotonic()
+        await asyncio.gather(*(self.user(number, started + duration, results) for number in range(concurrency)))
+        wall = time.monotonic() - started
+        summaries = list(self.collector.summaries)[first_summary:]
+        answered = [r for r in results if r.answered]
+        errors: Dict[str, int] = {}
+        for result in results:
+            if result.error:
+                errors[result.error[:120]] = errors.get(result.error[:120], 0) + 1
+        return {
+            "concurrency": concurrency,
+            "wall_s": round(wall, 2),
+            "turns": len(results),
+            "answered": len(answered),
+            "failed": sum(1 for r in results if r.error),
+            "throughput_tps": round(len(answered) / wall, 3) if wall else 0.0,
+            "latency_ms": distribution_ms([r.latency for r in answered]),
+            "first_update_ms": distribution_ms([r.first_update for r in answered if r.first_update is not None]),
+            "errors": errors,
+            **breakdown(summaries),
+        }
+
+
+# --- Reporting ---
+def print_stage(stage: Dict[str, Any], out):
+    latency = stage["latency_ms"]
+    print(
+        f"🚦 concurrency {stage['concurrency']:>3}: {stage['answered']}/{stage['turns']} turns in {stage['wall_s']:.1f}s"
+        f" → {stage['throughput_tps']:.2f} turns/s | p50 {latency['p50']:.0f} ms p95 {latency['p95']:.0f} ms"
+        f" p99 {latency['p99']:.0f} ms | {stage['failed']} failed",
+        file=out,
+    )
+    for name, agent in stage["agents"].items():
+        print(
+            f"   {name:<26} runs {agent.get('runs', 0):>5}  p50 {agent.get('p50_ms', 0):>7.0f} ms  p95 {agent.get('p95_ms', 0):>7.0f} ms"
+            f"  llm {agent.get('llm_calls', 0):>5}  tokens {agent.get('input_tokens', 0)}/{agent.get('output_tokens', 0)}",
+            file=out,
+        )
+    for error, count in stage["errors"].items():
+        print(f"   ❌ {count}× {error}", file=out)
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float, out) -> List[str]:
+    """
+    Compares each concurrency level run in both results.
+
+    A level regresses when its throughput drops, or its p95 latency grows, by more than `tolerance`.
+
+    Returns:
+        List[str]: Descriptions of the regressions.
+    """
+    regressions = []
+    base_stages = {stage["concurrency"]: stage for stage in baseline["stages"]}
+    print(f"\n📐 Against {baseline.get('label') or baseline.get('commit') or 'baseline'} (tolerance {tolerance:.0%}):", file=out)
+    for stage in current["stages"]:
+        base = base_stages.get(stage["concurrency"])
+        if base is None:
+            print(f"   concurrency {stage['concurrency']:>3}: not in the baseline", file=out)
+            continue
+        throughput = stage["throughput_tps"] / base["throughput_tps"] - 1 if base["throughput_tps"] else 0.0
+        p95 = stage["latency_ms"]["p95"] / base["latency_ms"]["p95"] - 1 if base["latency_ms"]["p95"] else 0.0
+        marks = []
+        if throughput < -tolerance:
+            marks.append("throughput")
+        if p95 > tolerance:
+            marks.append("p95")
+        print(
+            f"   concurrency {stage['concurrency']:>3}: throughput {throughput:+.1%}, p95 {p95:+.1%}"
+            + (f"  📉 {' and '.join(marks)} regressed" if marks else ""),
+            file=out,
+        )
+        if marks:
+            regressions.append(f"concurrency {stage['concurrency']}: {', '.join(marks)}")
+    return regressions
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# --- Entry Point ---
+async def run(args: argparse.Namespace, out) -> Optional[Dict[str, Any]]:
+    cases = load_cases(args.evalsets or None)
+    if not cases:
+        print("❌ No eval cases with turns found.", file=out)
+        return None
+    random.seed(args.seed)
+    injector = FaultInjector(parse_faults(args.faults), seed=args.seed)
+    servers = StandinServers(
+        Cassette(args.cassette), injector, record=args.record, base_port=args.port, proxies=args.proxies, dead_proxies=args.dead_proxies
+    )
+    async with servers:
+        os.environ.update(servers.environment())
+        if not args.record:
+            os.environ.setdefault("GOOGLE_API_KEY", "replay")
+            os.environ.setdefault("NEWS_API_KEY", "replay")
+        if not args.keep_rate_limits:
+            # The stand-ins have no quotas; the free-tier budgets would only measure the limiter.
+            for name in RATE_BUDGETS:
+                os.environ["RATE_LIMIT_" + name.upper().replace("-", "_")] = "off"
+        # One collector for every turn, instead of the default recorder's file and logged lines.
+        os.environ["TELEMETRY"] = "false"
+        from opentelemetry import trace
+        from opentelemetry.sdk.trace import TracerProvider
+
+        collector = TurnRecorder(path=None, keep_summaries=MAX_SUMMARIES, log_summaries=False)
+        provider = TracerProvider()
+        provider.add_span_processor(collector)
+        trace.set_tracer_provider(provider)
+
+        if args.verbose:
+            # The agents log at ERROR by default; show their INFO lines (on stderr).
+            os.environ["LOG_LEVEL"] = "INFO"
+        import agent
+
+        load = LoadTest(agent, cases, collector, stream=args.stream, think_time=args.think_time, cold_cache=args.cold_cache)
+        if args.record:
+            for case in cases:
+                await load.run_conversation("record-user", case, None, [])
+            print(f"📼 Recorded {len(servers.cassette)} exchanges into {args.cassette}", file=out)
+            return None
+
+        # Warm-up: one pass over the conversations (imports, connections, caches); not measured.
+        for case in cases:
+            await load.run_conversation("warmup-user", case, None, [])
+        stages = []
+        for concurrency in args.concurrency:
+            stage = await load.stage(concurrency, args.duration)
+            stages.append(stage)
+            print_stage(stage, out)
+    return {
+        "label": args.label,
+        "commit": git_commit(),
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "config": {
+            "cassette": os.path.relpath(args.cassette, PROJECT_DIR),
+            "cases": [case.name for case in cases],
+            "duration_s": args.duration,
+            "think_time_s": args.think_time,
+            "stream": args.stream,
+            "cold_cache": args.cold_cache,
+            "faults": args.faults,
+            "seed": args.seed,
+            "proxies": args.proxies,
+            "dead_proxies": args.dead_proxies,
+            "rate_limits": args.keep_rate_limits,
+        },
+        "stages": stages,
+        "standins": servers.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the agents with the evalset conversations against local stand-ins.")
+    parser.add_argument("--concurrency", type=lambda value: [int(level) for level in value.split(",")], default=[1, 2, 4, 8],
+                        help="Comma-separated concurrent users per stage (default: 1,2,4,8).")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per stage.")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Seconds a user waits between turns.")
+    parser.add_argument("--cold-cache", action="store_true", help="Clear the response cache before every conversation.")
+    parser.add_argument("--evalsets", nargs="*", help="Evalset files (default: evals/*.evalset.json).")
+    parser.add_argument("--cassette", default=DEFAULT_CASSETTE)
+    parser.add_argument("--record", action="store_true", help="Run each conversation once against the real upstreams and record it.")
+    parser.add_argument("--faults", default=os.getenv("REPLAY_FAULTS", ""), help="Injected faults (see replay/faults.py).")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=int(os.getenv("REPLAY_PORT", DEFAULT_BASE_PORT)), help="First stand-in port.")
+    parser.add_argument("--proxies", type=int, default=3, help="Local proxies in the proxy list.")
+    parser.add_argument("--dead-proxies", type=int, default=0, help="Listed proxies that refuse connections.")
+    parser.add_argument("--stream", action="store_true", help="Run turns in SSE streaming mode (the cassette must be recorded so too).")
+    parser.add_argument("--keep-rate-limits", action="store_true", help="Keep the upstream rate budgets (off by default).")
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/load-<time>.json).")
+    parser.add_argument("--label", help="Name of this run in comparisons (default: the git commit).")
+    parser.add_argument("--compare", help="Baseline results file to compare with.")
+    parser.add_argument("--results", help="Compare this results file instead of running a test.")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative regression (default: 0.15).")
+    parser.add_argument("--verbose", action="store_true", help="Show the agents' INFO log lines.")
+    args = parser.parse_args()
+    out = sys.stdout
+
+    if args.results:
+        with open(args.results, encoding="utf-8") as f:
+            results = json.load(f)
+    else:
+        results = asyncio.run(run(args, out))
+        if results is None:
+            return
+        path = args.output or os.path.join(RESULTS_DIR, time.strftime("load-%Y%m%d-%H%M%S.json"))
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Results saved to {path}", file=out)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, results, args.tolerance, out)
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s): {'; '.join(regressions)}", file=out)
+            sys.exit(1)
+        print("✅ No regressions.", file=out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+session_store_benchmark.py
+
+Memory use and lookup latency of the session store at scale.
+- Fills SqliteSessionService and ADK's InMemorySessionService with the same
+  synthetic conversations (default: 10,000 sessions across 2,000 users).
+- Reports traced Python memory held by each service, the SQLite file size, and
+  get_session latency for cached (hot) and evicted (cold) sessions.
+
+Run from the repository root:
+    python benchmarks/session_store_benchmark.py --sessions 10000
+"""
+
+# --- Imports ---
+import argparse
+import asyncio
+import gc
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.adk.events import Event, EventActions
+from google.adk.sessions import BaseSessionService, InMemorySessionService
+from google.genai import types
+
+from utils.session_store import SqliteSessionService
+
+APP_NAME = "benchmark"
+
+
+# --- Synthetic Conversations ---
+def make_turn(invocation: int) -> List[Event]:
+    """Builds the events of one typical turn: user query, plan, tool result, answer."""
+    invocation_id = f"e-{invocation}"
+    launches = [{
+        "name": f"Falcon 9 Block 5 | Starlink Group {invocation % 12}-{invocation % 30}",
+        "launch_date": "2025-07-01",
+        "location_name": "Cape Canaveral SFS, FL, USA",
+        "latitude": "28.56194122",
+        "longitude": "-80.57735736",
+        "status": "Go for Launch",
+        "mission_description": "A batch of satellites for the Starlink mega-constellation. " * 3,
+    }]
+    return [
+        Event(invocation_id=invocation_id, author="user", content=types.Content(
+            role="user", parts=[types.Part(text="What's the next SpaceX launch and the weather for it?")])),
+        Event(invocation_id=invocation_id, author="MasterPlannerAgent",
+              content=types.Content(role="model", parts=[types.Part(text='["launches_agent", "weather_agent", "summarizer_agent"]')]),
+              actions=EventActions(state_delta={"agent_execution_plan_str": '["launches_agent", "weather_agent", "summarizer_agent"]'})),
+        Event(invocation_id=invocation_id, author="launches_agent",
+              content=types.Content(role="user", parts=[types.Part(function_response=types.FunctionResponse(
+                  name="fetch_launch_info", response={"result": launches}))]),
+              actions=EventActions(state_delta={"launch_info": launches})),
+        Event(invocation_id=invocation_id, author="summarizer_agent", content=types.Content(
+            role="model", parts=[types.Part(text="The next launch is " + launches[0]["name"] + ". Weather looks favorable. " * 4)])),
+    ]
+
+
+async def populate(service: BaseSessionService, sessions: int, users: int, turns: int) -> List[tuple]:
+    """Creates the sessions and appends `turns` turns to each; returns their (user, session) ids."""
+    ids = []
+    invocation = 0
+    for i in range(sessions):
+        user_id, session_id = f"user-{i % users}", f"session-{i}"
+        session = await service.create_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
+        for _ in range(turns):
+            invocation += 1
+            for event in make_turn(invocation):
+                await service.append_event(session, event)
+        ids.append((user_id, session_id))
+    return ids
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def time_lookups(service: BaseSessionService, ids: List[tuple]) -> Dict[str, float]:
+    """Times get_session for the given sessions, in milliseconds."""
+    samples = []
+    for user_id, session_id in ids:
+        started = time.perf_counter()
+        session = await service.get_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
+        samples.append((time.perf_counter() - started) * 1000)
+        assert session is not None
+    return {
+        "p50_ms": round(statistics.median(samples), 3),
+        "p99_ms": round(percentile(samples, 99), 3),
+        "mean_ms": round(statistics.fmean(samples), 3),
+    }
+
+
+async def measure(name: str, service: BaseSessionService, args) -> Dict[str, object]:
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    ids = await populate(service, args.sessions, args.users, args.turns)
+    fill_seconds = time.perf_counter() - started
+    gc.collect()
+    held_mb = (tracemalloc.get_traced_memory()[0] - baseline) / 1e6
+    tracemalloc.stop()
+
+    rng = random.Random(42)
+    hot = ids[-min(args.lookups, args.cache):]  # The most recently used sessions.
+    cold = rng.sample(ids[: max(1, len(ids) - args.cache)], min(args.lookups, max(1, len(ids) - args.cache)))
+    result = {
+        "service": name,
+        "fill_s": round(fill_seconds, 1),
+        "memory_mb": round(held_mb, 1),
+        "hot": await time_lookups(service, hot),
+        "cold": await time_lookups(service, cold),
+    }
+    if isinstance(service, SqliteSessionService):
+        result["stats"] = service.stats()
+    return result
+
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sessions.sqlite3")
+        store = SqliteSessionService(path=path, max_cached_sessions=args.cache)
+        results = [await measure("sqlite", store, args)]
+        results[0]["file_mb"] = round(os.path.getsize(path) / 1e6, 1)
+        if not args.skip_in_memory:
+            results.append(await measure("in_memory", InMemorySessionService(), args))
+    for result in results:
+        print(result)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=10_000)
+    parser.add_argument("--users", type=int, default=2_000)
+    parser.add_argument("--turns", type=int, default=2, help="Turns (4 events each) per session")
+    parser.add_argument("--cache", type=int, default=1_024, help="max_cached_sessions of the SQLite store")
+    parser.add_argument("--lookups", type=int, default=1_000)
+    parser.add_argument("--skip-in-memory", action="store_true", help="Only benchmark the SQLite store")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,315 @@
+"""
+startup_profile.py
+
+Profiles the cold start of the Multi-Agent System.
+- Imports agent.py in fresh interpreters under `python -X importtime` and reports the
+  wall time, the cumulative import time of the project's modules and the heaviest
+  third-party packages; with --eager it does the same with LAZY_AGENTS=false, to
+  compare lazy and eager sub-agent loading.
+- With --cassette it also starts server.py against the replay stand-ins and measures
+  the time to /healthz (serving), to /readyz (warmed up) and the latency of the first
+  turn, and reads the server's own startup milestones from /metrics.
+- Saves the results as JSON and compares them with a baseline, exiting with 1 when the
+  import or server start-up time grows beyond a tolerance.
+
+Run from the repository root:
+    python benchmarks/startup_profile.py --eager
+    python benchmarks/startup_profile.py --cassette replay/cassettes/evals.jsonl
+    python benchmarks/startup_profile.py --compare benchmarks/results/startup-baseline.json
+"""
+
+# --- Imports ---
+import argparse
+import asyncio
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_DIR)
+
+from evalsets import load_cases
+from replay import DEFAULT_BASE_PORT, Cassette, StandinServers
+from utils.rate_limiter import RATE_BUDGETS
+
+RESULTS_DIR = os.path.join(PROJECT_DIR, "benchmarks", "results")
+PROJECT_PACKAGES = ("agent", "server", "sub_agents", "utils", "orchestration")
+# "import time:      1234 |       5678 |     package.module"
+_IMPORT_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s+)(\S+)\s*$")
+
+
+# --- Import Time ---
+def parse_importtime(stderr: str) -> Dict[str, Tuple[int, int]]:
+    """
+    Parses the output of `python -X importtime`.
+
+    Returns:
+        Dict[str, Tuple[int, int]]: Module -> (self µs, cumulative µs).
+    """
+    modules = {}
+    for line in stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if match:
+            modules[match.group(4)] = (int(match.group(1)), int(match.group(2)))
+    return modules
+
+
+def is_project_module(name: str) -> bool:
+    return name.split(".")[0] in PROJECT_PACKAGES
+
+
+def import_once(env: Dict[str, str]) -> Tuple[float, Dict[str, Tuple[int, int]]]:
+    """Imports agent.py in a fresh interpreter; returns the wall time and the import times."""
+    started = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import agent"],
+        cwd=PROJECT_DIR, env=env, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - started
+    if process.returncode != 0:
+        raise RuntimeError(f"importing agent failed:\n{process.stderr[-2000:]}")
+    return wall, parse_importtime(process.stderr)
+
+
+def import_profile(overrides: Dict[str, str], repeat: int, top: int) -> Dict[str, Any]:
+    """
+    Imports agent.py `repeat` times and summarizes the runs (medians).
+
+    Args:
+        overrides (Dict[str, str]): Environment variables set for the imports.
+        repeat (int): Fresh interpreters to time.
+        top (int): Third-party packages to report.
+
+    Returns:
+        Dict[str, Any]: Wall time, project modules, heaviest packages and loaded sub-agents.
+    """
+    env = {**os.environ, **overrides}
+    walls, runs = [], []
+    for _ in range(repeat):
+        wall, modules = import_once(env)
+        walls.append(wall)
+        runs.append(modules)
+
+    def median_us(name: str, index: int) -> int:
+        return int(statistics.median(run[name][index] for run in runs if name in run))
+
+    names = set().union(*runs)
+    project = {
+        name: {"self_ms": round(median_us(name, 0) / 1000, 1), "cumulative_ms": round(median_us(name, 1) / 1000, 1)}
+        for name in sorted(names, key=lambda name: -median_us(name, 1)) if is_project_module(name)
+    }
+    # A package's own cost: the self time of all its modules, wherever they were imported from.
+    packages: Dict[str, float] = {}
+    for name in names:
+        if not is_project_module(name):
+            package = name.split(".")[0]
+            packages[package] = packages.get(package, 0) + median_us(name, 0) / 1000
+    heaviest = dict(sorted(((package, round(ms, 1)) for package, ms in packages.items()), key=lambda item: -item[1])[:top])
+    return {
+        "wall_s": round(statistics.median(walls), 3),
+        "import_s": round(median_us("agent", 1) / 1e6, 3) if "agent" in names else None,
+        "modules": len(names),
+        "sub_agents_loaded": sorted(name.split(".", 1)[1] for name in names if name.startswith("sub_agents.") and name.endswith("_agent")),
+        "project": project,
+        "packages": heaviest,
+    }
+
+
+def print_import_profile(label: str, profile: Dict[str, Any]):
+    print(f"\n📦 Import of agent.py ({label}): {profile['wall_s']:.2f}s wall, {profile['import_s']}s importing, {profile['modules']} modules")
+    print(f"   Sub-agents loaded at import: {', '.join(profile['sub_agents_loaded']) or 'none'}")
+    print(f"   {'project module':<36} {'cumulative ms':>14} {'self ms':>9}")
+    for name, times in profile["project"].items():
+        print(f"   {name:<36} {times['cumulative_ms']:>14,.1f} {times['self_ms']:>9,.1f}")
+    print(f"   {'third-party package':<36} {'self ms':>14}")
+    for package, ms in profile["packages"].items():
+        print(f"   {package:<36} {ms:>14,.1f}")
+
+
+# --- Server ---
+async def wait_for(client: httpx.AsyncClient, path: str, process: subprocess.Popen, timeout: float) -> float:
+    """Polls `path` until it answers 200; returns when it did, in seconds on the monotonic clock."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with code {process.returncode}")
+        try:
+            if (await client.get(path)).status_code == 200:
+                return time.monotonic()
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.05)
+    raise RuntimeError(f"{path} did not answer 200 within {timeout:.0f}s")
+
+
+async def server_profile(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Starts server.py against the replay stand-ins and times it until its first answer.
+
+    Returns:
+        Dict[str, Any]: Seconds to /healthz, to /readyz and for the first turn, and the
+            startup section of the server's /metrics.
+    """
+    query = args.query
+    if query is None:
+        query = next(case.turns[0].query for case in load_cases() if case.turns)
+    async with StandinServers(Cassette(args.cassette), base_port=args.port) as servers:
+        env = {**os.environ, **servers.environment(), "GOOGLE_API_KEY": "replay", "NEWS_API_KEY": "replay"}
+        # The stand-ins have no quotas; the free-tier budgets would only measure the limiter.
+        for name in RATE_BUDGETS:
+            env["RATE_LIMIT_" + name.upper().replace("-", "_")] = "off"
+        if args.warmup is not None:
+            env["SERVER_WARMUP"] = args.warmup
+        output = None if args.verbose else subprocess.DEVNULL
+        started = time.monotonic()
+        process = subprocess.Popen(
+            [sys.executable, "server.py", "--port", str(args.server_port)],
+            cwd=PROJECT_DIR, env=env, stdout=output, stderr=output,
+        )
+        try:
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.server_port}", timeout=60) as client:
+                healthy = await wait_for(client, "/healthz", process, args.timeout)
+                ready = await wait_for(client, "/readyz", process, args.timeout)
+                turn_started = time.monotonic()
+                response = await client.post("/users/profile/sessions/startup/turns", json={"query": query})
+                first_turn = time.monotonic() - turn_started
+                if response.status_code != 200:
+                    raise RuntimeError(f"first turn failed ({response.status_code}): {response.text[:300]}")
+                startup = (await client.get("/metrics")).json().get("startup", {})
+        finally:
+            process.terminate()
+            try:
+                process.wait(10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+    return {
+        "query": query,
+        "healthz_s": round(healthy - started, 3),
+        "readyz_s": round(ready - started, 3),
+        "first_turn_s": round(first_turn, 3),
+        "server": startup,
+    }
+
+
+def print_server_profile(profile: Dict[str, Any]):
+    print("\n🚀 server.py cold start (from spawn):")
+    print(f"   serving (/healthz)  {profile['healthz_s']:>7.2f}s")
+    print(f"   ready (/readyz)     {profile['readyz_s']:>7.2f}s")
+    print(f"   first turn          {profile['first_turn_s']:>7.2f}s  ({profile['query']!r})")
+    milestones = profile["server"].get("milestones_s", {})
+    if milestones:
+        print("   milestones (from process start): " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in milestones.items()))
+    warm = profile["server"].get("warm_up") or {}
+    if warm.get("error"):
+        print(f"   ⚠️ warm-up failed: {warm['error']}")
+
+
+# --- Comparison ---
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    Compares the start-up times measured in both results.
+
+    Returns:
+        List[str]: Descriptions of the regressions.
+    """
+    regressions = []
+    metrics = [("import", "lazy", "wall_s"), ("import", "eager", "wall_s"),
+               ("server", None, "healthz_s"), ("server", None, "readyz_s"), ("server", None, "first_turn_s")]
+    print(f"\n📐 Against {baseline.get('label') or baseline.get('commit') or 'baseline'} (tolerance {tolerance:.0%}):")
+    for section, key, name in metrics:
+        before, after = baseline.get(section) or {}, current.get(section) or {}
+        if key is not None:
+            before, after = before.get(key) or {}, after.get(key) or {}
+        if not before.get(name) or after.get(name) is None:
+            continue
+        change = after[name] / before[name] - 1
+        label = f"{section}{'.' + key if key else ''}.{name}"
+        print(f"   {label:<28} {before[name]:>7.2f}s -> {after[name]:>7.2f}s  {change:+.1%}" + ("  📉 regressed" if change > tolerance else ""))
+        if change > tolerance:
+            regressions.append(f"{label} {change:+.1%}")
+    return regressions
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# --- Entry Point ---
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    imports = {"lazy": import_profile({"LAZY_AGENTS": "true"}, args.repeat, args.top)}
+    print_import_profile("lazy sub-agents", imports["lazy"])
+    if args.eager:
+        imports["eager"] = import_profile({"LAZY_AGENTS": "false"}, args.repeat, args.top)
+        print_import_profile("LAZY_AGENTS=false", imports["eager"])
+        saved = imports["eager"]["wall_s"] - imports["lazy"]["wall_s"]
+        print(f"\n⚖️  Lazy loading saves {saved * 1000:,.0f} ms of import wall time.")
+    server = None
+    if args.cassette:
+        server = asyncio.run(server_profile(args))
+        print_server_profile(server)
+    return {
+        "label": args.label,
+        "commit": git_commit(),
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "config": {"repeat": args.repeat, "warmup": args.warmup},
+        "import": imports,
+        "server": server,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profiles the import time and cold start of the Multi-Agent System.")
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh interpreters per import profile (default: 3).")
+    parser.add_argument("--top", type=int, default=12, help="Third-party packages to list (default: 12).")
+    parser.add_argument("--eager", action="store_true", help="Also profile with LAZY_AGENTS=false.")
+    parser.add_argument("--cassette", help="Also start server.py against the stand-ins replaying this cassette.")
+    parser.add_argument("--query", help="First turn sent to the server (default: the first eval case's first query).")
+    parser.add_argument("--warmup", help="SERVER_WARMUP for the server ('all', 'none' or agent names).")
+    parser.add_argument("--port", type=int, default=DEFAULT_BASE_PORT, help=f"First stand-in port (default: {DEFAULT_BASE_PORT}).")
+    parser.add_argument("--server-port", type=int, default=8765, help="Port of the profiled server (default: 8765).")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Longest wait for the server to become ready (default: 120).")
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/startup-<time>.json).")
+    parser.add_argument("--label", help="Name of this run in comparisons (default: the git commit).")
+    parser.add_argument("--compare", help="Baseline results file to compare with.")
+    parser.add_argument("--results", help="Compare this results file instead of profiling.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression (default: 0.2).")
+    parser.add_argument("--verbose", action="store_true", help="Show the server's output.")
+    args = parser.parse_args()
+
+    if args.results:
+        with open(args.results, encoding="utf-8") as f:
+            results = json.load(f)
+    else:
+        results = run(args)
+        path = args.output or os.path.join(RESULTS_DIR, time.strftime("startup-%Y%m%d-%H%M%S.json"))
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Results saved to {path}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, results, args.tolerance)
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s): {'; '.join(regressions)}")
+            sys.exit(1)
+        print("✅ No regressions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+"""
+tool_benchmark.py
+
+Microbenchmarks of the tools' response post-processing and session-state writes.
+- Runs on fixed payloads in benchmarks/fixtures/ (a SpaceDevs launch page, a NewsAPI
+  search, a 16-day open-meteo forecast and a free-proxy-list.net page), at the size
+  the tools usually get ("typical": the recorded pages, a one-day forecast) and
+  scaled to API maximums ("large": 100 launches, 100 articles, 16 forecast days,
+  3,000 proxy rows).
+- Measures per call the median and best time, and the peak and retained traced
+  memory, for parse_launches, parse_articles, parse_proxy_table, summarize_forecast
+  and for writing each tool's result through session state into the SQLite
+  session store (the event ADK appends after a tool call).
+- Saves the results as JSON and compares them with a baseline, exiting with 1
+  when a benchmark's best time or peak memory grows beyond a tolerance.
+
+Run from the repository root:
+    python benchmarks/tool_benchmark.py
+    python benchmarks/tool_benchmark.py --compare benchmarks/results/tools-baseline.json
+    python benchmarks/tool_benchmark.py --refresh-fixtures replay/cassettes/evals.jsonl
+"""
+
+# --- Imports ---
+import argparse
+import asyncio
+import copy
+import fnmatch
+import gc
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_DIR)
+
+from google.adk.events import Event, EventActions
+from google.adk.sessions import Session, State
+from google.genai import types
+
+from sub_agents.launches_agent import parse_launches, parse_proxy_table
+from sub_agents.news_agent import parse_articles
+from utils.session_store import SqliteSessionService
+from utils.weather_digest import summarize_forecast
+
+FIXTURES_DIR = os.path.join(PROJECT_DIR, "benchmarks", "fixtures")
+RESULTS_DIR = os.path.join(PROJECT_DIR, "benchmarks", "results")
+# Fixture file recorded from each upstream (see --refresh-fixtures).
+FIXTURE_FILES = {
+    "spacedevs": "spacedevs_launches.json",
+    "newsapi": "newsapi_everything.json",
+    "open-meteo": "open_meteo_forecast.json",
+    "proxy-list": "free_proxy_list.html",
+}
+# Payload sizes: None keeps the recorded fixture as it is.
+SIZES = {
+    "typical": {"launches": None, "articles": None, "forecast_days": 1, "proxy_rows": None},
+    "large": {"launches": 100, "articles": 100, "forecast_days": 16, "proxy_rows": 3000},
+}
+APP_NAME = "benchmark"
+
+_ROW = re.compile(r"<tr>.*?</tr>", re.S)
+
+
+# --- Fixtures ---
+def read_fixture(upstream: str) -> str:
+    with open(os.path.join(FIXTURES_DIR, FIXTURE_FILES[upstream]), encoding="utf-8") as f:
+        return f.read()
+
+
+def scale_items(items: List[Dict[str, Any]], count: Optional[int], field: str) -> List[Dict[str, Any]]:
+    """Repeats `items` up to `count`, numbering the copies' `field` so they stay distinct."""
+    if count is None:
+        return items
+    scaled = []
+    for index in range(count):
+        item = copy.deepcopy(items[index % len(items)])
+        if index >= len(items):
+            item[field] = f"{item.get(field)} #{index // len(items)}"
+        scaled.append(item)
+    return scaled
+
+
+def scale_forecast(forecast: Dict[str, Any], days: int) -> Dict[str, Any]:
+    """Cuts or tiles an hourly/daily forecast to `days` days, with consecutive timestamps."""
+    scaled = copy.deepcopy(forecast)
+    for block, step, fmt, length in (("hourly", timedelta(hours=1), "%Y-%m-%dT%H:%M", days * 24), ("daily", timedelta(days=1), "%Y-%m-%d", days)):
+        values = scaled.get(block)
+        if not values or not values.get("time"):
+            continue
+        first = datetime.strptime(values["time"][0], fmt)
+        for name, series in values.items():
+            values[name] = [series[i % len(series)] for i in range(length)]
+        values["time"] = [(first + step * i).strftime(fmt) for i in range(length)]
+    return scaled
+
+
+def scale_proxy_page(html: str, rows: Optional[int]) -> str:
+    """Repeats the proxy table's rows up to `rows`."""
+    if rows is None:
+        return html
+    found = _ROW.findall(html.split("<tbody>", 1)[1])
+    body = "".join(found[i % len(found)] for i in range(rows))
+    head, rest = html.split("<tbody>", 1)
+    return f"{head}<tbody>{body}</tbody>{rest.split('</tbody>', 1)[1]}"
+
+
+def load_payloads(size: Dict[str, Any]) -> Dict[str, Any]:
+    """Builds the payloads of one size from the fixtures."""
+    launches = json.loads(read_fixture("spacedevs"))
+    articles = json.loads(read_fixture("newsapi"))
+    forecast = json.loads(read_fixture("open-meteo"))
+    return {
+        "launches": {**launches, "results": scale_items(launches["results"], size["launches"], "name")},
+        "articles": {**articles, "articles": scale_items(articles["articles"], size["articles"], "title")},
+        "forecast": scale_forecast(forecast, size["forecast_days"]),
+        "proxy_page": scale_proxy_page(read_fixture("proxy-list"), size["proxy_rows"]),
+    }
+
+
+def refresh_fixtures(cassette_path: str):
+    """Replaces each fixture with the largest successful response recorded in a replay cassette."""
+    from replay import Cassette
+
+    cassette = Cassette(cassette_path)
+    for upstream, name in FIXTURE_FILES.items():
+        recorded = [
+            interaction for interaction in cassette.interactions
+            if interaction.upstream == upstream and interaction.status == 200
+            and (upstream != "newsapi" or '"status":"ok"' in interaction.response.replace(" ", ""))
+        ]
+        if not recorded:
+            print(f"⚠️ No recorded {upstream} response; keeping {name}.")
+            continue
+        largest = max(recorded, key=lambda interaction: len(interaction.response))
+        with open(os.path.join(FIXTURES_DIR, name), "w", encoding="utf-8") as f:
+            f.write(largest.response)
+        print(f"📼 {name} ← {upstream} response of {len(largest.response):,} chars recorded {largest.recorded_at}")
+
+
+# --- State Writes ---
+class StateWriter:
+    """Writes tool results the way a tool call does: into session state, then an appended event."""
+
+    def __init__(self, service: SqliteSessionService, session: Session):
+        self.service = service
+        self.session = session
+        self.calls = 0
+
+    async def write(self, agent: str, tool: str, result: Any, **state: Any):
+        self.calls += 1
+        tool_state = State(value=self.session.state, delta={})
+        for key, value in state.items():
+            tool_state[key] = value
+        event = Event(
+            invocation_id=f"e-{self.calls}",
+            author=agent,
+            content=types.Content(role="user", parts=[types.Part(function_response=types.FunctionResponse(
+                name=tool, response={"result": result}))]),
+            actions=EventActions(state_delta=dict(tool_state._delta)),
+        )
+        await self.service.append_event(self.session, event)
+
+
+# --- Benchmarks ---
+@dataclass
+class Benchmark:
+    """One measured call: a name, a payload size and the function to call."""
+    name: str
+    size: str
+    call: Callable[[], Any]
+    is_async: bool = False
+
+
+def build_benchmarks(payloads: Dict[str, Dict[str, Any]], writer: StateWriter) -> List[Benchmark]:
+    benchmarks = []
+    for size, payload in payloads.items():
+        launches = parse_launches(payload["launches"])
+        articles = parse_articles(payload["articles"])
+        first_day = payload["forecast"]["hourly"]["time"][0][:10]
+        launch_time = f"{first_day}T16:30:00Z"
+        digest = summarize_forecast(payload["forecast"], launch_time=launch_time)
+        benchmarks += [
+            Benchmark("launches.parse", size, lambda p=payload: parse_launches(p["launches"])),
+            Benchmark("launches.state_write", size, lambda r=launches: writer.write(
+                "launches_agent", "fetch_launch_info", r, launch_info=r), True),
+            Benchmark("news.parse", size, lambda p=payload: parse_articles(p["articles"])),
+            Benchmark("news.state_write", size, lambda r=articles: writer.write(
+                "news_agent", "fetch_news_articles", r, news_info_retrieval_status="success", news_articles=r), True),
+            Benchmark("proxies.parse_table", size, lambda p=payload: parse_proxy_table(p["proxy_page"])),
+            Benchmark("weather.digest", size, lambda p=payload, t=launch_time: summarize_forecast(p["forecast"], launch_time=t)),
+            Benchmark("weather.state_write", size, lambda p=payload, d=digest: writer.write(
+                "weather_agent", "fetch_weather_info", d,
+                weather_info_retrieval_status="success", weather_info_raw=p["forecast"], weather_info=d), True),
+        ]
+    return benchmarks
+
+
+async def measure(benchmark: Benchmark, rounds: int, min_time: float) -> Dict[str, Any]:
+    """
+    Times a benchmark and traces its memory.
+
+    Args:
+        benchmark (Benchmark): The call to measure.
+        rounds (int): Timed rounds; each repeats the call for at least `min_time` seconds.
+        min_time (float): Minimum seconds per round.
+
+    Returns:
+        Dict[str, Any]: Median and best microseconds per call, calls per round, and the
+        peak and retained KiB of traced memory per call.
+    """
+    async def call_once():
+        result = benchmark.call()
+        if benchmark.is_async:
+            await result
+
+    await call_once()  # Warm-up (imports, caches, first SQLite writes).
+    calls, elapsed = 1, 0.0
+    while True:
+        started = time.perf_counter()
+        for _ in range(calls):
+            await call_once()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            break
+        calls *= 2
+    per_call = [elapsed / calls]
+    for _ in range(rounds - 1):
+        started = time.perf_counter()
+        for _ in range(calls):
+            await call_once()
+        per_call.append((time.perf_counter() - started) / calls)
+
+    gc.collect()
+    tracemalloc.start()
+    peaks, retained = [], []
+    for _ in range(3):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        await call_once()
+        current, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - before)
+        retained.append(current - before)
+    tracemalloc.stop()
+    return {
+        "name": benchmark.name,
+        "size": benchmark.size,
+        "median_us": round(statistics.median(per_call) * 1e6, 2),
+        "best_us": round(min(per_call) * 1e6, 2),
+        "calls_per_round": calls,
+        "peak_kib": round(max(peaks) / 1024, 1),
+        "retained_kib": round(statistics.median(retained) / 1024, 1),
+    }
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    Compares each benchmark run in both results.
+
+    A benchmark regresses when its best time (the least noisy) or peak memory grows by more
+    than `tolerance`.
+
+    Returns:
+        List[str]: Descriptions of the regressions.
+    """
+    regressions = []
+    base = {(result["name"], result["size"]): result for result in baseline["results"]}
+    print(f"\n📐 Against {baseline.get('label') or baseline.get('commit') or 'baseline'} (tolerance {tolerance:.0%}):")
+    for result in current["results"]:
+        before = base.get((result["name"], result["size"]))
+        if before is None:
+            continue
+        time_change = result["best_us"] / before["best_us"] - 1 if before["best_us"] else 0.0
+        memory_change = result["peak_kib"] / before["peak_kib"] - 1 if before["peak_kib"] else 0.0
+        marks = [label for label, change in (("time", time_change), ("memory", memory_change)) if change > tolerance]
+        print(
+            f"   {result['name']:<22} {result['size']:<8} time {time_change:+.1%}  memory {memory_change:+.1%}"
+            + (f"  📉 {' and '.join(marks)} regressed" if marks else "")
+        )
+        if marks:
+            regressions.append(f"{result['name']} ({result['size']}): {', '.join(marks)}")
+    return regressions
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# --- Entry Point ---
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    payloads = {size: load_payloads(SIZES[size]) for size in args.sizes}
+    with tempfile.TemporaryDirectory() as tmp:
+        service = SqliteSessionService(path=os.path.join(tmp, "sessions.sqlite3"))
+        session = await service.create_session(app_name=APP_NAME, user_id="benchmark-user", session_id="benchmark")
+        benchmarks = [
+            benchmark for benchmark in build_benchmarks(payloads, StateWriter(service, session))
+            if not args.filter or any(fnmatch.fnmatch(benchmark.name, pattern) for pattern in args.filter)
+        ]
+        print(f"{'benchmark':<22} {'size':<8} {'median µs':>11} {'best µs':>11} {'peak KiB':>10} {'retained KiB':>13}")
+        results = []
+        for benchmark in benchmarks:
+            result = await measure(benchmark, args.rounds, args.min_time)
+            results.append(result)
+            print(
+                f"{result['name']:<22} {result['size']:<8} {result['median_us']:>11,.1f} {result['best_us']:>11,.1f}"
+                f" {result['peak_kib']:>10,.1f} {result['retained_kib']:>13,.1f}"
+            )
+    return {
+        "label": args.label,
+        "commit": git_commit(),
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "config": {"rounds": args.rounds, "min_time_s": args.min_time, "sizes": {size: SIZES[size] for size in args.sizes}},
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks of tool response parsing and session-state writes.")
+    parser.add_argument("--filter", action="append", help="Only run benchmarks matching this pattern (e.g. 'news.*'); repeatable.")
+    parser.add_argument("--sizes", type=lambda value: value.split(","), default=list(SIZES), help="Comma-separated sizes (default: typical,large).")
+    parser.add_argument("--rounds", type=int, default=7, help="Timed rounds per benchmark (default: 7).")
+    parser.add_argument("--min-time", type=float, default=0.05, help="Minimum seconds per round (default: 0.05).")
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/tools-<time>.json).")
+    parser.add_argument("--label", help="Name of this run in comparisons (default: the git commit).")
+    parser.add_argument("--compare", help="Baseline results file to compare with.")
+    parser.add_argument("--results", help="Compare this results file instead of running the benchmarks.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative regression (default: 0.25).")
+    parser.add_argument("--refresh-fixtures", metavar="CASSETTE", help="Replace the fixtures with responses recorded in a replay cassette.")
+    args = parser.parse_args()
+
+    if args.refresh_fixtures:
+        refresh_fixtures(args.refresh_fixtures)
+        return
+    unknown = [size for size in args.sizes if size not in SIZES]
+    if unknown:
+        parser.error(f"unknown size(s): {', '.join(unknown)}; choose from {', '.join(SIZES)}")
+
+    if args.results:
+        with open(args.results, encoding="utf-8") as f:
+            results = json.load(f)
+    else:
+        results = asyncio.run(run(args))
+        path = args.output or os.path.join(RESULTS_DIR, time.strftime("tools-%Y%m%d-%H%M%S.json"))
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Results saved to {path}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, results, args.tolerance)
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s): {'; '.join(regressions)}")
+            sys.exit(1)
+        print("✅ No regressions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+from .plan_graph import (
+    STEP_COMPLETED,
+    STEP_FAILED,
+    STEP_SKIPPED,
+    STEP_TIMED_OUT,
+    PlanStep,
+    assign_branches,
+    build_plan_graph,
+    parse_plan,
+    run_plan_graph,
+    step_inputs,
+)
+from .plan_resolver import PlanResolution, PlanResolver, normalize_query
+from .direct_tools import DIRECT_TOOLS, prepare_direct_call, resolve_state_refs, run_direct_tool, turn_state_keys
+from .prefetch import PrefetchSpec, SpeculativePrefetch
+from .history import HistoryManager, HistoryPolicy, estimate_tokens
+from .streaming import format_sse, is_streaming, progress_event, stream_turn, stream_turn_sse
@@ -0,0 +1,227 @@
+"""
+direct_tools.py
+
+Direct tool execution for plan steps that carry tool arguments.
+- Maps tool agents to the tools they exist to call.
+- Resolves "$state." references in planner-supplied arguments at run time, but
+  only to values a successfully completed dependency wrote during this turn.
+- Calls the tool without an LLM turn and emits the same function call/response
+  events the LlmAgent would have produced, so later agents see the data.
+"""
+
+# --- Imports ---
+import inspect
+import uuid
+from typing import Any, AsyncGenerator, Callable, Collection, Dict, Mapping, Optional, Set, Tuple
+
+from google.adk.agents import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event
+from google.adk.tools import ToolContext
+from google.genai import types
+
+from utils.telemetry import record_error, span
+
+from .plan_graph import STEP_COMPLETED, PlanStep
+
+# --- Constants ---
+# The tools each tool agent exists to call; the first one whose signature fits
+# the step's arguments is used.
+DIRECT_TOOLS: Dict[str, Tuple[str, ...]] = {
+    "launches_agent": ("fetch_launch_info",),
+    "weather_agent": ("fetch_weather_info", "fetch_weather_batch"),
+    "news_agent": ("fetch_news_articles",),
+}
+
+# Argument values starting with this prefix are read from session state,
+# e.g. "$state.launch_info.0.name".
+STATE_REF_PREFIX = "$state."
+
+
+def turn_state_keys(ctx: InvocationContext, dependency_outcomes: Mapping[str, str]) -> Set[str]:
+    """
+    Returns the state keys written during this turn by dependencies that completed.
+
+    Args:
+        ctx (InvocationContext): The step's invocation context.
+        dependency_outcomes (Mapping[str, str]): Outcome of each dependency, by agent name.
+
+    Returns:
+        Set[str]: Keys a state reference may read.
+    """
+    completed = {name for name, outcome in dependency_outcomes.items() if outcome == STEP_COMPLETED}
+    keys: Set[str] = set()
+    for event in ctx.session.events:
+        if event.invocation_id == ctx.invocation_id and event.author in completed and event.actions:
+            keys.update(event.actions.state_delta)
+    return keys
+
+
+def resolve_state_refs(
+    args: Dict[str, Any],
+    state: Mapping[str, Any],
+    fresh_keys: Optional[Collection[str]] = None,
+) -> Dict[str, Any]:
+    """
+    Replaces "$state.<key>.<index or field>..." argument values with session state values.
+
+    Args:
+        args (Dict[str, Any]): Tool arguments from the plan.
+        state (Mapping[str, Any]): Current session state.
+        fresh_keys (Optional[Collection[str]]): If given, the only state keys that may
+            be referenced; anything else is left over from an earlier turn or was
+            written by a step that did not complete.
+
+    Returns:
+        Dict[str, Any]: Arguments with every reference resolved.
+
+    Raises:
+        LookupError: If a referenced value does not exist (yet) or is not fresh.
+    """
+    resolved = {}
+    for name, value in args.items():
+        if isinstance(value, str) and value.startswith(STATE_REF_PREFIX):
+            path = value[len(STATE_REF_PREFIX):].split(".")
+            if fresh_keys is not None and path[0] not in fresh_keys:
+                raise LookupError(value)
+            current: Any = state.get(path[0]) if hasattr(state, "get") else None
+            for part in path[1:]:
+                if isinstance(current, list) and part.isdigit():
+                    current = current[int(part)]
+                elif isinstance(current, dict):
+                    current = current[part]
+                else:
+                    raise LookupError(value)
+            if current is None:
+                raise LookupError(value)
+            value = current
+        resolved[name] = value
+    return resolved
+
+
+def find_tool_function(agent: BaseAgent, tool_name: str) -> Optional[Callable]:
+    """Returns the function registered on `agent` under `tool_name`, if any."""
+    for tool in getattr(agent, "tools", None) or []:
+        func = getattr(tool, "func", tool)
+        if getattr(func, "__name__", None) == tool_name:
+            return func
+    return None
+
+
+def prepare_direct_call(
+    agent: BaseAgent,
+    step: PlanStep,
+    state: Mapping[str, Any],
+    fresh_keys: Optional[Collection[str]] = None,
+) -> Optional[Tuple[Callable, Dict[str, Any]]]:
+    """
+    Checks whether a plan step can skip its LLM turn and builds the tool call.
+
+    The step must carry a 'tool_args' object, every state reference must resolve
+    (to a fresh key, if `fresh_keys` is given) and the arguments must match the
+    signature of one of the agent's direct tools.
+    Numeric parameters are coerced (launch coordinates are strings).
+
+    Args:
+        agent (BaseAgent): The step's agent.
+        step (PlanStep): The plan step.
+        state (Mapping[str, Any]): Current session state.
+        fresh_keys (Optional[Collection[str]]): State keys references may read (see
+            resolve_state_refs).
+
+    Returns:
+        Optional[Tuple[Callable, Dict[str, Any]]]: The tool function and its arguments,
+        or None when the step must run through its LlmAgent.
+    """
+    tool_args = step.args.get("tool_args")
+    if not isinstance(tool_args, dict):
+        return None
+    try:
+        resolved = resolve_state_refs(tool_args, state, fresh_keys)
+    except LookupError:
+        return None
+    for tool_name in DIRECT_TOOLS.get(step.agent_name, ()):
+        func = find_tool_function(agent, tool_name)
+        if func is None:
+            continue
+        args = dict(resolved)
+        try:
+            signature = inspect.signature(func)
+            for name, value in list(args.items()):
+                param = signature.parameters.get(name)
+                if param is not None and param.annotation in (int, float) and not isinstance(value, bool):
+                    args[name] = param.annotation(value)
+            signature.bind(tool_context=None, **args)
+        except (TypeError, ValueError):
+            continue
+        return func, args
+    return None
+
+
+async def run_direct_tool(
+    agent: BaseAgent,
+    func: Callable,
+    args: Dict[str, Any],
+    ctx: InvocationContext,
+    fallback: Callable[[], AsyncGenerator[Event, None]],
+) -> AsyncGenerator[Event, None]:
+    """
+    Calls a tool on behalf of its agent and yields the matching events.
+
+    Yields a model event with the function call and an event with the function
+    response carrying the tool's state changes. If the tool raises, the error is
+    reported as the function response and the step falls back to its LlmAgent.
+
+    Args:
+        agent (BaseAgent): The agent the call is made for (used as event author).
+        func (Callable): The tool function.
+        args (Dict[str, Any]): Resolved tool arguments.
+        ctx (InvocationContext): The step's invocation context.
+        fallback (Callable): Starts the agent's normal LLM run.
+
+    Yields:
+        Event: The function call and function response events.
+    """
+    call_id = f"adk-{uuid.uuid4()}"
+    agent_ctx = ctx.model_copy(update={"agent": agent})
+    yield Event(
+        invocation_id=ctx.invocation_id,
+        author=agent.name,
+        branch=ctx.branch,
+        content=types.Content(
+            role="model",
+            parts=[types.Part(function_call=types.FunctionCall(id=call_id, name=func.__name__, args=args))],
+        ),
+    )
+
+    tool_context = ToolContext(agent_ctx, function_call_id=call_id)
+    failed = False
+    # Named like ADK's own tool spans, so direct and LLM-driven calls are counted together.
+    with span(f"execute_tool {func.__name__}", **{"gen_ai.tool.name": func.__name__, "tool.direct": True}) as tool_span:
+        try:
+            result = func(tool_context=tool_context, **args)
+            if inspect.isawaitable(result):
+                result = await result
+        except Exception as e:
+            failed = True
+            result = {"error": f"{type(e).__name__}: {e}"}
+            record_error(tool_span, e)
+
+    yield Event(
+        invocation_id=ctx.invocation_id,
+        author=agent.name,
+        branch=ctx.branch,
+        content=types.Content(
+            role="user",
+            parts=[types.Part(function_response=types.FunctionResponse(
+                id=call_id,
+                name=func.__name__,
+                response=result if isinstance(result, dict) else {"result": result},
+            ))],
+        ),
+        actions=tool_context.actions,
+    )
+
+    if failed:
+        async for event in fallback():
+            yield event
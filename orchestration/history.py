@@ -0,0 +1,634 @@
+"""
+history.py
+
+Bounded conversation context for the LLM agents.
+- Gives every agent a sliding window of the conversation, limited by a per-agent
+  token budget and number of previous turns.
+- Keeps only the user's query and the final answer of previous turns; their tool
+  calls and intermediate replies are dropped from the prompt.
+- Prunes the current turn to what the agent's plan step reads: the tool results
+  of the steps it depends on, not every other agent's output.
+- Folds turns that left the window into a rolling digest in session state,
+  marks data keys with the turn that wrote them, compacts the previous turn's
+  launch, weather and news data and drops older data.
+"""
+
+# --- Imports ---
+import copy
+import json
+import logging
+import os
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from google.adk.agents import LlmAgent
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.events import Event
+from google.adk.models import LlmRequest
+from google.genai import types
+
+from .plan_graph import TERMINAL_AGENTS, build_plan_graph, step_inputs
+
+logger = logging.getLogger(__name__)
+
+# State key of the rolling digest: a list of {"invocation_id", "text"}, oldest first.
+DIGEST_STATE_KEY = "conversation_digest"
+# State keys marking each data key with the turn that last wrote it.
+TURN_INDEX_KEY = "turn_index"
+STATE_TURNS_KEY = "state_turns"
+# Rough characters per token, good enough for budgeting.
+CHARS_PER_TOKEN = 4
+# Function-call ids ADK generates itself (not the model's) and the tool behind its auth
+# requests; both as in ADK's own content builder.
+ADK_FUNCTION_CALL_ID_PREFIX = "adk-"
+ADK_CREDENTIAL_FUNCTION_NAME = "adk_request_credential"
+
+
+# --- Policies ---
+@dataclass(frozen=True)
+class HistoryPolicy:
+    """
+    How much conversation history one agent gets.
+
+    Attributes:
+        max_tokens (int): Estimated token budget of the previous turns and digest
+            lines. The current turn is always sent in full and not counted.
+        max_turns (int): Previous turns sent verbatim (query and final answer).
+        include_digest (bool): Prepend the digest of older turns.
+    """
+    max_tokens: int = 2000
+    max_turns: int = 2
+    include_digest: bool = True
+
+
+def policy_from_env(agent_name: str, default: HistoryPolicy) -> HistoryPolicy:
+    """
+    Reads a policy override such as HISTORY_BUDGET_SUMMARIZER_AGENT="6000/4"
+    (tokens/turns) or "6000" (tokens only).
+
+    Args:
+        agent_name (str): Agent name.
+        default (HistoryPolicy): Policy used when no override is set.
+
+    Returns:
+        HistoryPolicy: The effective policy.
+    """
+    value = os.getenv("HISTORY_BUDGET_" + agent_name.upper(), "").strip()
+    if not value:
+        return default
+    parts = [int(p) for p in value.split("/")]
+    return HistoryPolicy(
+        max_tokens=parts[0],
+        max_turns=parts[1] if len(parts) > 1 else default.max_turns,
+        include_digest=default.include_digest,
+    )
+
+
+# --- Token Estimates ---
+def estimate_tokens(content: Optional[types.Content]) -> int:
+    """
+    Estimates the tokens of a content from its text, function calls and responses.
+
+    Args:
+        content (Optional[types.Content]): The content.
+
+    Returns:
+        int: Approximate token count.
+    """
+    if content is None or not content.parts:
+        return 0
+    chars = 0
+    for part in content.parts:
+        if part.text:
+            chars += len(part.text)
+        elif part.function_call:
+            chars += len(part.function_call.name or "") + len(json.dumps(part.function_call.args or {}, default=str))
+        elif part.function_response:
+            chars += len(part.function_response.name or "") + len(json.dumps(part.function_response.response or {}, default=str))
+    return chars // CHARS_PER_TOKEN + 1
+
+
+def _text(event: Event) -> str:
+    if not event.content or not event.content.parts:
+        return ""
+    return "".join(part.text for part in event.content.parts if part.text and not part.thought)
+
+
+def _turns_backwards(events: List[Event], end: int, skip: Optional[str] = None) -> Iterator[Tuple[str, List[Event]]]:
+    """Yields (invocation_id, events) per turn in events[:end], newest turn first, skipping `skip`."""
+    while end > 0:
+        invocation_id = events[end - 1].invocation_id
+        start = end - 1
+        while start > 0 and events[start - 1].invocation_id == invocation_id:
+            start -= 1
+        if invocation_id != skip:
+            yield invocation_id, events[start:end]
+        end = start
+
+
+def _exchange(turn: List[Event]) -> Tuple[Optional[Event], Optional[Event]]:
+    """Returns a turn's user message and its final text answer."""
+    query = next((e for e in turn if e.author == "user" and _text(e)), None)
+    answer = next((e for e in reversed(turn) if e.author != "user" and not e.partial and _text(e)), None)
+    return query, answer
+
+
+# --- Events to Contents ---
+def _foreign_content(event: Event) -> types.Content:
+    """Another agent's event as a user message, so the agent reads it as context."""
+    parts = [types.Part(text="For context:")]
+    for part in event.content.parts:
+        if part.text:
+            parts.append(types.Part(text=f"[{event.author}] said: {part.text}"))
+        elif part.function_call:
+            parts.append(types.Part(
+                text=f"[{event.author}] called tool `{part.function_call.name}` with parameters: {part.function_call.args}"
+            ))
+        elif part.function_response:
+            parts.append(types.Part(
+                text=f"[{event.author}] `{part.function_response.name}` tool returned result: {part.function_response.response}"
+            ))
+        else:
+            parts.append(part)
+    return types.Content(role="user", parts=parts)
+
+
+def _pair_function_responses(contents: List[types.Content]) -> List[types.Content]:
+    """
+    Moves each function response right after the call it answers, as the model API
+    requires; concurrent plan steps interleave other agents' events between them.
+    Responses to several calls of one event are merged; unanswered calls stay as they are.
+    """
+    response_at: Dict[Optional[str], int] = {}
+    for index, content in enumerate(contents):
+        for part in content.parts:
+            if part.function_response:
+                response_at[part.function_response.id] = index
+    paired = []
+    for content in contents:
+        if any(part.function_response for part in content.parts):
+            continue  # Placed after its call below.
+        paired.append(content)
+        answers = sorted({
+            response_at[part.function_call.id]
+            for part in content.parts if part.function_call and part.function_call.id in response_at
+        })
+        if len(answers) == 1:
+            paired.append(contents[answers[0]])
+        elif answers:
+            paired.append(types.Content(role=contents[answers[0]].role, parts=[part for i in answers for part in contents[i].parts]))
+    return paired
+
+
+def events_to_contents(branch: Optional[str], events: List[Event], agent_name: str) -> List[types.Content]:
+    """
+    Converts session events to model contents the way ADK 1.4 builds an agent's request.
+
+    Keeps the events with content on the agent's branch (an event belongs to it when its
+    branch is a prefix), skips credential requests, turns other agents' events into
+    "For context:" user messages, places each function response right after its call
+    and clears ADK-generated function-call ids. Uses only
+    public Event fields, so it does not depend on ADK's private content builder.
+
+    Args:
+        branch (Optional[str]): The agent's branch.
+        events (List[Event]): Events in order.
+        agent_name (str): The agent the contents are for.
+
+    Returns:
+        List[types.Content]: Copies of the contents, safe to send.
+    """
+    contents = []
+    for event in events:
+        content = event.content
+        if not content or not content.role or not content.parts or content.parts[0].text == "":
+            continue
+        if branch and event.branch and not branch.startswith(event.branch):
+            continue
+        if any(
+            (part.function_call and part.function_call.name == ADK_CREDENTIAL_FUNCTION_NAME)
+            or (part.function_response and part.function_response.name == ADK_CREDENTIAL_FUNCTION_NAME)
+            for part in content.parts
+        ):
+            continue
+        if agent_name and event.author not in (agent_name, "user"):
+            content = _foreign_content(event)
+        else:
+            content = copy.deepcopy(content)
+        contents.append(content)
+    contents = _pair_function_responses(contents)
+    for content in contents:
+        for part in content.parts:
+            for call in (part.function_call, part.function_response):
+                if call is not None and call.id and call.id.startswith(ADK_FUNCTION_CALL_ID_PREFIX):
+                    call.id = None
+    return contents
+
+
+_invocation_readable: Optional[bool] = None
+
+
+def _invocation(callback_context: CallbackContext) -> Optional[Any]:
+    """
+    The callback's invocation context (session events, branch), or None.
+
+    CallbackContext has no public accessor for the session's events, so this reads its
+    private attribute (see invocation_readable).
+    """
+    ctx = getattr(callback_context, "_invocation_context", None)
+    if ctx is None or not hasattr(ctx, "session") or not hasattr(ctx, "branch"):
+        return None
+    return ctx
+
+
+def invocation_readable() -> bool:
+    """
+    Checks once whether the installed ADK lets callbacks read the invocation context.
+
+    Builds a CallbackContext around a stand-in invocation and reads it back. If an ADK
+    upgrade breaks this, agents are not attached and keep ADK's own full history,
+    instead of being switched to include_contents='none' with nothing to replace it.
+    """
+    global _invocation_readable
+    if _invocation_readable is None:
+        probe = SimpleNamespace(session=SimpleNamespace(state={}, events=[]), branch=None)
+        try:
+            _invocation_readable = _invocation(CallbackContext(probe)) is probe
+        except Exception:
+            _invocation_readable = False
+        if not _invocation_readable:
+            logger.warning("CallbackContext exposes no invocation context; agents keep ADK's full history.")
+    return _invocation_readable
+
+
+# --- Stale State Digests ---
+def compact_launch_info(launches: Any) -> Any:
+    """Keeps the fields follow-up queries refer to: name, date and location."""
+    if not isinstance(launches, list):
+        return launches
+    keys = ("name", "launch_date", "location_name", "latitude", "longitude")
+    return [{k: launch.get(k) for k in keys if k in launch} if isinstance(launch, dict) else launch for launch in launches]
+
+
+def compact_weather_info(digest: Any) -> Any:
+    """Keeps the location, the launch window's worst case and the triggered flags."""
+    if not isinstance(digest, dict) or "variables" not in digest:
+        return digest  # Not a forecast digest, or already compacted.
+    window = digest.get("launch_window") or {}
+    return {
+        "location": digest.get("location"),
+        "period": digest.get("period"),
+        "launch_window": {"center": window.get("center"), "worst": window.get("worst")} if window else None,
+        "flags": sorted(name for name, flag in (digest.get("flags") or {}).items() if isinstance(flag, dict) and flag.get("triggered")),
+    }
+
+
+def compact_news_articles(articles: Any, limit: int = 5) -> Any:
+    """Keeps the title, source and date of the first `limit` articles."""
+    if not isinstance(articles, list):
+        return articles
+    keys = ("title", "source_name", "published_date")
+    return [{k: article.get(k) for k in keys if k in article} if isinstance(article, dict) else article for article in articles[:limit]]
+
+
+# Compaction applied to data left over from the previous turn. None drops the value.
+STALE_STATE_COMPACTORS = {
+    "launch_info": compact_launch_info,
+    "weather_info": compact_weather_info,
+    "weather_info_by_launch": lambda by_launch: (
+        {name: compact_weather_info(d) for name, d in by_launch.items()} if isinstance(by_launch, dict) else by_launch
+    ),
+    "weather_info_raw": None,
+    "news_articles": compact_news_articles,
+}
+
+
+# --- History Manager ---
+class HistoryManager:
+    """
+    Builds each agent's prompt history from a bounded window of the session.
+
+    `attach` switches an agent to include_contents='none' and rebuilds its
+    contents in a before_model_callback (unless the installed ADK hides the
+    session from callbacks, in which case the agent is left alone), walking the session events backwards
+    only as far as the window reaches, so the cost per model call does not grow
+    with the length of the conversation. With plan_aware set, the current turn
+    is pruned to the tool results of the steps the agent's plan step depends on
+    (terminal agents also get a one-line plan). `before_turn_callback` runs
+    first at the start of every turn (on the planner) to fold the previous turn
+    into the digest and compact or drop its stale state.
+    """
+
+    def __init__(
+        self,
+        policies: Optional[Dict[str, HistoryPolicy]] = None,
+        default_policy: HistoryPolicy = HistoryPolicy(),
+        max_digest_turns: int = 20,
+        max_answer_chars: int = 300,
+        planner_name: Optional[str] = None,
+        plan_aware: bool = True,
+        max_state_turns: int = 2,
+    ):
+        """
+        Args:
+            policies (Optional[Dict[str, HistoryPolicy]]): Policies by agent name, with
+                HISTORY_BUDGET_<AGENT> environment overrides.
+            default_policy (HistoryPolicy): Policy of agents without their own.
+            max_digest_turns (int): Digest lines kept in state; older ones are dropped.
+            max_answer_chars (int): Length of an answer in its digest line.
+            planner_name (Optional[str]): The planner agent, whose output is reduced to
+                a plan line for terminal agents and hidden from the others.
+            plan_aware (bool): Prune the current turn to what each plan step reads.
+            max_state_turns (int): Data keys last written this many turns ago or
+                earlier are dropped; newer ones from previous turns are compacted.
+        """
+        self.policies = {name: policy_from_env(name, policy) for name, policy in (policies or {}).items()}
+        self.default_policy = default_policy
+        self.max_digest_turns = max_digest_turns
+        self.max_answer_chars = max_answer_chars
+        self.planner_name = planner_name
+        self.plan_aware = plan_aware
+        self.max_state_turns = max_state_turns
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def policy(self, agent_name: str) -> HistoryPolicy:
+        """Returns the policy of an agent."""
+        if agent_name not in self.policies:
+            self.policies[agent_name] = policy_from_env(agent_name, self.default_policy)
+        return self.policies[agent_name]
+
+    def attach(self, agent: LlmAgent) -> LlmAgent:
+        """
+        Makes an agent take its history from the manager.
+
+        Leaves the agent unchanged, with ADK's full history, if callbacks cannot
+        read the session (see invocation_readable).
+
+        Args:
+            agent (LlmAgent): The agent; its own before_model_callbacks run afterwards.
+
+        Returns:
+            LlmAgent: The same agent.
+        """
+        if not invocation_readable():
+            return agent
+        agent.include_contents = "none"
+        agent.before_model_callback = [self.before_model_callback] + agent.canonical_before_model_callbacks
+        return agent
+
+    def digest_line(self, turn: List[Event]) -> Optional[str]:
+        """Returns the digest line of a finished turn, or None if it had no query."""
+        query, answer = _exchange(turn)
+        if query is None:
+            return None
+        line = f"User: {_text(query).strip()}"
+        if answer is not None:
+            text = " ".join(_text(answer).split())
+            if len(text) > self.max_answer_chars:
+                text = text[: self.max_answer_chars].rstrip() + "…"
+            line += f" -> Answer: {text}"
+        return line
+
+    def prune_turn(self, events: List[Event], agent_name: str, plan_str: Any) -> List[Event]:
+        """
+        Reduces the current turn's events to what an agent's plan step reads.
+
+        Keeps the user's message, the agent's own events and the tool results of
+        the steps it depends on; drops other agents' replies and tool calls.
+        Terminal agents get the planner's output as a one-line list of steps.
+        Nothing is pruned when the plan is missing or does not contain the agent.
+
+        Args:
+            events (List[Event]): The current turn's events.
+            agent_name (str): The agent.
+            plan_str (Any): state['agent_execution_plan_str'].
+
+        Returns:
+            List[Event]: The events to build the contents from.
+        """
+        try:
+            steps = build_plan_graph(plan_str) if plan_str else []
+        except ValueError:
+            return events
+        inputs = step_inputs(steps, agent_name)
+        if inputs is None:
+            return events
+
+        pruned: List[Event] = []
+        for event in events:
+            if event.author in ("user", agent_name):
+                pruned.append(event)
+            elif event.author == self.planner_name:
+                if agent_name in TERMINAL_AGENTS and event.content and not event.partial:
+                    plan_line = "Plan for this query: " + ", ".join(step.agent_name for step in steps)
+                    pruned.append(event.model_copy(update={"content": types.Content(role="model", parts=[types.Part(text=plan_line)])}))
+            elif event.author in inputs and event.content and event.content.parts:
+                parts = [part for part in event.content.parts if part.function_response]
+                if parts:
+                    pruned.append(event.model_copy(update={"content": types.Content(role=event.content.role, parts=parts)}))
+        return pruned
+
+    def build_contents(
+        self,
+        events: List[Event],
+        invocation_id: str,
+        branch: Optional[str],
+        agent_name: str,
+        digest: Optional[List[Dict[str, str]]] = None,
+        plan_str: Any = None,
+    ) -> List[types.Content]:
+        """
+        Builds an agent's contents: the digest of older turns, the previous turns
+        that fit the budget (query and final answer) and the current turn, pruned
+        to the agent's plan step when plan_aware is set.
+
+        Args:
+            events (List[Event]): The session events.
+            invocation_id (str): The current turn.
+            branch (Optional[str]): The agent's branch.
+            agent_name (str): The agent.
+            digest (Optional[List[Dict[str, str]]]): state['conversation_digest'].
+            plan_str (Any): state['agent_execution_plan_str'], for plan-aware pruning.
+
+        Returns:
+            List[types.Content]: The contents for the model request.
+        """
+        policy = self.policy(agent_name)
+        current: List[Event] = []
+        for event in reversed(events):
+            if event.invocation_id != invocation_id:
+                break
+            current.append(event)
+        current.reverse()
+        turn_events = self.prune_turn(current, agent_name, plan_str) if self.plan_aware else current
+        contents = events_to_contents(branch, turn_events, agent_name)
+        pruned_tokens = 0
+        if len(turn_events) != len(current) or any(a is not b for a, b in zip(turn_events, current)):
+            unpruned = events_to_contents(branch, current, agent_name)
+            pruned_tokens = max(0, sum(map(estimate_tokens, unpruned)) - sum(map(estimate_tokens, contents)))
+        used = 0
+
+        # Previous turns, newest first, while they fit.
+        window: List[List[types.Content]] = []
+        in_window = set()
+        for turn_id, turn in _turns_backwards(events, len(events) - len(current)):
+            if len(window) >= policy.max_turns:
+                break
+            exchange = [event for event in _exchange(turn) if event is not None]
+            turn_contents = events_to_contents(branch, exchange, agent_name)
+            tokens = sum(estimate_tokens(content) for content in turn_contents)
+            if used + tokens > policy.max_tokens:
+                break
+            used += tokens
+            window.append(turn_contents)
+            in_window.add(turn_id)
+
+        # Digest lines of the turns before the window, newest first, while they fit.
+        lines: List[str] = []
+        if policy.include_digest:
+            for entry in reversed(digest or []):
+                if entry.get("invocation_id") in in_window:
+                    continue
+                tokens = len(entry.get("text", "")) // CHARS_PER_TOKEN + 1
+                if used + tokens > policy.max_tokens:
+                    break
+                used += tokens
+                lines.append(entry.get("text", ""))
+
+        history: List[types.Content] = []
+        if lines:
+            text = "For context, earlier in this conversation:\n" + "\n".join(f"- {line}" for line in reversed(lines))
+            history.append(types.Content(role="user", parts=[types.Part(text=text)]))
+        for turn_contents in reversed(window):
+            history.extend(turn_contents)
+
+        total = used + sum(estimate_tokens(content) for content in contents)
+        stats = self._stats.setdefault(
+            agent_name,
+            {"calls": 0, "tokens": 0, "history_tokens": 0, "pruned_tokens": 0, "max_tokens": 0, "turns": 0, "digest_lines": 0},
+        )
+        stats["calls"] += 1
+        stats["tokens"] += total
+        stats["history_tokens"] += used
+        stats["pruned_tokens"] += pruned_tokens
+        stats["max_tokens"] = max(stats["max_tokens"], total)
+        stats["turns"] += len(window)
+        stats["digest_lines"] += len(lines)
+        return history + contents
+
+    def compact_state(self, state: Any, turn: Optional[int] = None) -> List[str]:
+        """
+        Replaces the data of previous turns in state with their digests, and drops
+        data whose turn mark (state['state_turns']) is max_state_turns or more old.
+
+        Args:
+            state: Session state (a State or dict); changed in place.
+            turn (Optional[int]): The current turn index; None skips dropping.
+
+        Returns:
+            List[str]: The keys that changed.
+        """
+        marks = dict(state.get(STATE_TURNS_KEY) or {})
+        changed = []
+        for key, compact in STALE_STATE_COMPACTORS.items():
+            value = state.get(key)
+            if value is None:
+                continue
+            if turn is not None and key in marks and turn - marks[key] >= self.max_state_turns:
+                compact = None
+            compacted = None if compact is None else compact(value)
+            if compacted != value:
+                state[key] = compacted
+                changed.append(key)
+            if compacted is None:
+                marks.pop(key, None)
+        if marks != (state.get(STATE_TURNS_KEY) or {}):
+            state[STATE_TURNS_KEY] = marks
+        return changed
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Returns per-agent model calls and estimated tokens sent (total, of which history, mean and max)."""
+        return {
+            name: dict(s, mean_tokens=round(s["tokens"] / s["calls"], 1) if s["calls"] else 0.0)
+            for name, s in self._stats.items()
+        }
+
+    def report(self) -> str:
+        """Returns a per-agent table of model calls, estimated tokens sent and tokens saved by pruning."""
+        lines = [f"{'agent':<20} {'calls':>6} {'sent':>9} {'mean':>7} {'history':>8} {'pruned':>8} {'saved':>6}"]
+        for name, s in sorted(self.stats().items()):
+            saved = s["pruned_tokens"] / (s["tokens"] + s["pruned_tokens"]) if s["tokens"] + s["pruned_tokens"] else 0.0
+            lines.append(
+                f"{name:<20} {s['calls']:>6} {s['tokens']:>9} {s['mean_tokens']:>7} "
+                f"{s['history_tokens']:>8} {s['pruned_tokens']:>8} {saved:>6.0%}"
+            )
+        return "\n".join(lines)
+
+    # --- ADK Callbacks ---
+    def before_turn_callback(self, callback_context: CallbackContext) -> Optional[types.Content]:
+        """
+        Folds the previous turn into the digest, marks the data keys it wrote with
+        its turn index and compacts (or, once old enough, drops) stale data.
+
+        Runs first in the planner's before_agent_callback list, once per turn.
+        Never replaces the planner's reply.
+
+        Args:
+            callback_context (CallbackContext): The planner's callback context.
+
+        Returns:
+            Optional[types.Content]: Always None.
+        """
+        ctx = _invocation(callback_context)
+        if ctx is None:
+            return None
+        state = callback_context.state
+        previous = next(_turns_backwards(ctx.session.events, len(ctx.session.events), skip=ctx.invocation_id), None)
+        if previous is not None:
+            turn_id, turn = previous
+            digest = list(state.get(DIGEST_STATE_KEY) or [])
+            if any(entry.get("invocation_id") == turn_id for entry in digest[-1:]):
+                return None  # Already folded, e.g. the planner ran twice in this turn.
+            line = self.digest_line(turn)
+            if line is not None:
+                digest.append({"invocation_id": turn_id, "text": line})
+                state[DIGEST_STATE_KEY] = digest[-self.max_digest_turns:]
+
+            # The previous turn is turn_index; this one is turn_index + 1.
+            previous_index = state.get(TURN_INDEX_KEY, 0)
+            marks = dict(state.get(STATE_TURNS_KEY) or {})
+            for event in turn:
+                delta = event.actions.state_delta if event.actions else {}
+                if TURN_INDEX_KEY in delta:
+                    continue  # Written by this callback (compaction), not by a tool.
+                for key in delta:
+                    if key in STALE_STATE_COMPACTORS:
+                        marks[key] = previous_index
+            state[STATE_TURNS_KEY] = marks
+            state[TURN_INDEX_KEY] = previous_index + 1
+            changed = self.compact_state(state, previous_index + 1)
+            if changed:
+                logger.info("Compacted stale state from the previous turn: %s", changed)
+        return None
+
+    def before_model_callback(self, callback_context: CallbackContext, llm_request: LlmRequest) -> None:
+        """
+        Replaces the request's contents with the agent's bounded history.
+
+        Args:
+            callback_context (CallbackContext): The agent's callback context.
+            llm_request (LlmRequest): The request about to be sent.
+        """
+        ctx = _invocation(callback_context)
+        if ctx is None:
+            return None
+        llm_request.contents = self.build_contents(
+            ctx.session.events,
+            ctx.invocation_id,
+            ctx.branch,
+            callback_context.agent_name,
+            callback_context.state.get(DIGEST_STATE_KEY),
+            callback_context.state.get("agent_execution_plan_str"),
+        )
+        return None
@@ -0,0 +1,412 @@
+"""
+plan_graph.py
+
+Dependency-graph execution for the DynamicOrchestratorAgent.
+- Parses the planner output into an ordered list of plan steps.
+- Derives the data dependencies between steps (e.g. weather needs launch data).
+- Runs independent steps concurrently on the event loop and merges their events.
+- Enforces the turn deadline: overdue steps are cancelled or skipped and every
+  step's outcome is reported before the terminal steps run.
+- Records a telemetry span per step with its outcome.
+"""
+
+# --- Imports ---
+import asyncio
+import contextvars
+import json
+import logging
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncGenerator, Callable, Dict, List, Optional, Tuple
+
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event
+
+from utils.deadline import current_deadline
+from utils.telemetry import end_span, record_error, start_span_in
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+# Which agents read the session state written by which other agents.
+# A step only waits for the dependencies that actually appear earlier in the plan.
+AGENT_DEPENDENCIES: Dict[str, Tuple[str, ...]] = {
+    "launches_agent": (),
+    "weather_agent": ("launches_agent",),
+    "news_agent": ("launches_agent",),
+}
+
+# Agents that consolidate everything gathered before them.
+TERMINAL_AGENTS = ("summarizer_agent",)
+
+# Step outcomes reported to on_outcomes (and stored under state['step_outcomes']).
+STEP_COMPLETED = "completed"
+STEP_FAILED = "failed"
+STEP_TIMED_OUT = "timed_out"
+STEP_SKIPPED = "skipped"
+
+_CODE_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+# --- Plan Model ---
+@dataclass
+class PlanStep:
+    """
+    A single step of an execution plan.
+
+    Attributes:
+        index (int): Position of the step in the planner output.
+        agent_name (str): Name of the sub-agent to run.
+        depends_on (Tuple[int, ...]): Indexes of the steps that must finish first.
+        args (Dict[str, Any]): Extra per-step data supplied by the planner.
+    """
+    index: int
+    agent_name: str
+    depends_on: Tuple[int, ...] = ()
+    args: Dict[str, Any] = field(default_factory=dict)
+
+
+def parse_plan(plan_str: str) -> List[Any]:
+    """
+    Decodes the raw planner output into a list of plan entries.
+
+    Tolerates Markdown code fences around the JSON, which the planner model
+    sometimes adds.
+
+    Args:
+        plan_str (str): The planner output stored under 'agent_execution_plan_str'.
+
+    Returns:
+        List[Any]: Plan entries, each either an agent name or a step dictionary.
+
+    Raises:
+        ValueError: If the output is not a JSON list.
+    """
+    if isinstance(plan_str, list):
+        return plan_str
+    cleaned = _CODE_FENCE_RE.sub("", (plan_str or "").strip())
+    try:
+        plan = json.loads(cleaned or "[]")
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Malformed execution plan: {e}") from e
+    if not isinstance(plan, list):
+        raise ValueError("Execution plan must be a JSON list.")
+    return plan
+
+
+def build_plan_graph(plan_str: str) -> List[PlanStep]:
+    """
+    Builds the dependency graph for an execution plan.
+
+    Each plan entry is either an agent name (dependencies are derived from
+    AGENT_DEPENDENCIES) or an object such as
+    {"agent": "weather_agent", "depends_on": ["launches_agent"]}. A step can only
+    depend on steps listed before it, so the plan order is always a valid
+    topological order.
+
+    Args:
+        plan_str (str): The planner output stored under 'agent_execution_plan_str'.
+
+    Returns:
+        List[PlanStep]: The plan steps in planner order.
+
+    Raises:
+        ValueError: If the plan cannot be parsed.
+    """
+    steps: List[PlanStep] = []
+    for entry in parse_plan(plan_str):
+        explicit_deps: Optional[List[str]] = None
+        args: Dict[str, Any] = {}
+        if isinstance(entry, str):
+            agent_name = entry
+        elif isinstance(entry, dict) and isinstance(entry.get("agent"), str):
+            agent_name = entry["agent"]
+            if isinstance(entry.get("depends_on"), list):
+                explicit_deps = [d for d in entry["depends_on"] if isinstance(d, str)]
+            args = {k: v for k, v in entry.items() if k not in ("agent", "depends_on")}
+        else:
+            continue
+
+        # Map dependency names to the latest earlier step running that agent.
+        latest_index = {step.agent_name: step.index for step in steps}
+        if explicit_deps is not None:
+            wanted = explicit_deps
+        elif agent_name in TERMINAL_AGENTS:
+            wanted = list(latest_index)
+        else:
+            wanted = AGENT_DEPENDENCIES.get(agent_name, ())
+        depends_on = tuple(sorted({latest_index[name] for name in wanted if name in latest_index}))
+
+        steps.append(PlanStep(index=len(steps), agent_name=agent_name, depends_on=depends_on, args=args))
+    return steps
+
+
+# --- Graph Execution ---
+def assign_branches(steps: List[PlanStep], base_branch: Optional[str], root_name: str) -> Dict[int, Optional[str]]:
+    """
+    Chooses the ADK event branch each step runs on.
+
+    A step that may overlap in time with a step that is neither its ancestor nor
+    its descendant gets its own branch, so the two do not see each other's
+    in-flight tool calls in their history. The branch extends the branch of its
+    (single) isolated dependency, so it still sees that dependency's events. All
+    other steps keep the base branch and see the whole conversation, exactly as
+    in sequential mode.
+
+    Args:
+        steps (List[PlanStep]): The steps built by build_plan_graph.
+        base_branch (Optional[str]): The branch of the orchestrator's context.
+        root_name (str): Name used as the root of isolated branches.
+
+    Returns:
+        Dict[int, Optional[str]]: The branch for each step index.
+    """
+    ancestors: Dict[int, set] = {}
+    for step in steps:
+        ancestors[step.index] = set(step.depends_on)
+        for dep in step.depends_on:
+            ancestors[step.index] |= ancestors[dep]
+
+    root = f"{base_branch}.{root_name}" if base_branch else root_name
+    branches: Dict[int, Optional[str]] = {}
+    for step in steps:
+        concurrent = any(
+            other.index != step.index
+            and other.index not in ancestors[step.index]
+            and step.index not in ancestors[other.index]
+            for other in steps
+        )
+        isolated_parents = [branches[d] for d in step.depends_on if branches[d] != base_branch]
+        if not concurrent or len(isolated_parents) > 1:
+            branches[step.index] = base_branch
+        elif isolated_parents:
+            branches[step.index] = f"{isolated_parents[0]}.{step.agent_name}"
+        else:
+            branches[step.index] = f"{root}.{step.agent_name}"
+    return branches
+
+
+def outcome_keys(steps: List[PlanStep]) -> Dict[int, str]:
+    """Names steps by agent, adding the step index when an agent appears more than once."""
+    counts: Dict[str, int] = {}
+    for step in steps:
+        counts[step.agent_name] = counts.get(step.agent_name, 0) + 1
+    return {
+        step.index: step.agent_name if counts[step.agent_name] == 1 else f"{step.agent_name}[{step.index}]"
+        for step in steps
+    }
+
+
+def step_inputs(steps: List[PlanStep], agent_name: str) -> Optional[Tuple[str, ...]]:
+    """
+    Returns the agents whose output a step reads, i.e. the agents of the steps it depends on.
+
+    Args:
+        steps (List[PlanStep]): The plan.
+        agent_name (str): The step's agent (its last step if it appears more than once).
+
+    Returns:
+        Optional[Tuple[str, ...]]: Agent names in plan order, or None if the agent is not in the plan.
+    """
+    step = next((s for s in reversed(steps) if s.agent_name == agent_name), None)
+    if step is None:
+        return None
+    return tuple(dict.fromkeys(steps[index].agent_name for index in step.depends_on))
+
+
+async def run_plan_graph(
+    steps: List[PlanStep],
+    start_step: Callable[[PlanStep, InvocationContext, Dict[str, str]], Optional[AsyncGenerator[Event, None]]],
+    ctx: InvocationContext,
+    branch_root: str = "plan",
+    deadline: Optional[float] = None,
+    on_outcomes: Optional[Callable[[Dict[str, str]], Optional[Event]]] = None,
+    on_step_done: Optional[Callable[[PlanStep, str], Optional[Event]]] = None,
+) -> AsyncGenerator[Event, None]:
+    """
+    Runs the plan steps, starting every step as soon as its dependencies are done.
+
+    Events are merged with these guarantees:
+    - Events of a single step keep their original order.
+    - A step only starts after every event of its dependencies has been yielded
+      (and therefore appended to the session by the runner), so it sees their state.
+    - A step does not continue until its previous event has been consumed upstream.
+    - Events that become available at the same time are yielded in plan order.
+
+    Non-terminal steps run with `deadline` as their current_deadline, so their tool
+    and upstream calls stop in time. Once it passes, running non-terminal steps are
+    cancelled (timed_out) and unstarted ones are skipped; a step that raises is
+    recorded as failed. Either way the plan goes on, so the terminal steps can still
+    answer from whatever data was gathered. They are not bound by the deadline.
+
+    Args:
+        steps (List[PlanStep]): The steps built by build_plan_graph.
+        start_step (Callable): Starts a step in the given context, given the outcomes
+            of its dependencies by agent name, and returns its event generator, or
+            None if the step cannot run (e.g. unknown agent).
+        ctx (InvocationContext): The shared invocation context.
+        branch_root (str): Root name for the branches of concurrent steps.
+        deadline (Optional[float]): time.monotonic() deadline for non-terminal steps.
+        on_outcomes (Optional[Callable]): Called once with the outcome of every
+            non-terminal step, right before the first terminal step starts (or when
+            the plan ends); the event it returns is yielded.
+        on_step_done (Optional[Callable]): Called with each non-terminal step and
+            its outcome as soon as it finishes; the event it returns (e.g. a
+            progress update) is yielded before any event that follows.
+
+    Yields:
+        Event: Events from all running steps.
+    """
+    finished: set = set()
+    started: set = set()
+    generators: Dict[int, AsyncGenerator[Event, None]] = {}
+    contexts: Dict[int, contextvars.Context] = {}
+    spans: Dict[int, Any] = {}
+    pending: Dict[asyncio.Task, int] = {}
+    outcomes: Dict[int, str] = {}
+    done_steps: List[int] = []
+    branches = assign_branches(steps, ctx.branch, branch_root)
+    keys = outcome_keys(steps)
+    terminal = {step.index for step in steps if step.agent_name in TERMINAL_AGENTS}
+    loop = asyncio.get_running_loop()
+    report_due = on_outcomes is not None
+
+    def is_ready(step: PlanStep) -> bool:
+        return step.index not in started and all(dep in finished for dep in step.depends_on)
+
+    def finish(index: int, outcome: str):
+        finished.add(index)
+        if index not in terminal:
+            outcomes[index] = outcome
+            done_steps.append(index)
+        step_span = spans.pop(index, None)
+        if step_span is not None:
+            end_span(step_span, error=outcome if outcome in (STEP_FAILED, STEP_TIMED_OUT) else None, **{"plan.step.outcome": outcome})
+
+    def start_span(step: PlanStep, context: contextvars.Context):
+        spans[step.index] = start_span_in(
+            context,
+            f"plan_step {step.agent_name}",
+            **{
+                "plan.step.index": step.index,
+                "plan.step.key": keys[step.index],
+                "plan.step.depends_on": list(step.depends_on),
+                "plan.step.tool_args": "tool_args" in step.args,
+                "gcp.vertex.agent.invocation_id": ctx.invocation_id,
+            },
+        )
+
+    def advance(index: int):
+        # The generator runs in its step's context, which carries the deadline.
+        task = loop.create_task(generators[index].__anext__(), context=contexts[index])
+        pending[task] = index
+
+    def overdue() -> bool:
+        return deadline is not None and time.monotonic() >= deadline
+
+    def start_ready_steps():
+        # Skipped steps count as finished and may unblock others, so repeat until stable.
+        progressed = True
+        while progressed:
+            progressed = False
+            for step in steps:
+                if not is_ready(step) or (report_due and step.index in terminal):
+                    continue
+                started.add(step.index)
+                if step.index not in terminal and overdue():
+                    logger.info("Skipping %s: turn deadline reached.", step.agent_name)
+                    start_span(step, contextvars.copy_context())
+                    finish(step.index, STEP_SKIPPED)
+                    progressed = True
+                    continue
+                step_ctx = ctx
+                if branches[step.index] != ctx.branch:
+                    step_ctx = ctx.model_copy()
+                    step_ctx.branch = branches[step.index]
+                dependency_outcomes: Dict[str, str] = {}
+                for dep in step.depends_on:
+                    # An agent that ran twice counts as completed only if both steps did.
+                    name = steps[dep].agent_name
+                    if dependency_outcomes.get(name, STEP_COMPLETED) == STEP_COMPLETED:
+                        dependency_outcomes[name] = outcomes.get(dep, STEP_COMPLETED)
+                generator = start_step(step, step_ctx, dependency_outcomes)
+                if generator is None:
+                    # Unknown agent names are skipped, as in sequential mode.
+                    finish(step.index, STEP_SKIPPED)
+                    progressed = True
+                    continue
+                generators[step.index] = generator
+                contexts[step.index] = contextvars.copy_context()
+                contexts[step.index].run(current_deadline.set, None if step.index in terminal else deadline)
+                start_span(step, contexts[step.index])
+                advance(step.index)
+
+    async def cancel_overdue_steps():
+        overdue_tasks = [task for task, index in pending.items() if index not in terminal]
+        for task in overdue_tasks:
+            task.cancel()
+        await asyncio.gather(*overdue_tasks, return_exceptions=True)
+        for task in overdue_tasks:
+            index = pending.pop(task)
+            logger.info("Cancelled %s: turn deadline reached.", steps[index].agent_name)
+            await generators.pop(index).aclose()
+            finish(index, STEP_TIMED_OUT)
+
+    def step_done_events():
+        while done_steps:
+            index = done_steps.pop(0)
+            if on_step_done is not None:
+                event = on_step_done(steps[index], outcomes[index])
+                if event is not None:
+                    yield event
+
+    try:
+        while True:
+            start_ready_steps()
+            for event in step_done_events():
+                yield event
+            if report_due and (not pending or any(is_ready(steps[i]) for i in terminal)):
+                report_due = False
+                event = on_outcomes({keys[i]: outcome for i, outcome in sorted(outcomes.items())})
+                if event is not None:
+                    yield event
+                continue
+            if not pending:
+                break
+
+            timeout = None
+            if deadline is not None and any(index not in terminal for index in pending.values()):
+                timeout = max(0.0, deadline - time.monotonic())
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                await cancel_overdue_steps()
+                continue
+
+            for task in sorted(done, key=lambda t: pending[t]):
+                index = pending.pop(task)
+                try:
+                    event = task.result()
+                except StopAsyncIteration:
+                    del generators[index]
+                    finish(index, STEP_COMPLETED)
+                    continue
+                except Exception as e:
+                    if index in terminal:
+                        raise
+                    # One failing data step must not take down the whole turn.
+                    logger.warning("Step %s failed: %s: %s", steps[index].agent_name, type(e).__name__, e)
+                    record_error(spans[index], e)
+                    del generators[index]
+                    finish(index, STEP_FAILED)
+                    continue
+                yield event
+                advance(index)
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        for generator in generators.values():
+            await generator.aclose()
+        for index in list(spans):
+            finish(index, STEP_FAILED)
@@ -0,0 +1,385 @@
+"""
+plan_resolver.py
+
+Local fast path for the MasterPlannerAgent.
+- Classifies the user query by keyword intents and builds the plan locally.
+- Remembers recent normalized-query -> plan results, including LLM plans.
+- Fills in tool arguments for the steps it can, so tool agents can skip their LLM turn.
+- Falls back to the LLM planner only when its confidence is low, and reports hit rate and confidence.
+"""
+
+# --- Imports ---
+import json
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from google.adk.agents.callback_context import CallbackContext
+from google.genai import types
+
+from utils import get_gazetteer
+
+from .plan_graph import parse_plan
+
+# --- Intent Keywords ---
+# Each intent maps keywords to how strongly they indicate it (1.0 = unambiguous).
+INTENT_KEYWORDS: Dict[str, Dict[str, float]] = {
+    "launches_agent": {
+        "launch": 1.0, "launches": 1.0, "launched": 1.0, "liftoff": 1.0, "rocket": 1.0, "rockets": 1.0,
+        "starship": 0.9, "falcon": 0.9, "artemis": 0.9, "mission": 0.7, "missions": 0.7,
+        "spacex": 0.6, "nasa": 0.6, "isro": 0.6, "esa": 0.6, "ula": 0.6, "roscosmos": 0.6,
+    },
+    "weather_agent": {
+        "weather": 1.0, "forecast": 1.0, "temperature": 1.0, "rain": 0.95, "raining": 0.95,
+        "windy": 0.95, "wind": 0.9, "humidity": 0.95, "humid": 0.9, "snow": 0.9, "sunny": 0.9,
+        "cloudy": 0.9, "storm": 0.85, "hot": 0.6, "cold": 0.6,
+    },
+    "news_agent": {
+        "news": 1.0, "headlines": 1.0, "articles": 1.0, "article": 1.0, "stories": 0.8,
+        "updates": 0.7, "buzz": 0.7, "coverage": 0.8,
+    },
+}
+
+# Words that make a launch mention refer to specific launches rather than a news topic
+# ("news on the latest SpaceX launch" vs. "news about space launches").
+SPECIFIC_LAUNCH_CUES = {
+    "next", "latest", "upcoming", "last", "recent", "first", "previous", "past", "today", "tomorrow",
+    "spacex", "nasa", "isro", "esa", "ula", "roscosmos", "starship", "falcon", "artemis",
+}
+
+# Plan order used by the planner examples: data producers first, summarizer last.
+AGENT_ORDER = ["launches_agent", "weather_agent", "news_agent"]
+TERMINAL_AGENT = "summarizer_agent"
+
+# Small talk that needs no data, only the summarizer's scope message.
+SMALL_TALK = {"hi", "hello", "hey", "thanks", "thank you", "help", "what can you do", "who are you"}
+
+# --- Tool Argument Extraction ---
+AGENCIES = {"spacex", "nasa", "isro", "esa", "ula", "roscosmos", "jaxa", "arianespace", "cnsa", "rocketlab"}
+PAST_CUES = {"past", "previous", "last", "recent", "latest", "launched"}
+FIRST_CUES = {"first", "initial", "earliest", "maiden"}
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+}
+# Words dropped when deriving a news search query from the user's text.
+NEWS_STOPWORDS = {
+    "a", "an", "the", "some", "any", "give", "get", "show", "tell", "me", "us", "about", "on", "of",
+    "for", "in", "regarding", "around", "related", "to", "what", "whats", "what's", "is", "are",
+    "latest", "recent", "new", "top", "please", "going", "news", "headlines", "articles", "article",
+    "stories", "updates", "coverage", "buzz", "and", "with", "there", "i", "want", "can", "you",
+}
+
+# Weather dates the rules resolve themselves (days from today); any other date
+# wording is left to the weather agent.
+RELATIVE_DAYS = {"today": 0, "tonight": 0, "now": 0, "current": 0, "currently": 0, "tomorrow": 1}
+DATE_WORDS = {
+    "yesterday", "next", "week", "weekend", "day", "days", "date",
+    "monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday",
+    "january", "february", "march", "april", "may", "june", "july", "august",
+    "september", "october", "november", "december",
+    "jan", "feb", "mar", "apr", "jun", "jul", "aug", "sep", "sept", "oct", "nov", "dec",
+}
+
+# Words that change the meaning of the keywords around them.
+NEGATIONS = {"not", "no", "without", "except", "dont", "don't", "isnt", "instead"}
+
+_WORD_RE = re.compile(r"[a-z0-9']+")
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalizes a user query for classification and caching.
+
+    Args:
+        query (str): Raw user text.
+
+    Returns:
+        str: Lower-cased words joined by single spaces, accents and punctuation removed.
+    """
+    decomposed = unicodedata.normalize("NFKD", query or "")
+    text = "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+    return " ".join(_WORD_RE.findall(text))
+
+
+@dataclass
+class PlanResolution:
+    """
+    A locally resolved plan.
+
+    Attributes:
+        plan (List[Any]): Ordered plan entries (agent names, or step objects with
+            'tool_args'), ending with the summarizer.
+        confidence (float): Confidence between 0 and 1.
+        source (str): "cache" or "rules".
+    """
+    plan: List[Any]
+    confidence: float
+    source: str
+
+
+# --- Resolver ---
+class PlanResolver:
+    """
+    Resolves execution plans without an LLM call whenever it is confident enough.
+
+    Use `before_planner_callback` / `after_planner_callback` as the planner agent's
+    before/after agent callbacks: a confident resolution skips the model call, and
+    every plan the LLM produces is remembered for the same query.
+    """
+
+    def __init__(self, min_confidence: float = 0.8, cache_size: int = 512, emit_tool_args: bool = True):
+        """
+        Args:
+            min_confidence (float): Rule resolutions below this fall back to the LLM planner.
+            cache_size (int): Number of recent normalized queries remembered.
+            emit_tool_args (bool): Attach tool arguments to the steps the rules can fill in.
+        """
+        self.min_confidence = min_confidence
+        self.cache_size = cache_size
+        self.emit_tool_args = emit_tool_args
+        self._cache: "OrderedDict[str, List[Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counts = {"lookups": 0, "cache_hits": 0, "rule_hits": 0, "llm_fallbacks": 0}
+        self._confidence_sum = 0.0
+
+    # --- Classification ---
+    def classify(self, query: str) -> PlanResolution:
+        """
+        Builds a plan from keyword intents.
+
+        Confidence is the weakest signal among the detected intents, reduced for
+        negations and very long queries, where keywords are less reliable.
+
+        Args:
+            query (str): Raw or normalized user query.
+
+        Returns:
+            PlanResolution: The rule-based plan and its confidence.
+        """
+        normalized = normalize_query(query)
+        words = normalized.split()
+        if not words:
+            return PlanResolution([TERMINAL_AGENT], 0.0, "rules")
+        if normalized in SMALL_TALK:
+            return PlanResolution([TERMINAL_AGENT], 0.95, "rules")
+
+        strengths: Dict[str, float] = {}
+        for intent, keywords in INTENT_KEYWORDS.items():
+            best = max((keywords.get(word, 0.0) for word in words), default=0.0)
+            if best > 0:
+                strengths[intent] = best
+
+        if not strengths:
+            # Probably out of scope, but phrasing may simply be unusual: let the LLM decide.
+            return PlanResolution([TERMINAL_AGENT], 0.3, "rules")
+
+        if "news_agent" in strengths and "launches_agent" in strengths and not SPECIFIC_LAUNCH_CUES.intersection(words):
+            # Launches are only the news topic here; no launch lookup is needed.
+            del strengths["launches_agent"]
+            strengths["news_agent"] = min(strengths["news_agent"], 0.85)
+
+        confidence = min(strengths.values())
+        if NEGATIONS.intersection(words):
+            confidence *= 0.5
+        if len(words) > 25:
+            confidence *= 0.8
+
+        plan = [agent for agent in AGENT_ORDER if agent in strengths] + [TERMINAL_AGENT]
+        if self.emit_tool_args:
+            plan = self.attach_tool_args(words, plan)
+        return PlanResolution(plan, round(confidence, 3), "rules")
+
+    @staticmethod
+    def _requested_count(words: List[str]) -> Optional[int]:
+        for word in words:
+            if word.isdigit() and 0 < int(word) <= 50:
+                return int(word)
+            if word in NUMBER_WORDS:
+                return NUMBER_WORDS[word]
+        return None
+
+    @staticmethod
+    def _weather_date(words: List[str]) -> Optional[str]:
+        if DATE_WORDS.intersection(words) or any(any(c.isdigit() for c in word) for word in words):
+            return None
+        offset = max((RELATIVE_DAYS[word] for word in words if word in RELATIVE_DAYS), default=0)
+        return (date.today() + timedelta(days=offset)).isoformat()
+
+    def attach_tool_args(self, words: List[str], plan: List[str]) -> List[Any]:
+        """
+        Turns plan steps into step objects with tool arguments where the rules can
+        derive them, mirroring the tool agents' own instructions. Weather for a
+        place name uses the offline gazetteer. Steps whose arguments need judgement
+        (unknown places, dates other than today/tomorrow) stay plain names and keep
+        their LLM turn.
+
+        Args:
+            words (List[str]): Normalized query words.
+            plan (List[str]): Agent names from classify().
+
+        Returns:
+            List[Any]: Plan entries, either names or {"agent": ..., "tool_args": {...}}.
+        """
+        word_set = set(words)
+        count = self._requested_count(words)
+        with_launches = "launches_agent" in plan
+        launch_count = count or (3 if "launches" in word_set else 1)
+        entries: List[Any] = []
+        for agent in plan:
+            tool_args: Optional[Dict[str, Any]] = None
+            if agent == "launches_agent":
+                agency = next((w for w in words if w in AGENCIES), "spacex")
+                if FIRST_CUES & word_set:
+                    time_filter = "first"
+                elif PAST_CUES & word_set:
+                    time_filter = "past"
+                else:
+                    time_filter = "upcoming"
+                tool_args = {"agency": agency, "time_filter": time_filter, "count": launch_count}
+            elif agent == "weather_agent" and with_launches and launch_count > 1:
+                # Weather for every launch in one batched call.
+                tool_args = {"locations": "$state.launch_info"}
+            elif agent == "weather_agent" and with_launches:
+                tool_args = {
+                    "lat": "$state.launch_info.0.latitude",
+                    "lon": "$state.launch_info.0.longitude",
+                    "date": "$state.launch_info.0.launch_date",
+                }
+            elif agent == "weather_agent":
+                place = get_gazetteer().find_in_text(" ".join(words))
+                weather_date = self._weather_date(words)
+                if place is not None and weather_date is not None:
+                    tool_args = {"lat": place.latitude, "lon": place.longitude, "date": weather_date}
+            elif agent == "news_agent":
+                if "popular" in word_set or "popularity" in word_set:
+                    sort_by = "popularity"
+                elif "relevant" in word_set or "relevancy" in word_set:
+                    sort_by = "relevancy"
+                else:
+                    sort_by = "publishedAt"
+                if with_launches:
+                    q = "$state.launch_info.0.name"
+                else:
+                    q = " ".join(w for w in words if w not in NEWS_STOPWORDS and not w.isdigit() and w not in NUMBER_WORDS)
+                if q:
+                    tool_args = {"q": q, "language": "en", "sort_by": sort_by, "page_size": count or 5}
+            entries.append({"agent": agent, "tool_args": tool_args} if tool_args else agent)
+        return entries
+
+    def resolve(self, query: str) -> Tuple[Optional[PlanResolution], PlanResolution]:
+        """
+        Resolves a plan from the cache or the rules.
+
+        Args:
+            query (str): Raw user query.
+
+        Returns:
+            Tuple[Optional[PlanResolution], PlanResolution]: The accepted resolution (None
+            when the LLM planner should run) and the best local candidate.
+        """
+        key = normalize_query(query)
+        with self._lock:
+            self._counts["lookups"] += 1
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self._counts["cache_hits"] += 1
+                self._confidence_sum += 1.0
+                resolution = PlanResolution(list(cached), 1.0, "cache")
+                return resolution, resolution
+
+        candidate = self.classify(key)
+        with self._lock:
+            self._confidence_sum += candidate.confidence
+            if candidate.confidence >= self.min_confidence:
+                self._counts["rule_hits"] += 1
+                return candidate, candidate
+            self._counts["llm_fallbacks"] += 1
+        return None, candidate
+
+    def remember(self, query: str, plan: List[Any]):
+        """
+        Caches the plan for a query (e.g. one produced by the LLM planner).
+
+        Args:
+            query (str): Raw user query.
+            plan (List[Any]): The plan entries.
+        """
+        key = normalize_query(query)
+        if not key or not plan:
+            return
+        with self._lock:
+            self._cache[key] = list(plan)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def stats(self) -> Dict[str, float]:
+        """Returns lookup counters, the local hit rate and the mean confidence."""
+        with self._lock:
+            lookups = self._counts["lookups"]
+            hits = self._counts["cache_hits"] + self._counts["rule_hits"]
+            return dict(
+                self._counts,
+                hit_rate=round(hits / lookups, 3) if lookups else 0.0,
+                mean_confidence=round(self._confidence_sum / lookups, 3) if lookups else 0.0,
+                cached_queries=len(self._cache),
+            )
+
+    # --- ADK Callbacks ---
+    @staticmethod
+    def _query_text(callback_context: CallbackContext) -> str:
+        content = callback_context.user_content
+        if not content or not content.parts:
+            return ""
+        return " ".join(part.text for part in content.parts if part.text)
+
+    def before_planner_callback(self, callback_context: CallbackContext) -> Optional[types.Content]:
+        """
+        Skips the planner LLM call when the plan can be resolved locally.
+
+        Writes the plan to state['agent_execution_plan_str'] (as the planner's
+        output_key would) and returns it as the planner's reply. Also records
+        state['plan_resolution'] with the source and confidence.
+
+        Args:
+            callback_context (CallbackContext): The planner's callback context.
+
+        Returns:
+            Optional[types.Content]: The plan as model content, or None to run the LLM.
+        """
+        resolution, candidate = self.resolve(self._query_text(callback_context))
+        if resolution is None:
+            callback_context.state["plan_resolution"] = {
+                "source": "llm", "confidence": candidate.confidence, "candidate": candidate.plan,
+            }
+            return None
+
+        plan_str = json.dumps(resolution.plan)
+        callback_context.state["agent_execution_plan_str"] = plan_str
+        callback_context.state["plan_resolution"] = {"source": resolution.source, "confidence": resolution.confidence}
+        return types.Content(role="model", parts=[types.Part(text=plan_str)])
+
+    def after_planner_callback(self, callback_context: CallbackContext) -> Optional[types.Content]:
+        """
+        Remembers the plan the LLM planner produced for this query.
+
+        Args:
+            callback_context (CallbackContext): The planner's callback context.
+
+        Returns:
+            Optional[types.Content]: Always None; the planner's own reply is kept.
+        """
+        try:
+            plan = parse_plan(callback_context.state.get("agent_execution_plan_str", ""))
+        except ValueError:
+            return None
+        names = [entry if isinstance(entry, str) else entry.get("agent") if isinstance(entry, dict) else None for entry in plan]
+        if names and all(isinstance(name, str) for name in names) and names[-1] == TERMINAL_AGENT:
+            self.remember(self._query_text(callback_context), plan)
+        return None
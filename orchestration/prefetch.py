@@ -0,0 +1,184 @@
+"""
+prefetch.py
+
+Speculative prefetching of tool requests while the planner LLM runs.
+- Guesses the probable tool calls from the plan resolver's rule-based candidate.
+- Starts their upstream requests as soon as the user message arrives.
+- Settles the prefetches against the final plan: matching ones are left for the
+  tools to pick up, the rest are cancelled.
+"""
+
+# --- Imports ---
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Mapping, Optional, Tuple
+
+from google.adk.agents.callback_context import CallbackContext
+from google.genai import types
+
+from utils import Prefetcher, add_event, get_prefetcher, make_cache_key
+
+from .direct_tools import STATE_REF_PREFIX
+from .plan_graph import PlanStep
+from .plan_resolver import PlanResolver, normalize_query
+
+logger = logging.getLogger(__name__)
+
+
+# --- Specs ---
+@dataclass(frozen=True)
+class PrefetchSpec:
+    """
+    How to prefetch the request of one tool agent.
+
+    Attributes:
+        upstream (str): Upstream name, part of the request key.
+        build_request (Callable): Maps the tool arguments to (url, params); raises
+            if they are invalid or the request cannot be made.
+        fetch (Callable): Performs the request the same way the tool does, e.g.
+            through the response cache.
+    """
+    upstream: str
+    build_request: Callable[..., Tuple[str, Dict[str, Any]]]
+    fetch: Callable[[str, Dict[str, Any]], Awaitable[Any]]
+
+
+def _is_concrete(tool_args: Any) -> bool:
+    return isinstance(tool_args, dict) and not any(
+        isinstance(value, str) and value.startswith(STATE_REF_PREFIX) for value in tool_args.values()
+    )
+
+
+# --- Speculative Prefetch ---
+class SpeculativePrefetch:
+    """
+    Starts the probable tool requests of a query while the planner LLM decides.
+
+    Use `before_planner_callback` after the plan resolver's callback (it only runs
+    when the LLM planner is about to be called), `settle` once the plan is final
+    and `finish` when the invocation's tools are done. Tools pick up a prefetched
+    result through Prefetcher.take when they make the same request.
+    """
+
+    def __init__(
+        self,
+        resolver: PlanResolver,
+        specs: Dict[str, PrefetchSpec],
+        min_confidence: float = 0.4,
+        prefetcher: Optional[Prefetcher] = None,
+    ):
+        """
+        Args:
+            resolver (PlanResolver): Supplies the rule-based plan candidate and its tool arguments.
+            specs (Dict[str, PrefetchSpec]): Prefetchable requests by agent name.
+            min_confidence (float): Candidates below this confidence are not prefetched.
+            prefetcher (Optional[Prefetcher]): Defaults to the process-wide prefetcher.
+        """
+        self.resolver = resolver
+        self.specs = specs
+        self.min_confidence = min_confidence
+        self.prefetcher = prefetcher or get_prefetcher()
+
+    def requests(self, agent_name: str, tool_args: Any) -> Optional[Tuple[str, str, Dict[str, Any]]]:
+        """
+        Builds the request a step would make.
+
+        Args:
+            agent_name (str): The step's agent.
+            tool_args (Any): The step's tool arguments.
+
+        Returns:
+            Optional[Tuple[str, str, Dict[str, Any]]]: (key, url, params), or None if the
+            agent is not prefetchable or the arguments are incomplete.
+        """
+        spec = self.specs.get(agent_name)
+        if spec is None or not _is_concrete(tool_args):
+            return None
+        try:
+            url, params = spec.build_request(**tool_args)
+        except (TypeError, ValueError):
+            return None
+        return make_cache_key(spec.upstream, url, params), url, params
+
+    def start(self, scope: str, plan: List[Any]) -> int:
+        """
+        Starts the requests of every prefetchable step with concrete tool arguments.
+
+        Args:
+            scope (str): The invocation id.
+            plan (List[Any]): Plan entries with 'tool_args'.
+
+        Returns:
+            int: Number of prefetches started.
+        """
+        started = 0
+        for entry in plan:
+            if not isinstance(entry, dict):
+                continue
+            request = self.requests(entry.get("agent"), entry.get("tool_args"))
+            if request is None:
+                continue
+            key, url, params = request
+            fetch = self.specs[entry["agent"]].fetch
+            if self.prefetcher.start(scope, key, lambda fetch=fetch, url=url, params=params: fetch(url, params), tag=entry["agent"]):
+                logger.info("Prefetching %s while the planner runs.", entry["agent"])
+                add_event("prefetch_started", agent=entry["agent"])
+                started += 1
+        return started
+
+    def settle(self, scope: str, steps: List[PlanStep]):
+        """
+        Cancels the prefetches the final plan will not use.
+
+        A prefetch is kept when its agent is in the plan and either the step's
+        concrete tool arguments make the same request or the step has no tool
+        arguments (its LlmAgent chooses them and may well make the same request).
+
+        Args:
+            scope (str): The invocation id.
+            steps (List[PlanStep]): The final plan.
+        """
+        tags = self.prefetcher.tags(scope)
+        if not tags:
+            return
+        keep = set()
+        for step in steps:
+            tool_args = step.args.get("tool_args")
+            if tool_args is None:
+                keep.update(key for key, tag in tags.items() if tag == step.agent_name)
+                continue
+            request = self.requests(step.agent_name, tool_args)
+            if request is not None and request[0] in tags:
+                keep.add(request[0])
+        self.prefetcher.discard(scope, keep)
+
+    def finish(self, scope: str):
+        """Cancels whatever the invocation's tools did not pick up."""
+        self.prefetcher.discard(scope)
+
+    def stats(self) -> Mapping[str, float]:
+        """Returns the prefetcher's hit and waste statistics."""
+        return self.prefetcher.stats()
+
+    # --- ADK Callback ---
+    def before_planner_callback(self, callback_context: CallbackContext) -> Optional[types.Content]:
+        """
+        Prefetches the rule-based candidate plan's requests before the planner LLM call.
+
+        Runs after PlanResolver.before_planner_callback, i.e. only when the plan was
+        not resolved locally. Never replaces the planner's reply.
+
+        Args:
+            callback_context (CallbackContext): The planner's callback context.
+
+        Returns:
+            Optional[types.Content]: Always None.
+        """
+        resolution = callback_context.state.get("plan_resolution") or {}
+        if resolution.get("source") != "llm" or resolution.get("confidence", 0.0) < self.min_confidence:
+            return None
+        words = normalize_query(PlanResolver._query_text(callback_context)).split()
+        names = [entry if isinstance(entry, str) else entry.get("agent") for entry in resolution.get("candidate", [])]
+        plan = self.resolver.attach_tool_args(words, [name for name in names if isinstance(name, str)])
+        self.start(callback_context.invocation_id, plan)
+        return None
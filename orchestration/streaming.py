@@ -0,0 +1,168 @@
+"""
+streaming.py
+
+End-to-end streaming of a turn to the client.
+- Runs the turn in ADK's SSE streaming mode, so the answering agent's text
+  arrives in partial events while it is generated.
+- Builds the progress events the orchestrator sends as each plan step finishes
+  (e.g. "Launch data ready"); like other partial events they are not stored in
+  the session.
+- Turns the event stream into client updates (progress, answer deltas, the final
+  answer), as an async iterator or as server-sent events.
+"""
+
+# --- Imports ---
+import json
+from typing import Any, AsyncGenerator, Dict, Optional, Tuple
+
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.agents.run_config import RunConfig, StreamingMode
+from google.adk.events import Event
+from google.adk.runners import Runner
+from google.genai import types
+
+from .plan_graph import STEP_COMPLETED, STEP_FAILED, STEP_SKIPPED, STEP_TIMED_OUT, TERMINAL_AGENTS, PlanStep
+
+# --- Constants ---
+# Key of the progress payload in a progress event's custom_metadata.
+PROGRESS_METADATA_KEY = "plan_progress"
+
+# What each data step delivers, for the progress messages.
+STEP_LABELS: Dict[str, str] = {
+    "launches_agent": "Launch data",
+    "weather_agent": "Weather data",
+    "news_agent": "News",
+}
+
+_OUTCOME_MESSAGES = {
+    STEP_COMPLETED: "{label} ready",
+    STEP_FAILED: "{label} unavailable",
+    STEP_TIMED_OUT: "{label} took too long, answering without it",
+    STEP_SKIPPED: "{label} skipped",
+}
+
+
+# --- Progress Events ---
+def is_streaming(ctx: InvocationContext) -> bool:
+    """Returns True if the turn runs in SSE streaming mode."""
+    return ctx.run_config is not None and ctx.run_config.streaming_mode == StreamingMode.SSE
+
+
+def progress_event(ctx: InvocationContext, author: str, step: PlanStep, outcome: str) -> Event:
+    """
+    Builds the progress event of a finished plan step.
+
+    The event is partial, so the runner passes it to the client without appending
+    it to the session (it never reaches the history of later turns).
+
+    Args:
+        ctx (InvocationContext): The invocation context.
+        author (str): The orchestrator's name.
+        step (PlanStep): The finished step.
+        outcome (str): The step's outcome (see plan_graph.STEP_*).
+
+    Returns:
+        Event: A partial event with the message as text and the details in
+        custom_metadata[PROGRESS_METADATA_KEY].
+    """
+    label = STEP_LABELS.get(step.agent_name, step.agent_name)
+    message = _OUTCOME_MESSAGES.get(outcome, "{label}: " + outcome).format(label=label)
+    return Event(
+        invocation_id=ctx.invocation_id,
+        author=author,
+        branch=ctx.branch,
+        partial=True,
+        content=types.Content(role="model", parts=[types.Part(text=message)]),
+        custom_metadata={
+            PROGRESS_METADATA_KEY: {
+                "step": step.index,
+                "agent": step.agent_name,
+                "outcome": outcome,
+                "message": message,
+            }
+        },
+    )
+
+
+def _text(event: Event) -> str:
+    if not event.content or not event.content.parts:
+        return ""
+    return "".join(part.text for part in event.content.parts if part.text and not part.thought)
+
+
+# --- Client Stream ---
+async def stream_turn(
+    runner: Runner,
+    user_id: str,
+    session_id: str,
+    query: str,
+    answer_authors: Tuple[str, ...] = TERMINAL_AGENTS,
+    run_config: Optional[RunConfig] = None,
+) -> AsyncGenerator[Dict[str, Any], None]:
+    """
+    Runs one turn in streaming mode and yields client updates as they happen.
+
+    Updates are dicts with a 'type':
+    - 'progress': a plan step finished ('agent', 'outcome', 'message').
+    - 'delta': the next chunk of the answer ('text').
+    - 'answer': the complete answer ('text'); replaces the deltas, which a model
+      that does not stream (or a cached answer) never sends.
+    - 'done': the turn is over ('answer' is False if no answer was produced).
+
+    Args:
+        runner (Runner): The application's runner.
+        user_id (str): The user's id.
+        session_id (str): The session id; the session must exist.
+        query (str): The user's message.
+        answer_authors (Tuple[str, ...]): Agents whose text is the answer.
+        run_config (Optional[RunConfig]): Defaults to SSE streaming mode.
+
+    Yields:
+        Dict[str, Any]: Client updates, in order.
+    """
+    message = types.Content(role="user", parts=[types.Part(text=query)])
+    answered = False
+    async for event in runner.run_async(
+        user_id=user_id,
+        session_id=session_id,
+        new_message=message,
+        run_config=run_config or RunConfig(streaming_mode=StreamingMode.SSE),
+    ):
+        progress = (event.custom_metadata or {}).get(PROGRESS_METADATA_KEY)
+        if progress is not None:
+            yield {"type": "progress", **progress}
+            continue
+        if event.author not in answer_authors:
+            continue
+        text = _text(event)
+        if event.partial:
+            if text:
+                yield {"type": "delta", "text": text}
+        elif event.is_final_response() and text:
+            answered = True
+            yield {"type": "answer", "text": text}
+    yield {"type": "done", "answer": answered}
+
+
+def format_sse(update: Dict[str, Any]) -> str:
+    """Formats a client update as a server-sent event ('event: <type>', JSON data)."""
+    data = json.dumps({key: value for key, value in update.items() if key != "type"}, ensure_ascii=False)
+    return f"event: {update['type']}\ndata: {data}\n\n"
+
+
+async def stream_turn_sse(runner: Runner, user_id: str, session_id: str, query: str, **kwargs: Any) -> AsyncGenerator[str, None]:
+    """
+    stream_turn, formatted as server-sent events for a text/event-stream response.
+
+    Args:
+        runner (Runner): The application's runner.
+        user_id (str): The user's id.
+        session_id (str): The session id; the session must exist.
+        query (str): The user's message.
+        **kwargs: Passed to stream_turn.
+
+    Yields:
+        str: One server-sent event per update.
+    """
+    async for update in stream_turn(runner, user_id, session_id, query, **kwargs):
+        yield format_sse(update)
@@ -0,0 +1,3 @@
+from .cassette import Cassette, Interaction, exact_key, shape_key
+from .faults import Fault, FaultInjector, FaultProfile, parse_faults
+from .standins import DEFAULT_BASE_PORT, ORIGINS, PORT_OFFSETS, StandIn, StandinServers
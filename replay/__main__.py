@@ -0,0 +1,132 @@
+"""
+__main__.py
+
+Command line for the record/replay harness.
+- `python -m replay serve`: runs the stand-ins and prints the environment that points
+  server.py, supervisor.py or `adk web` at them.
+- `python -m replay run "query" ...`: runs the whole agent pipeline against the
+  stand-ins in this process and prints each answer and the replay statistics.
+- `--record` forwards to the real upstreams (API keys from .env) and appends every
+  exchange to the cassette; without it the cassette is replayed fully offline.
+"""
+
+# --- Imports ---
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_DIR)
+
+from replay.cassette import Cassette
+from replay.faults import FaultInjector, parse_faults
+from replay.standins import DEFAULT_BASE_PORT, StandinServers
+
+DEFAULT_CASSETTE = os.path.join(PROJECT_DIR, "replay", "cassettes", "default.jsonl")
+
+
+def build_servers(args: argparse.Namespace) -> StandinServers:
+    """Creates the stand-ins described by the command line options."""
+    injector = FaultInjector(parse_faults(args.faults), seed=args.seed)
+    return StandinServers(
+        Cassette(args.cassette),
+        injector,
+        record=args.record,
+        host=args.host,
+        base_port=args.port,
+        proxies=args.proxies,
+        dead_proxies=args.dead_proxies,
+    )
+
+
+def print_stats(servers: StandinServers):
+    stats = servers.stats()
+    print(f"📼 Cassette: {json.dumps(stats['cassette'])}")
+    print(f"📨 Requests: {json.dumps(stats['requests'])}")
+    print(f"💥 Injected: {json.dumps(stats['injected'])}")
+
+
+async def serve(args: argparse.Namespace):
+    """Runs the stand-ins until interrupted."""
+    servers = build_servers(args)
+    async with servers:
+        mode = "Recording into" if args.record else "Replaying"
+        print(f"📼 {mode} {args.cassette} ({len(servers.cassette)} exchanges). Point the app at the stand-ins with:")
+        for name, value in servers.environment().items():
+            print(f"export {name}={value!r}" if value else f"export {name}=''")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            print_stats(servers)
+
+
+async def run(args: argparse.Namespace):
+    """Runs each query through the agent pipeline against the stand-ins."""
+    random.seed(args.seed)
+    servers = build_servers(args)
+    async with servers:
+        os.environ.update(servers.environment())
+        if not args.record:
+            # Credentials are never recorded, so any value replays.
+            os.environ.setdefault("GOOGLE_API_KEY", "replay")
+            os.environ.setdefault("NEWS_API_KEY", "replay")
+
+        # Imported here, so the agents pick up the stand-in environment.
+        import agent
+        from google.adk.agents.run_config import RunConfig, StreamingMode
+        from orchestration import stream_turn
+
+        run_config = RunConfig(streaming_mode=StreamingMode.SSE if args.stream else StreamingMode.NONE)
+        await agent.get_or_create_session(args.user, args.session)
+        for query in args.queries:
+            print(f"\n▶️ {query}")
+            started = time.monotonic()
+            answer = None
+            try:
+                async for update in stream_turn(agent.runner, args.user, args.session, query, run_config=run_config):
+                    if update["type"] == "progress":
+                        print(f"   … {update['message']}")
+                    elif update["type"] == "answer":
+                        answer = update["text"]
+            except Exception as e:
+                # e.g. a model request the cassette has no recording for (answered with 501).
+                print(f"❌ Turn failed: {type(e).__name__}: {str(e)[:300]}")
+            else:
+                print(answer if answer is not None else "⚠️ No answer.")
+            print(f"⏱️ {time.monotonic() - started:.2f}s")
+        print()
+        print_stats(servers)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m replay", description="Record and replay the agents' upstream traffic.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve", help="Run the stand-in servers.")
+    run_parser = commands.add_parser("run", help="Run queries through the agents against the stand-ins.")
+    run_parser.add_argument("queries", nargs="+", help="User messages, sent in order to one session.")
+    run_parser.add_argument("--user", default="replay-user")
+    run_parser.add_argument("--session", default="replay-session")
+    run_parser.add_argument("--stream", action="store_true", help="Use ADK's SSE streaming mode (record and replay alike).")
+    for sub in (serve_parser, run_parser):
+        sub.add_argument("--cassette", default=os.getenv("REPLAY_CASSETTE", DEFAULT_CASSETTE))
+        sub.add_argument("--record", action="store_true", help="Forward to the real upstreams and record.")
+        sub.add_argument("--faults", default=os.getenv("REPLAY_FAULTS", ""),
+                         help='e.g. "newsapi:errors=0.2;gemini:latency=recorded;proxy:errors=0.3"')
+        sub.add_argument("--seed", type=int, default=0)
+        sub.add_argument("--host", default="127.0.0.1")
+        sub.add_argument("--port", type=int, default=int(os.getenv("REPLAY_PORT", DEFAULT_BASE_PORT)))
+        sub.add_argument("--proxies", type=int, default=3, help="Local proxies in the proxy list.")
+        sub.add_argument("--dead-proxies", type=int, default=0, help="Listed proxies that refuse connections.")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args) if args.command == "serve" else run(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+cassette.py
+
+Recorded upstream exchanges ("cassettes") and how requests are matched against them.
+- One JSON line per exchange: the request (upstream, method, path, query, body) and
+  the response (status, content type, body) with the latency observed when recording.
+- API keys are never written: key query parameters are dropped and no headers are kept.
+- A request is answered by an exchange with the same method, path, query and body;
+  failing that, by the next exchange of the same shape (same query parameter names, or
+  the same calling agent for model requests), so recorded turns replay on another day,
+  when dates in queries and prompts have changed.
+- Matching only depends on the order of requests, so replays are deterministic.
+"""
+
+# --- Imports ---
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+# --- Constants ---
+# Query parameters that carry credentials; they are neither recorded nor matched.
+REDACTED_PARAMS = frozenset({"apikey", "api_key", "key"})
+
+# ADK starts every model request's system instruction with the agent's name.
+_AGENT_NAME = re.compile(r'internal name is "([^"]+)"')
+
+
+# --- Exchanges ---
+@dataclass
+class Interaction:
+    """
+    One recorded request and its response.
+
+    Attributes:
+        upstream (str): Stand-in name (e.g. "newsapi", "gemini").
+        method (str): HTTP method.
+        path (str): Request path.
+        query (List[Tuple[str, str]]): Query parameters without credentials, in request order.
+        body (Any): Request body: decoded JSON, text, or None.
+        status (int): Response status.
+        content_type (str): Response content type.
+        response (str): Response body.
+        latency (float): Seconds the real upstream took to answer.
+        recorded_at (str): When the exchange was recorded (UTC, ISO 8601).
+    """
+    upstream: str
+    method: str
+    path: str
+    query: List[Tuple[str, str]]
+    body: Any
+    status: int
+    content_type: str
+    response: str
+    latency: float = 0.0
+    recorded_at: str = ""
+    uses: int = field(default=0, repr=False, compare=False)
+
+    def to_json(self) -> str:
+        record = asdict(self)
+        record.pop("uses")
+        return json.dumps(record, ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, line: str) -> "Interaction":
+        record = json.loads(line)
+        record["query"] = [tuple(pair) for pair in record.get("query", [])]
+        return cls(**record)
+
+
+def clean_query(query: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """Drops credential parameters (apiKey, key, ...) from a query."""
+    return [(name, value) for name, value in query if name.lower() not in REDACTED_PARAMS]
+
+
+def decode_body(raw: bytes) -> Any:
+    """Decodes a request body for recording: JSON if it parses, else text, None if empty."""
+    if not raw:
+        return None
+    text = raw.decode("utf-8", errors="replace")
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def _digest(value: Any) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+
+def exact_key(upstream: str, method: str, path: str, query: List[Tuple[str, str]], body: Any) -> str:
+    """Identifies a request by everything it sends (except credentials)."""
+    return _digest([upstream, method.upper(), path, sorted(clean_query(query)), body])
+
+
+def agent_name(body: Any) -> Optional[str]:
+    """Returns the name of the ADK agent that sent a model request, if it can be told."""
+    if not isinstance(body, dict):
+        return None
+    instruction = json.dumps(body.get("systemInstruction") or body.get("system_instruction") or "")
+    match = _AGENT_NAME.search(instruction)
+    return match.group(1) if match else None
+
+
+def shape_key(upstream: str, method: str, path: str, query: List[Tuple[str, str]], body: Any) -> str:
+    """
+    Identifies the kind of request, ignoring values that change from run to run.
+
+    HTTP APIs are keyed by path and query parameter names; model requests by path
+    and the calling agent (or, without an agent name, the system instruction).
+    """
+    if isinstance(body, dict) and "contents" in body:
+        agent = agent_name(body) or json.dumps(body.get("systemInstruction") or body.get("system_instruction") or "", sort_keys=True)
+        return _digest([upstream, method.upper(), path, agent])
+    return _digest([upstream, method.upper(), path, sorted({name for name, _ in clean_query(query)})])
+
+
+# --- Cassette ---
+class Cassette:
+    """
+    A file of recorded exchanges, used for replay and extended while recording.
+
+    When several exchanges match a request, the least used one is picked (the
+    earliest on a tie), so repeated requests walk through the recordings in order
+    and start over once all have been used.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): JSONL file; created on the first recorded exchange.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self.interactions: List[Interaction] = []
+        self._exact: Dict[str, List[Interaction]] = {}
+        self._shape: Dict[str, List[Interaction]] = {}
+        self.hits = 0
+        self.shape_hits = 0
+        self.misses = 0
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        self._index(Interaction.from_json(line))
+
+    def __len__(self) -> int:
+        return len(self.interactions)
+
+    def _index(self, interaction: Interaction):
+        fields = (interaction.upstream, interaction.method, interaction.path, interaction.query, interaction.body)
+        self.interactions.append(interaction)
+        self._exact.setdefault(exact_key(*fields), []).append(interaction)
+        self._shape.setdefault(shape_key(*fields), []).append(interaction)
+
+    def match(self, upstream: str, method: str, path: str, query: List[Tuple[str, str]], body: Any) -> Optional[Interaction]:
+        """
+        Finds the recorded response for a request.
+
+        Args:
+            upstream (str): Stand-in name.
+            method (str): HTTP method.
+            path (str): Request path.
+            query (List[Tuple[str, str]]): Query parameters.
+            body (Any): Decoded request body (see decode_body).
+
+        Returns:
+            Optional[Interaction]: The exchange to replay, or None if nothing matches.
+        """
+        with self._lock:
+            candidates = self._exact.get(exact_key(upstream, method, path, query, body))
+            if candidates:
+                self.hits += 1
+            else:
+                candidates = self._shape.get(shape_key(upstream, method, path, query, body))
+                if not candidates:
+                    self.misses += 1
+                    return None
+                self.shape_hits += 1
+            chosen = min(candidates, key=lambda interaction: interaction.uses)
+            chosen.uses += 1
+            return chosen
+
+    def record(self, interaction: Interaction):
+        """Appends an exchange to the cassette file and makes it available for matching."""
+        interaction.query = clean_query(interaction.query)
+        interaction.recorded_at = interaction.recorded_at or time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(interaction.to_json() + "\n")
+            self._index(interaction)
+
+    def reset(self):
+        """Forgets how often each exchange was used, so a replay starts from the top."""
+        with self._lock:
+            for interaction in self.interactions:
+                interaction.uses = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the number of recorded exchanges and of exact, shape-only and missed matches."""
+        return {
+            "interactions": len(self.interactions),
+            "hits": self.hits,
+            "shape_hits": self.shape_hits,
+            "misses": self.misses,
+        }
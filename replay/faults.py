@@ -0,0 +1,144 @@
+"""
+faults.py
+
+Injected latency, errors and throttling for the stand-in servers.
+- Configured per upstream with a compact spec, e.g.
+  "newsapi:latency=0.3,jitter=0.1,errors=0.1;gemini:latency=recorded;*:throttle=0.02".
+- Every decision is drawn from a hash of the seed, the request and how many times
+  that request was seen, so the same run gets the same faults in the same places.
+"""
+
+# --- Imports ---
+import dataclasses
+import hashlib
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+
+# --- Fault Profiles ---
+@dataclass(frozen=True)
+class FaultProfile:
+    """
+    Faults injected into one upstream's responses.
+
+    Attributes:
+        latency (Optional[float]): Seconds before the response; None replays the
+            latency observed when the exchange was recorded.
+        latency_scale (float): Multiplies the latency (e.g. 0 to replay instantly).
+        jitter (float): Up to this many seconds are added to or taken from the latency.
+        errors (float): Share of requests answered with `error_status` instead.
+        error_status (int): Status of an injected error.
+        throttle (float): Share of requests answered with 429 and Retry-After.
+        retry_after (float): Retry-After of an injected 429, in seconds.
+        chunk_delay (float): Seconds between the events of a streamed response.
+    """
+    latency: Optional[float] = 0.0
+    latency_scale: float = 1.0
+    jitter: float = 0.0
+    errors: float = 0.0
+    error_status: int = 503
+    throttle: float = 0.0
+    retry_after: float = 1.0
+    chunk_delay: float = 0.0
+
+
+NO_FAULTS = FaultProfile()
+
+_FIELDS = {f.name: f.type for f in dataclasses.fields(FaultProfile)}
+
+
+def parse_faults(spec: str) -> Dict[str, FaultProfile]:
+    """
+    Parses a fault spec: ';'-separated '<upstream>:<field>=<value>,...' entries.
+
+    '*' applies to every upstream without an entry of its own. `latency=recorded`
+    replays the recorded latencies.
+
+    Args:
+        spec (str): The spec, e.g. "newsapi:errors=0.1,error_status=500;*:latency=0.05".
+
+    Returns:
+        Dict[str, FaultProfile]: Profiles by upstream name.
+
+    Raises:
+        ValueError: If a field is unknown or a value does not parse.
+    """
+    profiles: Dict[str, FaultProfile] = {}
+    for entry in filter(None, (part.strip() for part in spec.split(";"))):
+        upstream, _, settings = entry.partition(":")
+        values = {}
+        for setting in filter(None, (part.strip() for part in settings.split(","))):
+            name, _, value = setting.partition("=")
+            name = name.strip()
+            if name not in _FIELDS:
+                raise ValueError(f"Unknown fault setting '{name}' (expected one of {', '.join(_FIELDS)})")
+            if name == "latency" and value.strip() == "recorded":
+                values[name] = None
+            elif name == "error_status":
+                values[name] = int(value)
+            else:
+                values[name] = float(value)
+        profiles[upstream.strip()] = FaultProfile(**values)
+    return profiles
+
+
+# --- Injection ---
+def draw(*parts: object) -> float:
+    """Returns a number in [0, 1) determined by `parts`."""
+    digest = hashlib.sha256(repr(parts).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") / 2 ** 64
+
+
+@dataclass(frozen=True)
+class Fault:
+    """What to do with one request: wait `delay` seconds, then answer normally or with `status`."""
+    delay: float
+    status: Optional[int] = None
+    retry_after: Optional[float] = None
+
+
+class FaultInjector:
+    """Decides the faults of each request from the profiles and a seed."""
+
+    def __init__(self, profiles: Optional[Dict[str, FaultProfile]] = None, seed: int = 0):
+        """
+        Args:
+            profiles (Optional[Dict[str, FaultProfile]]): Profiles by upstream ('*' for all others).
+            seed (int): Changes where the faults fall, reproducibly.
+        """
+        self.profiles = profiles or {}
+        self.seed = seed
+        self._lock = threading.Lock()
+        self._seen: Dict[Tuple[str, str], int] = {}
+        self.injected: Dict[str, int] = {"errors": 0, "throttled": 0}
+
+    def profile(self, upstream: str) -> FaultProfile:
+        """Returns the upstream's profile, falling back to '*' and then to no faults."""
+        return self.profiles.get(upstream) or self.profiles.get("*") or NO_FAULTS
+
+    def decide(self, upstream: str, key: str, recorded_latency: float = 0.0) -> Fault:
+        """
+        Decides the faults of a request.
+
+        Args:
+            upstream (str): Stand-in name.
+            key (str): Identifies the request (e.g. cassette.exact_key).
+            recorded_latency (float): Latency of the matched recording, in seconds.
+
+        Returns:
+            Fault: The delay and, for an injected error or 429, the status.
+        """
+        profile = self.profile(upstream)
+        with self._lock:
+            occurrence = self._seen[(upstream, key)] = self._seen.get((upstream, key), 0) + 1
+        base = recorded_latency if profile.latency is None else profile.latency
+        jitter = profile.jitter * (2 * draw(self.seed, upstream, key, occurrence, "jitter") - 1)
+        delay = max(0.0, base * profile.latency_scale + jitter)
+        if draw(self.seed, upstream, key, occurrence, "throttle") < profile.throttle:
+            self.injected["throttled"] += 1
+            return Fault(delay, 429, profile.retry_after)
+        if draw(self.seed, upstream, key, occurrence, "error") < profile.errors:
+            self.injected["errors"] += 1
+            return Fault(delay, profile.error_status)
+        return Fault(delay)
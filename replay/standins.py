@@ -0,0 +1,373 @@
+"""
+standins.py
+
+Local stand-in servers for every upstream the agents call.
+- One server per upstream (Gemini, SpaceDevs, open-meteo, NewsAPI, the proxy list)
+  on consecutive ports, plus a few local HTTP proxies for the launch requests.
+- Replay mode answers from a cassette, with the latency, errors and 429s of a
+  FaultInjector; record mode forwards to the real upstream and records the exchange.
+- The proxy list is generated: it lists the local proxies (and optionally dead ones),
+  so the proxy pool's rotation and hedging run offline too.
+- environment() gives the variables that point the app at the stand-ins
+  (UPSTREAM_URL_<NAME>, GOOGLE_GEMINI_BASE_URL).
+"""
+
+# --- Imports ---
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+import uvicorn
+from starlette.requests import Request
+from starlette.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from .cassette import Cassette, Interaction, agent_name, decode_body, exact_key
+from .faults import FaultInjector
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+# Real origin of each stand-in.
+ORIGINS: Dict[str, str] = {
+    "gemini": "https://generativelanguage.googleapis.com",
+    "spacedevs": "https://ll.thespacedevs.com",
+    "open-meteo": "https://api.open-meteo.com",
+    "newsapi": "https://newsapi.org",
+    "proxy-list": "https://free-proxy-list.net",
+}
+# Port of each stand-in, relative to the base port; proxies follow from PROXY_PORT_OFFSET.
+PORT_OFFSETS: Dict[str, int] = {"gemini": 0, "spacedevs": 1, "open-meteo": 2, "newsapi": 3, "proxy-list": 4}
+PROXY_PORT_OFFSET = 10
+DEFAULT_BASE_PORT = 8100
+
+STATS_PATH = "/__replay__/stats"
+
+# Hop-by-hop headers, and headers the forwarding client sets itself.
+SKIPPED_HEADERS = frozenset({
+    "host", "connection", "keep-alive", "proxy-connection", "proxy-authorization",
+    "transfer-encoding", "upgrade", "content-length", "accept-encoding",
+})
+
+_ERROR_STATUSES = {429: "RESOURCE_EXHAUSTED", 500: "INTERNAL", 502: "UNAVAILABLE", 503: "UNAVAILABLE", 504: "DEADLINE_EXCEEDED"}
+
+
+def _forwarded_headers(request: Request) -> Dict[str, str]:
+    return {k: v for k, v in request.headers.items() if k.lower() not in SKIPPED_HEADERS}
+
+
+def error_response(status: int, message: str, headers: Optional[Dict[str, str]] = None) -> JSONResponse:
+    """An error in Google's JSON error format (which the other clients only read the status of)."""
+    body = {"error": {"code": status, "message": message, "status": _ERROR_STATUSES.get(status, "UNKNOWN")}}
+    return JSONResponse(body, status_code=status, headers=headers)
+
+
+# --- Stand-in Apps ---
+class StandIn:
+    """
+    ASGI app standing in for one upstream.
+
+    Replays matching exchanges from the cassette (or records them from the real
+    upstream) and answers requests that match nothing with 501.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        cassette: Cassette,
+        injector: FaultInjector,
+        record: bool = False,
+        origin: Optional[str] = None,
+    ):
+        """
+        Args:
+            name (str): Upstream name (see ORIGINS).
+            cassette (Cassette): Exchanges to replay, or to record into.
+            injector (FaultInjector): Decides latency and injected errors in replay.
+            record (bool): Forward to the real upstream and record instead of replaying.
+            origin (Optional[str]): Real upstream to record from; defaults to ORIGINS[name].
+        """
+        self.name = name
+        self.cassette = cassette
+        self.injector = injector
+        self.record = record
+        self.origin = origin or ORIGINS[name]
+        self._client: Optional[httpx.AsyncClient] = None
+        self.requests = 0
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return
+        request = Request(scope, receive)
+        if request.url.path == STATS_PATH:
+            response = JSONResponse({"requests": self.requests, "cassette": self.cassette.stats(), "injected": self.injector.injected})
+        else:
+            self.requests += 1
+            response = await self.handle(request)
+        await response(scope, receive, send)
+
+    async def handle(self, request: Request) -> Response:
+        """Answers one request from the cassette, or from the real upstream when recording."""
+        raw = await request.body()
+        query = list(request.query_params.multi_items())
+        body = decode_body(raw)
+        if self.record:
+            return await self._record(request, raw, query, body)
+
+        interaction = self.cassette.match(self.name, request.method, request.url.path, query, body)
+        if interaction is None:
+            agent = agent_name(body)
+            message = f"No recorded {self.name} exchange matches {request.method} {request.url.path}" + (f" from {agent}" if agent else "")
+            logger.warning(message)
+            return error_response(501, message)
+
+        fault = self.injector.decide(self.name, exact_key(self.name, request.method, request.url.path, query, body), interaction.latency)
+        await asyncio.sleep(fault.delay)
+        if fault.status == 429:
+            return error_response(429, "Too many requests (injected)", headers={"Retry-After": f"{fault.retry_after:g}"})
+        if fault.status is not None:
+            return error_response(fault.status, "Upstream error (injected)")
+        if interaction.content_type.startswith("text/event-stream"):
+            return StreamingResponse(
+                self._events(interaction.response, self.injector.profile(self.name).chunk_delay),
+                status_code=interaction.status,
+                media_type=interaction.content_type,
+            )
+        return Response(interaction.response, status_code=interaction.status, media_type=interaction.content_type)
+
+    @staticmethod
+    async def _events(body: str, chunk_delay: float) -> AsyncIterator[str]:
+        events = [event for event in body.replace("\r\n", "\n").split("\n\n") if event.strip()]
+        for index, event in enumerate(events):
+            if index and chunk_delay:
+                await asyncio.sleep(chunk_delay)
+            yield event + "\n\n"
+
+    async def _record(self, request: Request, raw: bytes, query: List, body: Any) -> Response:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=httpx.Timeout(120.0), follow_redirects=True)
+        started = time.monotonic()
+        try:
+            upstream = await self._client.request(
+                request.method, self.origin + request.url.path, params=query,
+                headers=_forwarded_headers(request), content=raw,
+            )
+        except httpx.HTTPError as e:
+            # Transport failures are not recorded: a replay should not fail where the recording did.
+            return error_response(502, f"{type(e).__name__}: {e}")
+        content_type = upstream.headers.get("content-type", "application/octet-stream")
+        self.cassette.record(Interaction(
+            upstream=self.name,
+            method=request.method,
+            path=request.url.path,
+            query=query,
+            body=body,
+            status=upstream.status_code,
+            content_type=content_type,
+            response=upstream.text,
+            latency=round(time.monotonic() - started, 4),
+        ))
+        return Response(upstream.content, status_code=upstream.status_code, media_type=content_type)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+
+
+class ProxyListStandIn:
+    """ASGI app serving a free-proxy-list.net style page that lists the local proxies."""
+
+    def __init__(self, proxies: List[str]):
+        """
+        Args:
+            proxies (List[str]): 'host:port' of each listed proxy.
+        """
+        self.proxies = proxies
+        self.requests = 0
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return
+        self.requests += 1
+        rows = "".join(
+            f"<tr><td>{host}</td><td>{port}</td><td>ZZ</td><td>Local</td><td>elite proxy</td>"
+            f"<td>no</td><td>yes</td><td>1 min ago</td></tr>"
+            for host, _, port in (proxy.rpartition(":") for proxy in self.proxies)
+        )
+        html = (
+            '<html><body><table class="table table-striped table-bordered"><thead><tr>'
+            "<th>IP Address</th><th>Port</th><th>Code</th><th>Country</th><th>Anonymity</th>"
+            "<th>Google</th><th>Https</th><th>Last Checked</th></tr></thead>"
+            f"<tbody>{rows}</tbody></table></body></html>"
+        )
+        await HTMLResponse(html)(scope, receive, send)
+
+
+class ProxyStandIn:
+    """
+    ASGI app acting as a plain HTTP forward proxy (absolute-form requests only).
+
+    Latency and errors are injected under the upstream name 'proxy', so a fault
+    spec can make proxies slow or flaky independently of the upstream behind them.
+    """
+
+    def __init__(self, injector: FaultInjector, name: str = "proxy"):
+        self.injector = injector
+        self.name = name
+        self._client: Optional[httpx.AsyncClient] = None
+        self.requests = 0
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return
+        request = Request(scope, receive)
+        target = scope["path"]
+        if not target.startswith(("http://", "https://")):
+            await error_response(400, "Proxy requests must use an absolute URL")(scope, receive, send)
+            return
+        self.requests += 1
+        if self._client is None:
+            # Never route through the environment's proxies: the target is a local stand-in.
+            self._client = httpx.AsyncClient(timeout=httpx.Timeout(120.0), trust_env=False)
+        raw = await request.body()
+        fault = self.injector.decide(self.name, f"{request.method} {target}?{request.url.query}")
+        await asyncio.sleep(fault.delay)
+        if fault.status is not None:
+            await error_response(fault.status, "Proxy error (injected)")(scope, receive, send)
+            return
+        try:
+            upstream = await self._client.request(
+                request.method, target, params=list(request.query_params.multi_items()),
+                headers=_forwarded_headers(request), content=raw,
+            )
+            response = Response(upstream.content, status_code=upstream.status_code,
+                                media_type=upstream.headers.get("content-type"))
+        except httpx.HTTPError as e:
+            response = error_response(502, f"{type(e).__name__}: {e}")
+        await response(scope, receive, send)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+
+
+# --- Servers ---
+class _Server(uvicorn.Server):
+    """A uvicorn server that leaves signal handling to the process hosting it."""
+
+    @contextmanager
+    def capture_signals(self):
+        yield
+
+
+class StandinServers:
+    """
+    Runs every stand-in (and the local proxies) on one event loop.
+
+    Use it as an async context manager, then point the app at it with environment():
+
+        async with StandinServers(Cassette(path)) as servers:
+            os.environ.update(servers.environment())
+            ...
+    """
+
+    def __init__(
+        self,
+        cassette: Cassette,
+        injector: Optional[FaultInjector] = None,
+        record: bool = False,
+        host: str = "127.0.0.1",
+        base_port: int = DEFAULT_BASE_PORT,
+        proxies: int = 3,
+        dead_proxies: int = 0,
+    ):
+        """
+        Args:
+            cassette (Cassette): Exchanges to replay, or to record into.
+            injector (Optional[FaultInjector]): Injected faults; none by default.
+            record (bool): Record from the real upstreams instead of replaying.
+            host (str): Interface to listen on.
+            base_port (int): Port of the Gemini stand-in; the others follow (see PORT_OFFSETS).
+            proxies (int): Local proxies in the proxy list.
+            dead_proxies (int): Extra listed proxies that refuse connections.
+        """
+        self.cassette = cassette
+        self.injector = injector or FaultInjector()
+        self.record = record
+        self.host = host
+        self.base_port = base_port
+        self.standins = {
+            name: StandIn(name, cassette, self.injector, record=record)
+            for name in PORT_OFFSETS if name != "proxy-list"
+        }
+        self.proxy = ProxyStandIn(self.injector)
+        proxy_ports = [base_port + PROXY_PORT_OFFSET + i for i in range(proxies + dead_proxies)]
+        self._live_proxy_ports = proxy_ports[:proxies]
+        self.proxy_list = ProxyListStandIn([f"{host}:{port}" for port in proxy_ports])
+        self._servers: List[_Server] = []
+        self._tasks: List[asyncio.Task] = []
+
+    def url(self, name: str) -> str:
+        """Base URL of a stand-in."""
+        return f"http://{self.host}:{self.base_port + PORT_OFFSETS[name]}"
+
+    def environment(self) -> Dict[str, str]:
+        """
+        Returns the environment that points the app at the stand-ins.
+
+        The response cache and sessions are kept in memory, so a run neither reads
+        answers cached from the real upstreams nor leaves stand-in answers behind.
+
+        Returns:
+            Dict[str, str]: Variables to set before the agents are imported.
+        """
+        env = {
+            "UPSTREAM_URL_" + name.upper().replace("-", "_"): self.url(name)
+            for name in PORT_OFFSETS if name != "gemini"
+        }
+        env["GOOGLE_GEMINI_BASE_URL"] = self.url("gemini")
+        env["RESPONSE_CACHE_PATH"] = ""
+        env["SESSION_STORE_PATH"] = ""
+        return env
+
+    async def start(self):
+        """Starts listening on every port; returns once all servers accept connections."""
+        apps = [(app, self.base_port + PORT_OFFSETS[name]) for name, app in self.standins.items()]
+        apps.append((self.proxy_list, self.base_port + PORT_OFFSETS["proxy-list"]))
+        apps.extend((self.proxy, port) for port in self._live_proxy_ports)
+        for app, port in apps:
+            server = _Server(uvicorn.Config(app, host=self.host, port=port, log_level="warning", lifespan="off"))
+            self._servers.append(server)
+            self._tasks.append(asyncio.ensure_future(server.serve()))
+        while not all(server.started for server in self._servers):
+            failed = [task for task in self._tasks if task.done()]
+            if failed:
+                await self.stop()
+                raise RuntimeError(f"A stand-in server failed to start (ports {self.base_port}+ in use?)")
+            await asyncio.sleep(0.05)
+
+    async def stop(self):
+        """Stops every server and closes the forwarding clients."""
+        for server in self._servers:
+            server.should_exit = True
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await asyncio.gather(*(app.aclose() for app in [*self.standins.values(), self.proxy]))
+        self._servers.clear()
+        self._tasks.clear()
+
+    async def __aenter__(self) -> "StandinServers":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info: Any):
+        await self.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns requests per stand-in, the cassette's match counts and the injected faults."""
+        requests = {name: app.requests for name, app in self.standins.items()}
+        requests["proxy-list"] = self.proxy_list.requests
+        requests["proxy"] = self.proxy.requests
+        return {"requests": requests, "cassette": self.cassette.stats(), "injected": dict(self.injector.injected)}
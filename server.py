@@ -0,0 +1,318 @@
+"""
+server.py
+
+Production HTTP entry point for the Multi-Agent System (ASGI, FastAPI + uvicorn).
+- Routes every conversation to its own persisted session (user id + session id).
+- Runs one turn at a time per session, while turns of other sessions run concurrently.
+- Bounds the turns in flight (admission control) and answers 429 with Retry-After
+  when saturated, instead of queueing work it cannot finish in time.
+- Returns answers as JSON or streams them as server-sent events.
+- Warms up the agents in the background after it starts listening; /readyz answers
+  503 until that is done.
+- Exposes /healthz, /readyz and /metrics (with cold-start milestones).
+
+Run it with `python server.py` (or `uvicorn server:create_app --factory`). To test
+it locally against stand-in upstreams, point UPSTREAM_URL_<NAME> and
+GOOGLE_GEMINI_BASE_URL at the stand-in servers, or pass create_app your own runner.
+"""
+
+# --- Imports ---
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from collections import deque
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Any, AsyncGenerator, Awaitable, Callable, Deque, Dict, Optional
+
+from fastapi import FastAPI, Path
+from fastapi.responses import JSONResponse, StreamingResponse
+from google.adk.agents.run_config import RunConfig
+from google.adk.runners import Runner
+from pydantic import BaseModel, Field
+from starlette.background import BackgroundTask
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from orchestration import format_sse, stream_turn
+from utils import (
+    AdmissionController,
+    AdmissionRejected,
+    SessionLocks,
+    circuit_stats,
+    get_http_client,
+    get_prefetcher,
+    get_response_cache,
+    mark,
+    startup_stats,
+    turn_summaries,
+)
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+DEFAULT_MAX_CONCURRENT_TURNS = 32
+DEFAULT_MAX_QUEUED_TURNS = 64
+# Longest a turn waits for a free slot before it is rejected, in seconds.
+DEFAULT_MAX_QUEUE_WAIT = 5.0
+# Turns of one session allowed to wait behind its running turn.
+DEFAULT_MAX_SESSION_WAITERS = 1
+# Turn durations kept for the latency percentiles in /metrics.
+LATENCY_WINDOW = 1000
+
+ID_PATTERN = r"^[A-Za-z0-9_.\-]{1,128}$"
+
+
+class TurnRequest(BaseModel):
+    """Body of a turn: the user's message and whether to stream the answer."""
+    query: str = Field(min_length=1, max_length=4000)
+    stream: bool = False
+
+
+def _percentile(ordered: list, fraction: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class TurnMetrics:
+    """Counts turns by result and keeps recent turn durations for percentiles."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.durations: Deque[float] = deque(maxlen=window)
+        self.counts = {"completed": 0, "failed": 0, "rejected": 0, "disconnected": 0}
+
+    def record(self, result: str, duration: Optional[float] = None):
+        self.counts[result] = self.counts.get(result, 0) + 1
+        if duration is not None:
+            self.durations.append(duration)
+
+    def stats(self) -> Dict[str, Any]:
+        ordered = sorted(self.durations)
+        return dict(
+            self.counts,
+            p50_ms=round(_percentile(ordered, 0.50) * 1000, 1),
+            p95_ms=round(_percentile(ordered, 0.95) * 1000, 1),
+            p99_ms=round(_percentile(ordered, 0.99) * 1000, 1),
+        )
+
+
+def _rejected(error: AdmissionRejected) -> JSONResponse:
+    return JSONResponse(
+        {"error": error.reason, "retry_after": error.retry_after},
+        status_code=429,
+        headers={"Retry-After": str(int(error.retry_after))},
+    )
+
+
+def _agent_warm_up(agent: Any) -> Optional[Callable[[], Awaitable[Any]]]:
+    """The warm-up SERVER_WARMUP asks for: all sub-agents, a list of them, or none."""
+    setting = os.getenv("SERVER_WARMUP", "all").strip().lower()
+    if setting in ("none", "0", "false", "no", "off"):
+        return None
+    if setting in ("all", ""):
+        return agent.warm_up
+    names = [name.strip() for name in setting.split(",") if name.strip()]
+    return lambda: agent.warm_up(names)
+
+
+# --- App ---
+def create_app(
+    runner: Optional[Runner] = None,
+    get_session: Optional[Callable[[str, str], Awaitable[Any]]] = None,
+    admission: Optional[AdmissionController] = None,
+    session_locks: Optional[SessionLocks] = None,
+    warm_up: Optional[Callable[[], Awaitable[Any]]] = None,
+) -> FastAPI:
+    """
+    Builds the ASGI app.
+
+    Args:
+        runner (Optional[Runner]): Defaults to the runner in agent.py.
+        get_session (Optional[Callable]): Returns (creating if needed) the session of
+            (user_id, session_id); defaults to agent.get_or_create_session.
+        admission (Optional[AdmissionController]): Defaults to one configured from
+            SERVER_MAX_CONCURRENT_TURNS, SERVER_MAX_QUEUED_TURNS and SERVER_MAX_QUEUE_WAIT.
+        session_locks (Optional[SessionLocks]): Defaults to one allowing
+            SERVER_MAX_SESSION_WAITERS waiting turns per session.
+        warm_up (Optional[Callable]): Run in the background at startup; /readyz answers 503
+            until it finishes. With the runner from agent.py it defaults to agent.warm_up,
+            for the sub-agents named in SERVER_WARMUP ('all', the default, a comma-separated
+            list, or 'none').
+
+    Returns:
+        FastAPI: The app.
+    """
+    if runner is None or get_session is None:
+        import agent
+
+        if runner is None and warm_up is None:
+            warm_up = _agent_warm_up(agent)
+        runner = runner or agent.runner
+        get_session = get_session or agent.get_or_create_session
+    admission = admission or AdmissionController(
+        max_concurrent=int(os.getenv("SERVER_MAX_CONCURRENT_TURNS", DEFAULT_MAX_CONCURRENT_TURNS)),
+        max_queue=int(os.getenv("SERVER_MAX_QUEUED_TURNS", DEFAULT_MAX_QUEUED_TURNS)),
+        max_wait=float(os.getenv("SERVER_MAX_QUEUE_WAIT", DEFAULT_MAX_QUEUE_WAIT)),
+    )
+    session_locks = session_locks or SessionLocks(
+        max_waiting=int(os.getenv("SERVER_MAX_SESSION_WAITERS", DEFAULT_MAX_SESSION_WAITERS))
+    )
+    metrics = TurnMetrics()
+    started_at = time.time()
+    warm = {"done": warm_up is None, "seconds": None, "error": None}
+
+    async def run_warm_up():
+        started = time.monotonic()
+        try:
+            await warm_up()
+        except Exception as e:
+            # Whatever failed to load is loaded again by the first turn that needs it.
+            warm["error"] = f"{type(e).__name__}: {e}"
+            logger.warning("Warm-up failed: %s", warm["error"])
+        warm["seconds"] = round(time.monotonic() - started, 3)
+        warm["done"] = True
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        warming = asyncio.create_task(run_warm_up()) if warm_up is not None else None
+        yield
+        if warming is not None:
+            warming.cancel()
+        await get_http_client().aclose()
+
+    app = FastAPI(title="Multi-Agent System", lifespan=lifespan)
+
+    async def admit(user_id: str, session_id: str) -> AsyncExitStack:
+        """Takes the session's lock, then a turn slot; the caller closes the stack."""
+        stack = AsyncExitStack()
+        try:
+            await stack.enter_async_context(session_locks.hold((user_id, session_id)))
+            await stack.enter_async_context(admission.slot())
+        except BaseException:
+            await stack.aclose()
+            raise
+        return stack
+
+    @app.post("/users/{user_id}/sessions/{session_id}/turns")
+    async def run_turn(
+        body: TurnRequest,
+        user_id: str = Path(pattern=ID_PATTERN),
+        session_id: str = Path(pattern=ID_PATTERN),
+    ):
+        """Runs one turn of a conversation; streams it as server-sent events if asked to."""
+        mark("first_request")
+        try:
+            stack = await admit(user_id, session_id)
+        except AdmissionRejected as e:
+            metrics.record("rejected")
+            return _rejected(e)
+
+        started = time.monotonic()
+        try:
+            await get_session(user_id, session_id)
+        except BaseException:
+            await stack.aclose()
+            metrics.record("failed")
+            raise
+
+        if body.stream:
+            turn = {"result": "disconnected", "finished": False}
+
+            async def finish():
+                # Called by the generator and, in case the response ended before the
+                # generator started, again as a background task; only the first call counts.
+                if turn["finished"]:
+                    return
+                turn["finished"] = True
+                if turn["result"] == "completed":
+                    mark("first_answer")
+                metrics.record(turn["result"], time.monotonic() - started)
+                await stack.aclose()
+
+            async def events() -> AsyncGenerator[str, None]:
+                try:
+                    async for update in stream_turn(runner, user_id, session_id, body.query):
+                        yield format_sse(update)
+                    turn["result"] = "completed"
+                except Exception as e:
+                    turn["result"] = "failed"
+                    yield format_sse({"type": "error", "error": f"{type(e).__name__}: {e}"})
+                finally:
+                    await finish()
+
+            return StreamingResponse(
+                events(),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache"},
+                background=BackgroundTask(finish),
+            )
+
+        answer = None
+        try:
+            async with stack:
+                async for update in stream_turn(runner, user_id, session_id, body.query, run_config=RunConfig()):
+                    if update["type"] == "answer":
+                        answer = update["text"]
+        except Exception as e:
+            metrics.record("failed", time.monotonic() - started)
+            return JSONResponse({"error": f"{type(e).__name__}: {e}"}, status_code=500)
+        duration = time.monotonic() - started
+        mark("first_answer")
+        metrics.record("completed", duration)
+        return {"user_id": user_id, "session_id": session_id, "answer": answer, "duration_ms": round(duration * 1000, 1)}
+
+    @app.get("/healthz")
+    async def healthz():
+        """Liveness: the process serves requests."""
+        return {"status": "ok", "uptime_s": round(time.time() - started_at, 1)}
+
+    @app.get("/readyz")
+    async def readyz():
+        """Readiness: 503 while warming up or while new turns would be rejected, so load balancers send them elsewhere."""
+        if not warm["done"]:
+            return JSONResponse({"status": "warming_up"}, status_code=503)
+        if admission.saturated:
+            return JSONResponse({"status": "saturated"}, status_code=503)
+        return {"status": "ready"}
+
+    @app.get("/metrics")
+    async def metrics_endpoint():
+        """Load, turn latency, token usage and the state of caches and upstreams."""
+        summaries = turn_summaries()
+        return {
+            "turns": metrics.stats(),
+            "admission": admission.stats(),
+            "sessions": session_locks.stats(),
+            "tokens": {
+                "turns": len(summaries),
+                "input": sum(s["llm"]["input_tokens"] for s in summaries),
+                "output": sum(s["llm"]["output_tokens"] for s in summaries),
+            },
+            "response_cache": get_response_cache().stats(),
+            "prefetch": get_prefetcher().stats(),
+            "circuits": circuit_stats(),
+            "rate_limits": get_http_client().scheduler.stats(),
+            "startup": {**startup_stats(), "warm_up": warm},
+        }
+
+    return app
+
+
+# --- Entry Point ---
+def main():
+    """Serves the app with uvicorn."""
+    parser = argparse.ArgumentParser(description="Serve the Multi-Agent System over HTTP.")
+    parser.add_argument("--host", default=os.getenv("SERVER_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("SERVER_PORT", "8000")))
+    args = parser.parse_args()
+
+    import uvicorn
+
+    uvicorn.run(create_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
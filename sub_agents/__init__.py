@@ -1,6 +1,142 @@
-from .launches_agent import launches_agent
-from .weather_agent import weather_agent
-from .summarizer_agent import summarizer_agent
-from .news_agent import news_agent
+"""
+sub_agents
 
-print("sub_agents/__init__.py: All sub-agent instances imported.")
\ No newline at end of file
+The sub-agents of the Multi-Agent System, loaded on first use.
+- AGENT_MODULES maps each sub-agent to the module that builds it. A module, and the
+  dependencies of its tools (bs4 and fake_useragent for launches_agent, numpy for
+  weather_agent), is only imported the first time the agent is needed.
+- `registry.get(name)` loads and returns an agent; load hooks (e.g. the history
+  manager) run once per agent as it is loaded, in the calling thread.
+- `registry.preload(name)` only imports the module, so it can run in a worker thread
+  while the event loop keeps changing the live agent tree.
+- `from sub_agents import launches_agent` still works; it loads that agent.
+"""
+
+# --- Imports ---
+import importlib
+import logging
+import sys
+import threading
+import time
+from types import ModuleType
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+AGENT_MODULES: Dict[str, str] = {
+    "launches_agent": "sub_agents.launches_agent",
+    "weather_agent": "sub_agents.weather_agent",
+    "news_agent": "sub_agents.news_agent",
+    "summarizer_agent": "sub_agents.summarizer_agent",
+}
+
+
+# --- Registry ---
+class AgentRegistry:
+    """Imports and builds sub-agents the first time they are asked for."""
+
+    def __init__(self, modules: Optional[Dict[str, str]] = None):
+        """
+        Args:
+            modules (Optional[Dict[str, str]]): Agent name -> module defining an agent of
+                that name; defaults to AGENT_MODULES.
+        """
+        self.modules = dict(AGENT_MODULES if modules is None else modules)
+        self._agents: Dict[str, Any] = {}
+        self._hooks: List[Callable[[Any], Any]] = []
+        self._lock = threading.RLock()
+        self.load_times: Dict[str, float] = {}
+
+    def names(self) -> List[str]:
+        return list(self.modules)
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._agents
+
+    def loaded(self) -> Dict[str, Any]:
+        """Returns the agents loaded so far, by name."""
+        return dict(self._agents)
+
+    def on_load(self, hook: Callable[[Any], Any]):
+        """Calls `hook(agent)` for every agent loaded from now on and for those already loaded."""
+        with self._lock:
+            self._hooks.append(hook)
+            for agent in self._agents.values():
+                hook(agent)
+
+    def preload(self, name: str) -> bool:
+        """
+        Imports a sub-agent's module without publishing the agent or running the hooks.
+
+        Safe to call from any thread (e.g. asyncio.to_thread); a later get() then only
+        runs the hooks.
+
+        Args:
+            name (str): Agent name, e.g. "launches_agent".
+
+        Returns:
+            bool: True if the agent has a module (now imported).
+        """
+        path = self.modules.get(name)
+        if path is None:
+            return False
+        if path not in sys.modules:
+            started = time.perf_counter()
+            # __import__ (unlike importlib.import_module) is what `python -X importtime` reports.
+            __import__(path)
+            self.load_times[name] = time.perf_counter() - started
+            logger.info("Agent '%s' imported in %.0f ms.", name, self.load_times[name] * 1000)
+        if name not in self._agents:
+            # Importing the submodule bound the package attribute to the module; until get()
+            # publishes the agent, let __getattr__ answer for it.
+            globals().pop(name, None)
+        return True
+
+    def get(self, name: str) -> Optional[Any]:
+        """
+        Returns a sub-agent, importing its module on first use.
+
+        The load hooks change the live agent tree (parent links, callbacks), so call this
+        from the thread that runs the agents (the event loop's); use preload() elsewhere.
+
+        Args:
+            name (str): Agent name, e.g. "launches_agent".
+
+        Returns:
+            Optional[BaseAgent]: The agent, or None if no module defines it.
+        """
+        agent = self._agents.get(name)
+        if agent is not None or name not in self.modules:
+            return agent
+        with self._lock:
+            if name in self._agents:
+                return self._agents[name]
+            self.preload(name)
+            agent = getattr(sys.modules[self.modules[name]], name, None)
+            if agent is None:
+                logger.error("Module %s did not build agent '%s'.", self.modules[name], name)
+                return None
+            for hook in self._hooks:
+                hook(agent)
+            globals()[name] = agent
+            self._agents[name] = agent
+            return agent
+
+    def module(self, name: str) -> ModuleType:
+        """Returns the module of a sub-agent, loading the agent first."""
+        self.get(name)
+        return importlib.import_module(self.modules[name])
+
+    def load_all(self) -> List[Any]:
+        """Loads every registered agent (e.g. to warm up a worker)."""
+        return [agent for agent in (self.get(name) for name in self.names()) if agent is not None]
+
+
+registry = AgentRegistry()
+
+
+def __getattr__(name: str) -> Any:
+    if name in AGENT_MODULES:
+        return registry.get(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
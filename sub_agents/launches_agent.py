@@ -2,53 +2,44 @@
 launches_agent.py
 
 Defines the Launches Agent for the Multi-Agent System.
-- Fetches and rotates free proxies for web requests.
+- Keeps a long-lived, health-scored pool of free proxies for web requests.
 - Retrieves rocket launch information from the SpaceDev API.
 - Provides a tool for LlmAgent to access launch data.
 - Configures and instantiates the launches_agent for use in orchestration.
 """
 
 # --- Imports ---
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Tuple
 from google.adk.agents import LlmAgent
 from google.adk.tools import ToolContext
-import warnings
-# Ignore all warnings
-warnings.filterwarnings("ignore")
 import logging
-logging.basicConfig(level=logging.ERROR)
-import requests
+import asyncio
+import httpx
 from bs4 import BeautifulSoup
 from fake_useragent import UserAgent
-import random
-import time
+from utils import ProxyPool, add_event, annotate, get_http_client, get_prefetcher, get_response_cache, get_shared_store, make_cache_key
 
-print("Libraries imported.")
+logger = logging.getLogger(__name__)
 
 # --- Proxy Utilities ---
 
 # Step 1: Get free proxies from a public site
-def get_free_proxies():
+def parse_proxy_table(html: str) -> List[str]:
     """
-    Scrapes a list of free HTTPS proxies from a public proxy listing site.
+    Extracts HTTPS-capable proxies from the free-proxy-list.net HTML page.
+
+    Args:
+        html (str): Raw HTML of the proxy listing page.
 
     Returns:
         List[str]: List of proxy addresses in the format 'http://IP:PORT'.
     """
-    print("🔍 Fetching free proxies...")
-    url = "https://free-proxy-list.net/"
-    
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"
-    }
-
-    response = requests.get(url, headers=headers)
-    soup = BeautifulSoup(response.text, "html.parser")
+    soup = BeautifulSoup(html, "html.parser")
     proxies = []
 
     table = soup.find("table", class_="table table-striped table-bordered")
     if table is None:
-        print("❌ Could not find proxy table. Site might have changed again.")
+        logger.error("Could not find proxy table. Site might have changed again.")
         return proxies
 
     for row in table.tbody.find_all("tr"):
@@ -58,88 +49,95 @@ def get_free_proxies():
         https = cols[6].text.strip().lower()  # Yes/No column for HTTPS
         if https == "yes":
             proxies.append(f"http://{ip}:{port}")
+    return proxies
+
+async def get_free_proxies():
+    """
+    Scrapes a list of free HTTPS proxies from a public proxy listing site.
 
-    print(f"✅ Found {len(proxies)} HTTPS proxies.")
+    Returns:
+        List[str]: List of proxy addresses in the format 'http://IP:PORT'.
+    """
+    url = "https://free-proxy-list.net/"
+    
+    headers = {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"
+    }
+
+    try:
+        response = await get_http_client().get(url, headers=headers, upstream="proxy-list")
+    except httpx.HTTPError as e:
+        add_event("proxy_list_failed", error=f"{type(e).__name__}: {e}")
+        return []
+    # HTML parsing is CPU-bound, so keep it off the event loop.
+    proxies = await asyncio.to_thread(parse_proxy_table, response.text)
+
+    annotate(**{"proxy.list_size": len(proxies)})
     return proxies
 
-# Step 2: Fetch a URL using rotating proxies & User-Agents
-def fetch_with_rotation(url, proxies, params=None, max_retries=30):
+# Step 2: Keep one proxy pool for the whole process (its health is shared with the
+# other worker processes when SHARED_STATE_PATH is set)
+proxy_pool = ProxyPool(fetch_proxies=get_free_proxies, store=get_shared_store())
+
+_user_agent = None
+
+def random_user_agent_headers() -> Dict[str, str]:
     """
-    Attempts to fetch a URL using a rotating set of proxies and random User-Agents.
+    Builds request headers with a random browser User-Agent.
+
+    The UserAgent database is loaded once and reused across calls.
+
+    Returns:
+        Dict[str, str]: Headers for a JSON request.
+    """
+    global _user_agent
+    if _user_agent is None:
+        _user_agent = UserAgent()
+    return {
+        "User-Agent": _user_agent.random,
+        "Accept": "application/json"
+    }
+
+# Step 3: Fetch a URL by racing the healthiest proxies
+async def fetch_with_rotation(url, params=None, hedge=3, max_rounds=3):
+    """
+    Fetches a URL through the shared proxy pool, racing several proxies at once.
 
     Args:
         url (str): The target URL.
-        proxies (List[str]): List of proxy addresses.
         params (dict, optional): Query parameters for the request.
-        max_retries (int): Maximum number of attempts.
+        hedge (int): Number of proxies raced in parallel per round.
+        max_rounds (int): Maximum number of rounds before giving up.
 
     Returns:
         dict or None: JSON response if successful, else None.
     """
-    ua = UserAgent()
-    tried = set()
-
-    for _ in range(max_retries):
-        proxy = random.choice(proxies)
-        if proxy in tried:
-            continue
-        tried.add(proxy)
-
-        headers = {
-            "User-Agent": ua.random,
-            "Accept": "application/json"
-        }
-
-        try:
-            print(f"🌐 Trying proxy: {proxy}")
-            response = requests.get(url, headers=headers, proxies={"http": proxy, "https": proxy}, timeout=10, params=params)
-
-            if response.status_code == 200:
-                print("✅ Success!")
-                return response.json()
-            elif response.status_code == 429:
-                print("⚠️ Rate limit. Sleeping...")
-                time.sleep(60)
-            else:
-                print(f"⚠️ Unexpected status: {response.status_code}")
-        except Exception as e:
-            print(f"❌ Failed proxy {proxy}: {e}")
-
-        # Random delay to simulate human behavior
-        time.sleep(random.uniform(3, 6))
-
-    print("🚫 All proxies failed or max retries reached.")
-    return None
+    return await proxy_pool.fetch_json(
+        url,
+        params=params,
+        headers_factory=random_user_agent_headers,
+        upstream="spacedevs",
+        hedge=hedge,
+        max_rounds=max_rounds,
+    )
 
 # --- Launch Info Fetching Tool ---
-# Step 3: Dynamic launch info fetcher
-def fetch_launch_info(tool_context: ToolContext, agency: str = "spacex", time_filter: str = "upcoming", count: int = 1) -> List[Dict[str, Any]]:
+# Step 4: Build and send launch queries
+def launch_request(agency: str = "spacex", time_filter: str = "upcoming", count: int = 1) -> Tuple[str, Dict[str, Any]]:
     """
-    Fetches launch information from the SpaceDev API based on agency and time filter.
-    
-    Parameters:
-    - tool_context (ToolContext): The context for the tool, including state management.
-    - agency (str): The space agency to filter launches by (default: "spacex"), e.g., "spacex", "nasa", "isro", etc.
-    - time_filter (str): Filter for launch time ("upcoming", "past", "first").
-    - count (int): Number of launches to retrieve (default: 1).
-    
+    Builds the SpaceDev API request for a launch query.
+
+    Args:
+        agency (str): The space agency to filter launches by.
+        time_filter (str): "upcoming", "past" or "first".
+        count (int): Number of launches to retrieve.
+
     Returns:
-    - List of launch information dictionaries.
-    - Each dictionary contains:
-        - name (str): Launch name.
-        - launch_date (str): Launch date.
-        - location_name (str): Launch location.
-        - latitude (float): Launch pad latitude.
-        - longitude (float): Launch pad longitude.
-        - status (str): Launch status description.
-        - failreason (str): Reason for failure, if any.
-        - mission_description (str): Description of the mission.
+        Tuple[str, Dict[str, Any]]: The request URL and query parameters.
+
+    Raises:
+        ValueError: If time_filter is not supported.
     """
-    
-    proxies = get_free_proxies()
-    if not proxies:
-        return
-    
     base_url = "https://ll.thespacedevs.com/2.2.0/launch/"
     params = {
         "search": agency.lower(),
@@ -160,25 +158,45 @@ def fetch_launch_info(tool_context: ToolContext, agency: str = "spacex", time_fi
     else:
         raise ValueError("Invalid time_filter. Choose from 'upcoming', 'past', 'first'.")
 
-    full_url = base_url + endpoint
-    print(f"📡 Querying: {full_url} with params: {params}")
+    return base_url + endpoint, params
 
-    json_data = fetch_with_rotation(full_url, proxies, params=params)
-    if not json_data:
-        tool_context.state['launch_info_retrieval_status'] = 'failure_api_call'
-        return []
+async def request_launches(url: str, params: Dict[str, Any]):
+    """
+    Sends a launch request through the response cache and the proxy pool.
+
+    Args:
+        url (str): Request URL from launch_request.
+        params (Dict[str, Any]): Query parameters from launch_request.
+
+    Returns:
+        dict or None: The API response, or None if every proxy failed.
+    """
+    return await get_response_cache().get_or_fetch(
+        "spacedevs", url, params, lambda: fetch_with_rotation(url, params=params)
+    )
+
+def parse_launches(json_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Reduces a SpaceDev API launch list to the fields the agents use.
+
+    Args:
+        json_data (Dict[str, Any]): Decoded API response with a 'results' list.
 
-    results = json_data.get("results", [])
+    Returns:
+        List[Dict[str, Any]]: One dictionary per launch (see fetch_launch_info).
+    """
     launches = []
 
-    for launch in results:
-        pad = launch.get("pad", {})
-        location = pad.get("location", {})
-        status = launch.get("status", {})
-        mission = launch.get("mission", {})
+    for launch in json_data.get("results", []):
+        pad = launch.get("pad") or {}
+        location = pad.get("location") or {}
+        status = launch.get("status") or {}
+        mission = launch.get("mission") or {}
+        net = launch.get("net")
         launches.append({
             "name": launch.get("name"),
-            "launch_date": launch.get("net")[:10],  # Extract date part from datetime
+            "launch_date": net[:10] if net else None,  # Extract date part from datetime
+            "launch_time": net,
             "location_name": location.get("name"),
             "latitude": pad.get("latitude"),
             "longitude": pad.get("longitude"),
@@ -186,8 +204,52 @@ def fetch_launch_info(tool_context: ToolContext, agency: str = "spacex", time_fi
             "failreason": launch.get("failreason"),
             "mission_description": mission.get("description")
         })
-        
+    return launches
+
+# Step 5: Dynamic launch info fetcher
+async def fetch_launch_info(tool_context: ToolContext, agency: str = "spacex", time_filter: str = "upcoming", count: int = 1) -> List[Dict[str, Any]]:
+    """
+    Fetches launch information from the SpaceDev API based on agency and time filter.
+    
+    Parameters:
+    - tool_context (ToolContext): The context for the tool, including state management.
+    - agency (str): The space agency to filter launches by (default: "spacex"), e.g., "spacex", "nasa", "isro", etc.
+    - time_filter (str): Filter for launch time ("upcoming", "past", "first").
+    - count (int): Number of launches to retrieve (default: 1).
+    
+    Returns:
+    - List of launch information dictionaries.
+    - Each dictionary contains:
+        - name (str): Launch name.
+        - launch_date (str): Launch date.
+        - launch_time (str): Full launch date and time (UTC, ISO 8601).
+        - location_name (str): Launch location.
+        - latitude (float): Launch pad latitude.
+        - longitude (float): Launch pad longitude.
+        - status (str): Launch status description.
+        - failreason (str): Reason for failure, if any.
+        - mission_description (str): Description of the mission.
+    """
+
+    full_url, params = launch_request(agency, time_filter, count)
+    annotate(**{"launches.agency": agency, "launches.time_filter": time_filter, "launches.count": count})
+
+    # A speculative prefetch of the same request (started while the planner ran) is used if present.
+    json_data = await get_prefetcher().take(
+        tool_context.invocation_id,
+        make_cache_key("spacedevs", full_url, params),
+        lambda: request_launches(full_url, params),
+    )
+    if not json_data:
+        tool_context.state['launch_info_retrieval_status'] = 'failure_api_call'
+        # Drop the previous turn's launches, so nothing reads them as this request's result.
+        tool_context.state['launch_info'] = None
+        return []
+
+    launches = parse_launches(json_data)
     tool_context.state['launch_info'] = launches
+    tool_context.state['launch_info_retrieval_status'] = 'success'
+    annotate(**{"launches.results": len(launches)})
 
     return launches
 
@@ -226,6 +288,6 @@ try:
         description="Handles rocket launch information queries using the 'fetch_launch_info' tool.", # Crucial for delegation
         tools=[fetch_launch_info],  # Register the tool
     )
-    print(f"✅ Agent '{launches_agent.name}' created using model '{launches_agent.model}'.")
+    logger.info("Agent '%s' created using model '%s'.", launches_agent.name, launches_agent.model)
 except Exception as e:
-    print(f"❌ Could not create Launch Info agent. Check API Key ({launches_agent.model}). Error: {e}")
+    logger.error("Could not create Launch Info agent. Error: %s", e)
@@ -8,21 +8,112 @@ Defines the News Agent for the Multi-Agent System.
 """
 
 # --- Imports ---
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 import os
 from google.adk.agents import LlmAgent
 from google.adk.tools import ToolContext
-import warnings
-# Ignore all warnings
-warnings.filterwarnings("ignore")
 import logging
-logging.basicConfig(level=logging.ERROR)
-import requests
+import httpx
+from utils import RateLimitExceeded, annotate, get_http_client, get_prefetcher, get_response_cache, make_cache_key
 
-print("Libraries imported.")
+logger = logging.getLogger(__name__)
+
+# --- News Requests ---
+def news_request(
+    q: Optional[str] = None,
+    searchIn: str = "title",
+    sources: Optional[str] = None,
+    domains: Optional[str] = None,
+    exclude_domains: Optional[str] = None,
+    from_date: Optional[str] = None,
+    to_date: Optional[str] = None,
+    language: Optional[str] = None,
+    sort_by: Optional[str] = "publishedAt",
+    page_size: int = 10,
+    page: int = 1
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Builds the NewsAPI request for a search (see fetch_news_articles for the parameters).
+
+    Returns:
+    - The request URL and query parameters, including the API key.
+
+    Raises:
+    - ValueError: If NEWS_API_KEY is not set.
+    """
+    api_key = os.getenv("NEWS_API_KEY")
+    if not api_key:
+        raise ValueError("NEWS_API_KEY is not set.")
+
+    base_url = "https://newsapi.org/v2/everything" # Or /v2/top-headlines if more appropriate for some queries
+
+    api_params = {
+        "searchIn": searchIn,  # Always set to "title" as per the requirement
+        "apiKey": api_key,
+        "pageSize": page_size,
+        "page": page
+    }
+
+    if q: api_params["q"] = q
+    if sources: api_params["sources"] = sources
+    if domains: api_params["domains"] = domains
+    if exclude_domains: api_params["excludeDomains"] = exclude_domains
+    if from_date: api_params["from"] = from_date
+    if to_date: api_params["to"] = to_date
+    if language: api_params["language"] = language
+    if sort_by: api_params["sortBy"] = sort_by
+
+    # Remove None values to avoid sending empty parameters
+    return base_url, {k: v for k, v in api_params.items() if v is not None}
+
+async def request_news(url: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Sends a NewsAPI request through the response cache.
+
+    Only successful searches are cached; the API key is not part of the cache key.
+
+    Returns:
+    - The decoded API response.
+
+    Raises:
+    - httpx.HTTPError: If the request fails or returns an HTTP error status.
+    """
+    async def fetch_articles():
+        response = await get_http_client().get(url, params=params, upstream="newsapi", timeout=10)
+        response.raise_for_status() # Raise an exception for HTTP errors
+        return response.json()
+
+    return await get_response_cache().get_or_fetch(
+        "newsapi", url, params, fetch_articles,
+        should_cache=lambda data: isinstance(data, dict) and data.get("status") == "ok",
+    )
+
+def parse_articles(json_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Reshapes the articles of a successful NewsAPI response for the agents.
+
+    Returns:
+    - List of dictionaries, one per article: source name, author, title, description,
+      URLs, publication timestamp and date, and the truncated content.
+    """
+    articles = []
+    for article_data in json_data.get("articles", []):
+        published_at = article_data.get("publishedAt")
+        articles.append({
+            "source_name": (article_data.get("source") or {}).get("name", "N/A"),
+            "author": article_data.get("author"),
+            "title": article_data.get("title"),
+            "description": article_data.get("description"),
+            "url": article_data.get("url"),
+            "urlToImage": article_data.get("urlToImage"),
+            "publishedAt": published_at, # Full timestamp
+            "published_date": published_at[:10] if published_at else "", # Simple date
+            "content_snippet": article_data.get("content") # Truncated content
+        })
+    return articles
 
 # --- News Fetching Tool ---
-def fetch_news_articles(
+async def fetch_news_articles(
     tool_context: ToolContext,
     q: Optional[str] = None,
     searchIn: str = "title",
@@ -56,75 +147,48 @@ def fetch_news_articles(
     Returns:
     - List of dictionaries, each representing a news article.
     """
-    print(f"TOOL (news_agent.py): fetch_news_articles called with q='{q}', sources='{sources}', domains='{domains}', etc.")
+    annotate(**{"news.query": q, "news.sources": sources, "news.domains": domains, "news.page_size": page_size})
     api_key = os.getenv("NEWS_API_KEY")
     if not api_key:
-        print("❌ NEWS_API_KEY not found in environment variables.")
+        annotate(**{"news.status": "failure_missing_api_key"})
         tool_context.state['news_info_retrieval_status'] = 'failure_missing_api_key'
         tool_context.state['news_articles'] = []
         return []
 
-    base_url = "https://newsapi.org/v2/everything" # Or /v2/top-headlines if more appropriate for some queries
-
-    api_params = {
-        "searchIn": searchIn,  # Always set to "title" as per the requirement
-        "apiKey": api_key,
-        "pageSize": page_size,
-        "page": page
-    }
-
-    if q: api_params["q"] = q
-    if sources: api_params["sources"] = sources
-    if domains: api_params["domains"] = domains
-    if exclude_domains: api_params["excludeDomains"] = exclude_domains
-    if from_date: api_params["from"] = from_date
-    if to_date: api_params["to"] = to_date
-    if language: api_params["language"] = language
-    if sort_by: api_params["sortBy"] = sort_by
-    
-    # Remove None values to avoid sending empty parameters
-    api_params = {k: v for k, v in api_params.items() if v is not None}
-
-    print(f"📡 Querying NewsAPI: {base_url} with params: {api_params}")
+    base_url, api_params = news_request(
+        q=q, searchIn=searchIn, sources=sources, domains=domains, exclude_domains=exclude_domains,
+        from_date=from_date, to_date=to_date, language=language, sort_by=sort_by, page_size=page_size, page=page,
+    )
 
     articles_to_return = []
     try:
-        response = requests.get(base_url, params=api_params, timeout=10)
-        response.raise_for_status() # Raise an exception for HTTP errors
-        json_data = response.json()
+        # A speculative prefetch of the same search (started while the planner ran) is used if present.
+        json_data = await get_prefetcher().take(
+            tool_context.invocation_id,
+            make_cache_key("newsapi", base_url, api_params),
+            lambda: request_news(base_url, api_params),
+        )
 
         if json_data.get("status") == "ok":
-            raw_articles = json_data.get("articles", [])
-            for article_data in raw_articles:
-                articles_to_return.append({
-                    "source_name": article_data.get("source", {}).get("name", "N/A"),
-                    "author": article_data.get("author"),
-                    "title": article_data.get("title"),
-                    "description": article_data.get("description"),
-                    "url": article_data.get("url"),
-                    "urlToImage": article_data.get("urlToImage"),
-                    "publishedAt": article_data.get("publishedAt"), # Full timestamp
-                    "published_date": article_data.get("publishedAt")[:10] if article_data.get("publishedAt") else "", # Simple date
-                    "content_snippet": article_data.get("content") # Truncated content
-                })
+            articles_to_return = parse_articles(json_data)
             tool_context.state['news_info_retrieval_status'] = 'success'
             tool_context.state['news_articles'] = articles_to_return # Store the list of dicts
-            print(f"TOOL (news_agent.py): fetch_news_articles stored {len(articles_to_return)} articles in state.")
         else:
             error_message = json_data.get("message", "Unknown API error")
-            print(f"❌ NewsAPI returned error: {error_message}")
             tool_context.state['news_info_retrieval_status'] = f'failure_api_error: {error_message}'
             tool_context.state['news_articles'] = []
             
-    except requests.exceptions.RequestException as e:
-        print(f"❌ API Request Error for NewsAPI: {e}")
+    except RateLimitExceeded as e:
+        tool_context.state['news_info_retrieval_status'] = f'failure_rate_limited: {str(e)}'
+        tool_context.state['news_articles'] = []
+    except httpx.HTTPError as e:
         tool_context.state['news_info_retrieval_status'] = f'failure_request_exception: {str(e)}'
         tool_context.state['news_articles'] = []
     except Exception as e:
-        print(f"❌ An unexpected error occurred in fetch_news_articles: {e}")
         tool_context.state['news_info_retrieval_status'] = f'failure_unexpected: {str(e)}'
         tool_context.state['news_articles'] = []
-        
+
+    annotate(**{"news.status": tool_context.state['news_info_retrieval_status'], "news.results": len(articles_to_return)})
     return articles_to_return
 
 
@@ -171,6 +235,6 @@ try:
         description="Fetches news articles from NewsAPI based on dynamic parameters derived from user query and context which calls 'fetch_news_articles' exactly once", # Crucial for delegation
         tools=[fetch_news_articles],  # Register the tool
     )
-    print(f"✅ Agent '{news_agent.name}' created using model '{news_agent.model}'.")
+    logger.info("Agent '%s' created using model '%s'.", news_agent.name, news_agent.model)
 except Exception as e:
-    print(f"❌ Could not create News Info agent. Check API Key ({news_agent.model}). Error: {e}")
\ No newline at end of file
+    logger.error("Could not create News Info agent. Error: %s", e)
\ No newline at end of file
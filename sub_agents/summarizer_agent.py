@@ -7,8 +7,11 @@ Defines the Summarizer Agent for the Multi-Agent System.
 - Configures and instantiates the summarizer_agent for use in orchestration.
 """
 # --- Imports ---
+import logging
 from google.adk.agents import LlmAgent
 
+logger = logging.getLogger(__name__)
+
 # --- Agent Instruction ---
 # Instruction for LlmAgent: strictly enforces summary-only, direct, and context-driven responses.
 summarizer_agent_instruction = """
@@ -33,12 +36,16 @@ You are a sophisticated Information Synthesizer AI. Your sole purpose is to gene
     Analyze the session state always and provide a best possible summary while including all key details based on the available data:
     Session state to consider:
         ['launch_info'] : List of dicts with launch details (name, date, location, status, etc.)
-        ['weather_info'] : Dict with weather details (temperature, conditions, etc.)
+        ['weather_info'] : Dict with a weather digest: min/max/mean per variable (temperature, precipitation, cloud cover, visibility, wind), worst-case values in the launch window and flags for high gusts, likely precipitation and heavy cloud cover
+        ['weather_info_by_launch'] : Dict of such weather digests keyed by launch name, when the weather was fetched for several launches (report the weather for each launch)
         ['news_articles'] : List of dicts with news article details (title, description, source, etc.)
+        ['step_outcomes'] : {step_outcomes?}
+            Outcome of each data-gathering agent this turn: "completed", "failed", "timed_out" (cancelled at the turn deadline) or "skipped".
     
     Refer to these keys in the session state to extract important relevant information and to provide the user with a comprehensive response while including all crucial details.
     
     Important note:
+        If an agent in ['step_outcomes'] did not complete, answer from the data that is available and briefly say which information could not be retrieved in time; do not speculate about it as if it had been retrieved.
         If the ['news_articles'] is empty, do not mention it in the response. Just use your best of information from the session state and use your knowledge to provide a satisfactory response to the user.
         
     *   **Structure & Conciseness:**
@@ -65,4 +72,4 @@ summarizer_agent = LlmAgent(
     # This agent typically doesn't need its own tools for this task;
     # it operates on the state populated by other agents.
 )
-print(f"✅ Agent '{summarizer_agent.name}' created.")
\ No newline at end of file
+logger.info("Agent '%s' created.", summarizer_agent.name)
\ No newline at end of file
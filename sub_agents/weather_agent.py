@@ -8,18 +8,18 @@ Defines the Weather Agent for the Multi-Agent System.
 """
 
 # --- Imports ---
-import json
-from typing import Any, Dict
+import asyncio
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
 from google.adk.agents import LlmAgent
 from google.adk.tools import ToolContext
-import requests
-import warnings
-# Ignore all warnings
-warnings.filterwarnings("ignore")
+import httpx
+from pydantic import BaseModel
 import logging
-logging.basicConfig(level=logging.ERROR)
+from utils import add_event, get_gazetteer, get_http_client, get_response_cache
+from utils.weather_digest import slice_forecast, summarize_forecast
 
-print("Libraries imported.")
+logger = logging.getLogger(__name__)
 
 # --- Tool Functions ---
 def get_current_date_tool(tool_context: ToolContext) -> str:
@@ -39,7 +39,144 @@ def get_current_date_tool(tool_context: ToolContext) -> str:
     tool_context.state['current_date'] = current_date
     return current_date
 
-def fetch_weather_info(tool_context: ToolContext, lat: float, lon: float, date: str) -> Dict[str, Any]:
+def lookup_location_coordinates(tool_context: ToolContext, location: str) -> Dict[str, Any]:
+    """
+    Resolves a place name (city, spaceport or launch site) to coordinates using the
+    bundled offline gazetteer. Tolerates small typos.
+
+    Parameters:
+    - tool_context (ToolContext): The context for the tool, including state management.
+    - location (str): Place name from the user's query, e.g. "Paris" or "Vandenberg SFB".
+
+    Returns:
+    - Dict[str, Any]: {"status": "found", "name", "kind", "country", "latitude", "longitude",
+    "alternatives"} for the best match, or {"status": "not_found", "suggestions": [...]}.
+    """
+    matches = get_gazetteer().search(location, limit=3)
+    if not matches or matches[0][1] < 0.85:
+        return {"status": "not_found", "location": location, "suggestions": [place.name for place, _ in matches]}
+    place, score = matches[0]
+    result = dict(place.to_dict(), status="found", match_score=score)
+    result["alternatives"] = [other.name for other, _ in matches[1:]]
+    return result
+
+def find_launch_time(tool_context: ToolContext, lat: float, lon: float, date: str) -> Optional[str]:
+    """
+    Looks up the launch time for a weather request in the session's 'launch_info'.
+
+    Parameters:
+    - tool_context (ToolContext): The context for the tool, including state management.
+    - lat (float): Latitude of the requested location.
+    - lon (float): Longitude of the requested location.
+    - date (str): Requested date in 'YYYY-MM-DD' format.
+
+    Returns:
+    - Optional[str]: The ISO launch time of a launch on that date near that location, if any.
+    """
+    for launch in tool_context.state.get('launch_info') or []:
+        try:
+            near = abs(float(launch.get('latitude')) - lat) < 0.5 and abs(float(launch.get('longitude')) - lon) < 0.5
+        except (TypeError, ValueError):
+            continue
+        if near and launch.get('launch_date') == date and launch.get('launch_time'):
+            return launch['launch_time']
+    return None
+
+# --- Forecast Requests ---
+FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+HOURLY_VARIABLES = [
+    "temperature_2m",
+    "precipitation_probability",
+    "precipitation",
+    "cloudcover",
+    "visibility",
+    "wind_speed_10m",
+    "wind_direction_10m",
+    "wind_gusts_10m",
+]
+DAILY_VARIABLES = [
+    "weathercode",
+    "temperature_2m_max",
+    "temperature_2m_min",
+    "precipitation_sum",
+    "wind_speed_10m_max",
+    "wind_gusts_10m_max",
+]
+
+# Batched requests: coordinates are rounded to this many decimals (about 11 km)
+# so nearby launch pads share one forecast location, and one request covers at
+# most MAX_BATCH_LOCATIONS locations over at most MAX_BATCH_DAYS days.
+BATCH_COORD_DECIMALS = 1
+MAX_BATCH_LOCATIONS = 10
+MAX_BATCH_DAYS = 7
+
+class WeatherLocation(BaseModel):
+    """One location for fetch_weather_batch (gives the tool a typed schema for the LLM)."""
+    name: str
+    lat: float
+    lon: float
+    date: str
+
+def forecast_params(latitudes: List[float], longitudes: List[float], start_date: str, end_date: str) -> Dict[str, Any]:
+    """
+    Builds open-meteo query parameters for one or more locations over a date range.
+
+    Parameters:
+    - latitudes (List[float]): Latitudes, one per location.
+    - longitudes (List[float]): Longitudes, in the same order.
+    - start_date (str): First day in 'YYYY-MM-DD' format.
+    - end_date (str): Last day in 'YYYY-MM-DD' format.
+
+    Returns:
+    - Dict[str, Any]: Query parameters; several locations are comma-separated.
+    """
+    return {
+        "latitude": ",".join(str(lat) for lat in latitudes),
+        "longitude": ",".join(str(lon) for lon in longitudes),
+        "timezone": "auto",  # Usually good to keep for correct time interpretation
+        "start_date": start_date,
+        "end_date": end_date,
+        "hourly": ",".join(HOURLY_VARIABLES),
+        "daily": ",".join(DAILY_VARIABLES),
+    }
+
+async def fetch_forecasts(params: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    """
+    Fetches forecasts through the shared response cache.
+
+    Parameters:
+    - params (Dict[str, Any]): Parameters from forecast_params().
+
+    Returns:
+    - Optional[List[Dict[str, Any]]]: One raw forecast per requested location, in request
+    order, or None if the API call failed.
+    """
+    async def fetch_forecast():
+        response = await get_http_client().get(FORECAST_URL, params=params, upstream="open-meteo")
+        if not response.is_success:
+            logger.warning("open-meteo answered %s.", response.status_code)
+            add_event("forecast_failed", status=response.status_code)
+            return None
+        return response.json()
+
+    try:
+        forecast = await get_response_cache().get_or_fetch("open-meteo", FORECAST_URL, params, fetch_forecast)
+    except httpx.HTTPError as e:
+        logger.warning("open-meteo request failed: %s", type(e).__name__)
+        add_event("forecast_failed", error=type(e).__name__)
+        return None
+    if not forecast:
+        return None
+    # open-meteo answers a single location with an object and several with a list.
+    return forecast if isinstance(forecast, list) else [forecast]
+
+def label_location(digest: Dict[str, Any], lat: float, lon: float):
+    """Names the digest's location after the nearest gazetteer place within 50 km."""
+    nearest = get_gazetteer().nearest(lat, lon, max_km=50)
+    if nearest is not None:
+        digest["location"]["name"] = nearest[0].name
+
+async def fetch_weather_info(tool_context: ToolContext, lat: float, lon: float, date: str) -> Dict[str, Any]:
     """
     Fetches weather information from the open-meteo API based on latitude, longitude and date.
     
@@ -50,48 +187,126 @@ def fetch_weather_info(tool_context: ToolContext, lat: float, lon: float, date:
     - date (str): Date for which the weather information is requested in 'YYYY-MM-DD' format.
     
     Returns:
-    - Dict[str, Any]: Weather information including temperature, precipitation, wind speed, etc.
+    - Dict[str, Any]: A compact weather digest: min/max/mean of temperature, precipitation,
+    cloud cover, visibility and wind, the worst-case values around the launch time (when the
+    request matches a launch in 'launch_info') and flags for gusts, rain and cloud cover.
+    The digest is stored in state['weather_info'] and the raw forecast in state['weather_info_raw'].
     If the API call fails, returns an empty dictionary and updates the state with an error status
     """
-    base_url = "https://api.open-meteo.com/v1/forecast"
-    
-    params = {
-    "latitude": lat, 
-    "longitude": lon,
-    "timezone": "auto",  # Usually good to keep for correct time interpretation
-    "start_date": date, # Set to launch date
-    "end_date": date,   # Set to launch date (or a day or two after for short-term forecast)
-    "hourly": ",".join([
-        "temperature_2m",
-        "precipitation_probability",
-        "precipitation",
-        "cloudcover",
-        "visibility",
-        "wind_speed_10m",
-        "wind_direction_10m",
-        "wind_gusts_10m",
-    ]),
-    "daily": ",".join([
-        "weathercode",
-        "temperature_2m_max",
-        "temperature_2m_min",
-        "precipitation_sum",
-        "wind_speed_10m_max",
-        "wind_gusts_10m_max",
-    ]),
-}
-    
-    response = requests.get(base_url, params=params)
-    if response.ok:
-        forecast = response.json()
-        print(json.dumps(forecast, indent=2))
+    forecasts = await fetch_forecasts(forecast_params([lat], [lon], date, date))
+
+    if forecasts:
+        forecast = forecasts[0]
+        digest = summarize_forecast(forecast, launch_time=find_launch_time(tool_context, lat, lon, date))
+        label_location(digest, lat, lon)
+        triggered = [name for name, flag in digest["flags"].items() if flag["triggered"]]
+        logger.info("Weather digest ready for (%s, %s) on %s. Flags: %s", lat, lon, date, triggered or "none")
         tool_context.state['weather_info_retrieval_status'] = 'success'
-        tool_context.state['weather_info'] = forecast
-        return forecast
+        tool_context.state['weather_info_raw'] = forecast
+        tool_context.state['weather_info'] = digest
+        return digest
     else:
-        print("Error:", response.status_code, response.text)
         tool_context.state['weather_info_retrieval_status'] = 'failure_api_call'
         return {}
+
+def group_weather_requests(points: List[Tuple[float, float, str]]) -> List[Dict[str, Any]]:
+    """
+    Groups (lat, lon, date) points into as few open-meteo requests as possible.
+
+    Points are rounded to BATCH_COORD_DECIMALS, so nearby pads share a location, and
+    packed greedily in date order into requests of at most MAX_BATCH_LOCATIONS
+    locations spanning at most MAX_BATCH_DAYS days.
+
+    Parameters:
+    - points (List[Tuple[float, float, str]]): Latitude, longitude and 'YYYY-MM-DD' date.
+
+    Returns:
+    - List[Dict[str, Any]]: One entry per request with 'locations' (rounded (lat, lon)
+    pairs), 'start_date', 'end_date' and the 'points' ((lat, lon), date) it covers.
+    """
+    groups: List[Dict[str, Any]] = []
+    unique = {((round(lat, BATCH_COORD_DECIMALS), round(lon, BATCH_COORD_DECIMALS)), day) for lat, lon, day in points}
+    for location, day in sorted(unique, key=lambda point: (point[1], point[0])):
+        for group in groups:
+            start, end = min(group["start_date"], day), max(group["start_date"], group["end_date"], day)
+            span = (datetime.fromisoformat(end) - datetime.fromisoformat(start)).days
+            fits = location in group["locations"] or len(group["locations"]) < MAX_BATCH_LOCATIONS
+            if span < MAX_BATCH_DAYS and fits:
+                if location not in group["locations"]:
+                    group["locations"].append(location)
+                group["start_date"], group["end_date"] = start, end
+                group["points"].append((location, day))
+                break
+        else:
+            groups.append({"locations": [location], "start_date": day, "end_date": day, "points": [(location, day)]})
+    return groups
+
+async def fetch_weather_batch(tool_context: ToolContext, locations: List[WeatherLocation]) -> Dict[str, Any]:
+    """
+    Fetches weather for several launches or places at once, e.g. every launch in 'launch_info'.
+    Nearby coordinates and close dates share upstream requests, which run concurrently.
+
+    Parameters:
+    - tool_context (ToolContext): The context for the tool, including state management.
+    - locations (List[WeatherLocation]): One entry per launch or place,
+    {"name": ..., "lat": ..., "lon": ..., "date": "YYYY-MM-DD"}. Launch dicts from 'launch_info'
+    (name, latitude, longitude, launch_date, launch_time) are accepted as they are.
+
+    Returns:
+    - Dict[str, Any]: A weather digest (see fetch_weather_info) per entry, keyed by launch
+    name; entries that could not be fetched map to {"error": ...}. Stored in
+    state['weather_info_by_launch']; state['weather_info'] holds the first digest.
+    """
+    results: Dict[str, Any] = {}
+    points = []
+    for i, entry in enumerate(locations or []):
+        entry = entry.model_dump() if isinstance(entry, BaseModel) else entry if isinstance(entry, dict) else {}
+        name = str(entry.get("name") or f"location {i + 1}")
+        while name in results:
+            name = f"{name} ({i + 1})"
+        try:
+            lat = float(entry["lat"] if entry.get("lat") is not None else entry["latitude"])
+            lon = float(entry["lon"] if entry.get("lon") is not None else entry["longitude"])
+            day = str(entry.get("date") or entry["launch_date"])[:10]
+            datetime.fromisoformat(day)
+        except (KeyError, TypeError, ValueError):
+            results[name] = {"error": "missing or invalid latitude, longitude or date"}
+            continue
+        results[name] = None
+        points.append((name, lat, lon, day, entry.get("launch_time")))
+
+    groups = group_weather_requests([(lat, lon, day) for _, lat, lon, day, _ in points])
+    responses = await asyncio.gather(*(
+        fetch_forecasts(forecast_params(
+            [lat for lat, _ in group["locations"]], [lon for _, lon in group["locations"]],
+            group["start_date"], group["end_date"],
+        ))
+        for group in groups
+    ))
+    forecast_for = {}
+    for group, forecasts in zip(groups, responses):
+        for location, day in group["points"]:
+            index = group["locations"].index(location)
+            if forecasts and index < len(forecasts):
+                forecast_for[(location, day)] = forecasts[index]
+
+    for name, lat, lon, day, launch_time in points:
+        location = (round(lat, BATCH_COORD_DECIMALS), round(lon, BATCH_COORD_DECIMALS))
+        forecast = forecast_for.get((location, day))
+        if forecast is None:
+            results[name] = {"error": "weather API call failed"}
+            continue
+        digest = summarize_forecast(slice_forecast(forecast, day), launch_time=launch_time)
+        label_location(digest, lat, lon)
+        results[name] = digest
+
+    digests = [d for d in results.values() if d and "error" not in d]
+    logger.info("Weather digests ready for %d/%d locations using %d request(s).", len(digests), len(results), len(groups))
+    tool_context.state['weather_info_retrieval_status'] = 'success' if digests else 'failure_api_call'
+    tool_context.state['weather_info_by_launch'] = results
+    if digests:
+        tool_context.state['weather_info'] = digests[0]
+    return results
     
 
 # --- Agent Instantiation ---
@@ -106,7 +321,7 @@ try:
         model = MODEL_GEMINI_2_0_FLASH,
         name="weather_agent",
         instruction="""
-            You are a specialized Weather Information Agent. Your primary role is to provide weather forecasts. You have access to two tools: 'fetch_weather_info' (requires latitude, longitude, date) and 'get_current_date_tool'.
+            You are a specialized Weather Information Agent. Your primary role is to provide weather forecasts. You have access to four tools: 'fetch_weather_info' (requires latitude, longitude, date), 'fetch_weather_batch' (weather for several launches or places in one call), 'lookup_location_coordinates' (resolves a place name to latitude and longitude) and 'get_current_date_tool'.
 
             Your goal is to gather valid latitude, longitude, and a date (in 'YYYY-MM-DD' format) to successfully call 'fetch_weather_info'.
 
@@ -120,6 +335,9 @@ try:
                     *   Extract 'latitude', 'longitude', and 'launch_date' directly from this first launch dictionary.
                     *   These values are your primary source for `lat`, `lon`, and `date`. Ensure the 'launch_date' is in 'YYYY-MM-DD' format (it should be as per context).
                     *   Proceed directly to step 4 (Fetching Weather).
+                *   If the user's query asks about the weather for several launches (e.g., "next 5 launches and their weather") and 'launch_info' has more than one launch:
+                    *   Call 'fetch_weather_batch' ONCE with `locations` holding one entry per launch in 'launch_info': {"name": <name>, "lat": <latitude>, "lon": <longitude>, "date": <launch_date>}. Do NOT call 'fetch_weather_info' once per launch.
+                    *   Then continue with step 5 (Responding to the User).
 
             2.  **Process User's Current Query for Location and Date (If No Relevant Context):**
                 *   If the `session.state` does not provide relevant launch details for the current weather query, or if the user asks a new, direct weather question (e.g., "What's the weather in Paris tomorrow?"):
@@ -129,8 +347,9 @@ try:
                         *   **If NO date is mentioned OR terms like "current weather" or "now" are used, you MUST use the 'get_current_date_tool' to obtain the current date.** Use the result of this tool as your date.
                     *   **Location Extraction & Lat/Lon Inference:**
                         *   Identify any location name mentioned (e.g., "Paris", "Vandenberg SFB").
-                        *   If a location name is found, you need to determine its latitude and longitude. **You must attempt to infer/provide the geographical coordinates (latitude and longitude as floating point numbers) for this location based on your general knowledge.** For example, for "Paris", you might infer lat: 48.85, lon: 2.35. For "Vandenberg SFB", you might infer lat: 34.7, lon: -120.5.
-                        *   If you cannot confidently infer both latitude and longitude for the given location name, you MUST inform the user that you need a more specific location or cannot determine its coordinates. Do NOT proceed to call 'fetch_weather_info' in this case.
+                        *   If a location name is found, **call 'lookup_location_coordinates' with the location name** to get its latitude and longitude. Use the returned 'latitude' and 'longitude' when its status is "found".
+                        *   Only if the status is "not_found", attempt to infer the geographical coordinates (latitude and longitude as floating point numbers) from your general knowledge. For example, for "Paris", you might infer lat: 48.85, lon: 2.35.
+                        *   If you still cannot confidently determine both latitude and longitude for the given location name, you MUST inform the user that you need a more specific location or cannot determine its coordinates. Do NOT proceed to call 'fetch_weather_info' in this case.
 
             3.  **Validate Inputs:**
                 *   Before calling 'fetch_weather_info', ensure you have:
@@ -147,20 +366,20 @@ try:
                 *   After 'fetch_weather_info' runs (or if any prior step failed):
                     *   If weather information was successfully fetched (the tool will store it in `session.state['weather_info']`).
                     *   If 'fetch_weather_info' failed (check `session.state['weather_info_retrieval_status']`), relay this.
-                    *   If you could not determine latitude/longitude for a location name, inform the user.
+                    *   If you could not determine latitude/longitude for a location name, inform the user (mention any 'suggestions' returned by 'lookup_location_coordinates').
                     *   If a date was ambiguous and you used the current date, you might optionally mention this (e.g., "Here's the current weather for Paris...").
                 *   Do not answer questions outside the scope of weather information.
 
             **Parameter Handling for 'fetch_weather_info' tool:**
-            *   `lat` (float): Latitude. Obtain from `session.state['launch_info'][0]['latitude']`, or by inferring from a location name in the user's query.
-            *   `lon` (float): Longitude. Obtain from `session.state['launch_info'][0]['longitude']`, or by inferring from a location name in the user's query.
+            *   `lat` (float): Latitude. Obtain from `session.state['launch_info'][0]['latitude']`, or from 'lookup_location_coordinates' for a location name in the user's query.
+            *   `lon` (float): Longitude. Obtain from `session.state['launch_info'][0]['longitude']`, or from 'lookup_location_coordinates' for a location name in the user's query.
             *   `date` (str): Date in 'YYYY-MM-DD' format. Obtain from `session.state['launch_info'][0]['launch_date']`, user's query, or by calling 'get_current_date_tool'.
 
             **Example Scenario (User asks "What's the weather like in Berlin?"):**
             1.  Context: No 'launch_info' relevant to "Berlin".
             2.  Query Processing:
                 *   Date: Not mentioned. Call `get_current_date_tool()`. Assume it returns "2025-06-26".
-                *   Location: "Berlin". Infer lat/lon (e.g., lat: 52.52, lon: 13.40).
+                *   Location: "Berlin". Call `lookup_location_coordinates(location="Berlin")`; it returns latitude 52.52, longitude 13.405.
             3.  Validate: Have lat, lon, date.
             4.  Fetch Weather: Call `fetch_weather_info(lat=52.52, lon=13.40, date="2025-06-26")`.
             5.  Respond: Pass the data to the next invloved agent as determined by the Sequential Agent.
@@ -177,8 +396,8 @@ try:
             5.  Respond: Pass the data to the next invloved agent as determined by the Sequential Agent.
             """,
         description="Handles weather information queries using the 'fetch_weather_info' tool.", # Crucial for delegation
-        tools=[fetch_weather_info, get_current_date_tool],  # Register the tool
+        tools=[fetch_weather_info, fetch_weather_batch, lookup_location_coordinates, get_current_date_tool],  # Register the tool
     )
-    print(f"✅ Agent '{weather_agent.name}' created using model '{weather_agent.model}'.")
+    logger.info("Agent '%s' created using model '%s'.", weather_agent.name, weather_agent.model)
 except Exception as e:
-    print(f"❌ Could not create Weather agent. Check API Key ({weather_agent.model}). Error: {e}")
\ No newline at end of file
+    logger.error("Could not create Weather agent. Error: %s", e)
\ No newline at end of file
@@ -0,0 +1,449 @@
+"""
+supervisor.py
+
+Multi-process serving mode: N server.py workers behind a sticky router.
+- Pre-forks the workers from a fork server that has the heavy libraries (ADK,
+  google-genai, FastAPI, NumPy, ...) imported, so they start fast and share those pages.
+- Routes every request of a session to the same worker (hash of user and session id),
+  so per-session serialization and the session cache keep working.
+- Shares the response cache, sessions, proxy-pool health and rate-limit buckets
+  through SQLite files (RESPONSE_CACHE_PATH, SESSION_STORE_PATH, SHARED_STATE_PATH).
+- Restarts the workers one at a time on SIGHUP without dropping in-flight turns:
+  a replacement takes over new requests while the old worker finishes its turns.
+
+Run it with `python supervisor.py --workers 4 --port 8000`.
+"""
+
+# --- Imports ---
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import time
+import zlib
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(PROJECT_DIR)
+
+from utils.shared_store import DEFAULT_SHARED_STATE_PATH
+from utils.telemetry import DEFAULT_TELEMETRY_PATH
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+# Imported once by the fork server; every worker forked from it starts with them loaded.
+# The agent modules are left out: importing them opens SQLite files, which must not cross a fork.
+WORKER_PRELOAD = [
+    "google.adk.agents",
+    "google.adk.runners",
+    "google.genai",
+    "fastapi",
+    "uvicorn",
+    "httpx",
+    "bs4",
+    "numpy",
+    "opentelemetry.sdk.trace",
+]
+DEFAULT_SOCKET_DIR = os.path.join(PROJECT_DIR, ".cache", "workers")
+# Longest a retiring worker may take to finish its in-flight turns (above the turn deadline).
+DEFAULT_GRACEFUL_TIMEOUT = 60.0
+DEFAULT_START_TIMEOUT = 60.0
+# A slot whose replacement fails to start is retried after 2, 4, 8... seconds, up to this.
+MAX_RESPAWN_BACKOFF = 60.0
+
+# Hop-by-hop headers are not forwarded.
+HOP_HEADERS = frozenset({"connection", "keep-alive", "transfer-encoding", "upgrade", "host", "content-length"})
+
+
+# --- Worker Process ---
+def run_worker(index: int, generation: int, socket_path: str, graceful_timeout: float):
+    """
+    Entry point of a worker process: serves server.py on a Unix socket.
+
+    Each worker writes its own telemetry file. SIGTERM stops it gracefully: it
+    stops accepting connections and finishes the turns in flight first.
+
+    Args:
+        index (int): Worker slot.
+        generation (int): Incremented on every restart of the slot.
+        socket_path (str): Unix socket to listen on.
+        graceful_timeout (float): Longest time in-flight turns get on shutdown.
+    """
+    os.environ["WORKER_INDEX"] = str(index)
+    telemetry_path = os.getenv("TELEMETRY_PATH", DEFAULT_TELEMETRY_PATH)
+    if telemetry_path:
+        stem, ext = os.path.splitext(telemetry_path)
+        os.environ["TELEMETRY_PATH"] = f"{stem}-w{index}{ext}"
+
+    import uvicorn
+
+    import server
+
+    uvicorn.run(
+        server.create_app(),
+        uds=socket_path,
+        log_level=os.getenv("WORKER_LOG_LEVEL", "warning"),
+        timeout_graceful_shutdown=graceful_timeout,
+    )
+
+
+@dataclass(eq=False)
+class Worker:
+    """A running worker process and the client the router reaches it with."""
+    index: int
+    generation: int
+    socket_path: str
+    process: Any
+    client: httpx.AsyncClient
+    in_flight: int = 0
+    retiring: bool = False
+
+
+@dataclass(eq=False)
+class _SessionTurns:
+    worker: Worker
+    count: int = 0
+    idle: asyncio.Event = field(default_factory=asyncio.Event)
+
+
+# --- Supervisor ---
+class Supervisor:
+    """
+    Starts, routes to, restarts and stops the worker processes.
+
+    A session is routed to worker crc32("<user_id>/<session_id>") % N. While a
+    worker slot is being replaced, a session whose turn still runs on the old
+    worker waits for it before its next turn goes to the new one, so a session
+    never runs two turns at once.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        socket_dir: str = DEFAULT_SOCKET_DIR,
+        graceful_timeout: float = DEFAULT_GRACEFUL_TIMEOUT,
+        start_timeout: float = DEFAULT_START_TIMEOUT,
+    ):
+        """
+        Args:
+            workers (int): Number of worker processes.
+            socket_dir (str): Directory of the workers' Unix sockets.
+            graceful_timeout (float): Longest time a stopping worker gets for its turns.
+            start_timeout (float): Longest time a new worker gets to become ready.
+        """
+        self.size = workers
+        self.socket_dir = socket_dir
+        self.graceful_timeout = graceful_timeout
+        self.start_timeout = start_timeout
+        self.workers: List[Worker] = []
+        self._sessions: Dict[Tuple[str, str], _SessionTurns] = {}
+        self._context = multiprocessing.get_context("forkserver")
+        self._context.set_forkserver_preload(WORKER_PRELOAD)
+        self._restarting: Optional[asyncio.Task] = None
+        self._monitor: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.restarts = 0
+        self.respawns = 0
+        self.started_at = time.time()
+
+    # --- Lifecycle ---
+    async def _spawn(self, index: int, generation: int) -> Worker:
+        os.makedirs(self.socket_dir, exist_ok=True)
+        socket_path = os.path.join(self.socket_dir, f"worker-{index}-{generation}.sock")
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        process = self._context.Process(
+            target=run_worker,
+            args=(index, generation, socket_path, self.graceful_timeout),
+            name=f"worker-{index}",
+            daemon=False,
+        )
+        process.start()
+        client = httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(uds=socket_path),
+            base_url="http://worker",
+            timeout=httpx.Timeout(None, connect=5.0),
+        )
+        worker = Worker(index, generation, socket_path, process, client)
+        deadline = time.monotonic() + self.start_timeout
+        while time.monotonic() < deadline:
+            if not process.is_alive():
+                break
+            try:
+                if (await client.get("/readyz")).status_code == 200:
+                    logger.info("Worker %d ready (pid %d, generation %d).", index, process.pid, generation)
+                    return worker
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+        await self._stop_worker(worker)
+        raise RuntimeError(f"Worker {index} did not become ready")
+
+    async def _stop_worker(self, worker: Worker):
+        """Stops a worker gracefully (SIGTERM), killing it if it outlives graceful_timeout."""
+        worker.retiring = True
+        if worker.process.is_alive():
+            worker.process.terminate()
+        await asyncio.to_thread(worker.process.join, self.graceful_timeout + 5)
+        if worker.process.is_alive():
+            logger.warning("Worker %d did not stop in time; killing it.", worker.index)
+            worker.process.kill()
+            await asyncio.to_thread(worker.process.join)
+        # Responses still streaming from the worker hold its client until they end.
+        while worker.in_flight:
+            await asyncio.sleep(0.1)
+        await worker.client.aclose()
+        if os.path.exists(worker.socket_path):
+            os.unlink(worker.socket_path)
+
+    async def start(self):
+        """Starts every worker and the monitor that replaces crashed ones."""
+        self.workers = list(await asyncio.gather(*(self._spawn(index, 0) for index in range(self.size))))
+        self._monitor = asyncio.get_running_loop().create_task(self._watch())
+
+    async def restart(self):
+        """Replaces the workers one at a time; in-flight turns finish on the old ones."""
+        for index in range(self.size):
+            old = self.workers[index]
+            self.workers[index] = await self._spawn(index, old.generation + 1)
+            await self._stop_worker(old)
+        self.restarts += 1
+        logger.info("Restarted %d workers.", self.size)
+
+    def request_restart(self):
+        """Starts a rolling restart unless one is already running (e.g. on SIGHUP)."""
+        if self._restarting is None or self._restarting.done():
+            self._restarting = asyncio.get_running_loop().create_task(self.restart())
+
+    async def _watch(self):
+        # Slots whose replacement failed to start: index -> (backoff, monotonic time of the next try).
+        retries: Dict[int, Tuple[float, float]] = {}
+        while not self._stopping:
+            await asyncio.sleep(1.0)
+            for index, worker in enumerate(self.workers):
+                if worker.retiring or worker.process.is_alive() or self._stopping:
+                    continue
+                backoff, retry_at = retries.get(index, (0.0, 0.0))
+                if time.monotonic() < retry_at:
+                    continue
+                if not backoff:
+                    logger.warning("Worker %d exited with code %s; starting a new one.", index, worker.process.exitcode)
+                try:
+                    replacement = await self._spawn(index, worker.generation + 1)
+                except RuntimeError as e:
+                    # The dead worker keeps the slot (not retiring), so it is tried again.
+                    backoff = min(max(backoff * 2, 2.0), MAX_RESPAWN_BACKOFF)
+                    retries[index] = (backoff, time.monotonic() + backoff)
+                    logger.error("%s; retrying in %.0fs.", e, backoff)
+                    continue
+                retries.pop(index, None)
+                if self.workers[index] is worker:
+                    self.workers[index] = replacement
+                    self.respawns += 1
+                    await self._stop_worker(worker)
+                else:
+                    # A rolling restart replaced the slot meanwhile.
+                    await self._stop_worker(replacement)
+
+    async def stop(self):
+        """Stops every worker gracefully."""
+        self._stopping = True
+        for task in (self._monitor, self._restarting):
+            if task is not None:
+                task.cancel()
+        await asyncio.gather(*(self._stop_worker(worker) for worker in self.workers), return_exceptions=True)
+
+    # --- Routing ---
+    def route(self, user_id: str, session_id: str) -> Worker:
+        """Returns the worker slot that owns a session."""
+        return self.workers[zlib.crc32(f"{user_id}/{session_id}".encode("utf-8")) % self.size]
+
+    async def begin_turn(self, user_id: str, session_id: str) -> Worker:
+        """
+        Picks the session's worker and counts the turn as in flight; end_turn must follow.
+
+        Waits while the session's previous turn still runs on a worker that is being replaced.
+        """
+        key = (user_id, session_id)
+        while True:
+            worker = self.route(user_id, session_id)
+            turns = self._sessions.get(key)
+            if turns is None or turns.worker is worker:
+                break
+            await turns.idle.wait()
+        turns = self._sessions.setdefault(key, _SessionTurns(worker))
+        turns.count += 1
+        worker.in_flight += 1
+        return worker
+
+    def end_turn(self, user_id: str, session_id: str, worker: Worker):
+        """Ends a turn started with begin_turn."""
+        key = (user_id, session_id)
+        worker.in_flight -= 1
+        turns = self._sessions[key]
+        turns.count -= 1
+        if not turns.count:
+            del self._sessions[key]
+            turns.idle.set()
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns the workers with their pid, generation and in-flight requests, and restart counters."""
+        return {
+            "workers": [
+                {"index": w.index, "pid": w.process.pid, "generation": w.generation, "in_flight": w.in_flight, "alive": w.process.is_alive()}
+                for w in self.workers
+            ],
+            "sessions_in_flight": len(self._sessions),
+            "restarts": self.restarts,
+            "respawns": self.respawns,
+            "uptime_s": round(time.time() - self.started_at, 1),
+        }
+
+
+# --- Router ---
+class _ForwardedResponse(StreamingResponse):
+    """Streams a worker's response; `on_close` runs however it ends, client disconnects included."""
+
+    def __init__(self, *args: Any, on_close: Callable[[], Awaitable[None]], **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.on_close()
+
+
+def create_router(supervisor: Supervisor) -> Starlette:
+    """
+    Builds the ASGI app of the supervisor process: forwards turns to the owning
+    worker (streaming the response through) and aggregates health and metrics.
+
+    Args:
+        supervisor (Supervisor): The supervisor; started and stopped with the app.
+
+    Returns:
+        Starlette: The router app.
+    """
+
+    async def forward(request: Request):
+        user_id, session_id = request.path_params["user_id"], request.path_params["session_id"]
+        # Read before the turn is counted: a client that disconnects here holds no worker.
+        body = await request.body()
+        worker = await supervisor.begin_turn(user_id, session_id)
+        try:
+            forwarded = worker.client.build_request(
+                request.method,
+                request.url.path,
+                params=request.query_params,
+                headers=[(k, v) for k, v in request.headers.items() if k.lower() not in HOP_HEADERS],
+                content=body,
+            )
+            response = await worker.client.send(forwarded, stream=True)
+        except httpx.TransportError:
+            supervisor.end_turn(user_id, session_id, worker)
+            return JSONResponse({"error": "Worker unavailable"}, status_code=503, headers={"Retry-After": "1"})
+        except BaseException:
+            supervisor.end_turn(user_id, session_id, worker)
+            raise
+
+        async def finish():
+            try:
+                await response.aclose()
+            finally:
+                supervisor.end_turn(user_id, session_id, worker)
+
+        return _ForwardedResponse(
+            response.aiter_raw(),
+            status_code=response.status_code,
+            headers={k: v for k, v in response.headers.items() if k.lower() not in HOP_HEADERS},
+            on_close=finish,
+        )
+
+    async def gather(path: str) -> List[Optional[httpx.Response]]:
+        async def one(worker: Worker) -> Optional[httpx.Response]:
+            try:
+                return await worker.client.get(path, timeout=5.0)
+            except httpx.TransportError:
+                return None
+        return await asyncio.gather(*(one(worker) for worker in supervisor.workers))
+
+    async def healthz(request: Request):
+        alive = sum(1 for worker in supervisor.workers if worker.process.is_alive())
+        return JSONResponse({"status": "ok" if alive else "down", "workers_alive": alive}, status_code=200 if alive else 503)
+
+    async def readyz(request: Request):
+        # Ready while any worker can take a turn; sessions of a saturated worker still get 429s.
+        ready = [r is not None and r.status_code == 200 for r in await gather("/readyz")]
+        return JSONResponse({"status": "ready" if any(ready) else "saturated", "workers_ready": sum(ready)}, status_code=200 if any(ready) else 503)
+
+    async def metrics(request: Request):
+        responses = await gather("/metrics")
+        return JSONResponse({
+            "supervisor": supervisor.stats(),
+            "workers": [r.json() if r is not None and r.status_code == 200 else None for r in responses],
+        })
+
+    @asynccontextmanager
+    async def lifespan(app: Starlette):
+        await supervisor.start()
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGHUP, supervisor.request_restart)
+        try:
+            yield
+        finally:
+            loop.remove_signal_handler(signal.SIGHUP)
+            await supervisor.stop()
+
+    return Starlette(
+        routes=[
+            Route("/users/{user_id}/sessions/{session_id}/{rest:path}", forward, methods=["GET", "POST", "PUT", "PATCH", "DELETE"]),
+            Route("/healthz", healthz),
+            Route("/readyz", readyz),
+            Route("/metrics", metrics),
+        ],
+        lifespan=lifespan,
+    )
+
+
+# --- Entry Point ---
+def main():
+    """Runs the supervisor and its router with uvicorn."""
+    parser = argparse.ArgumentParser(description="Serve the Multi-Agent System with pre-forked worker processes.")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("SERVER_WORKERS", os.cpu_count() or 1)))
+    parser.add_argument("--host", default=os.getenv("SERVER_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("SERVER_PORT", "8000")))
+    parser.add_argument("--graceful-timeout", type=float, default=DEFAULT_GRACEFUL_TIMEOUT)
+    args = parser.parse_args()
+    # Worker lifecycle messages are shown unless LOG_LEVEL asks for less.
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
+    # The router's readiness polls would log a line every 0.2s while a worker starts.
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    # Workers inherit this environment: share proxy health and rate-limit buckets.
+    os.environ.setdefault("SHARED_STATE_PATH", DEFAULT_SHARED_STATE_PATH)
+    for name in ("RESPONSE_CACHE_PATH", "SESSION_STORE_PATH", "SHARED_STATE_PATH"):
+        if os.getenv(name) == "":
+            logger.warning("%s is empty: that state stays private to each worker.", name)
+
+    import uvicorn
+
+    supervisor = Supervisor(args.workers, graceful_timeout=args.graceful_timeout)
+    uvicorn.run(create_router(supervisor), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+from .gazetteer import Gazetteer, Place, get_gazetteer, normalize_place_name
+from .http_client import AsyncHttpClient, UpstreamConfig, get_http_client
+from .proxy_pool import ProxyPool, ProxyStats
+from .rate_limiter import BACKGROUND, INTERACTIVE, RateBudget, RateLimitExceeded, RequestScheduler, request_priority
+from .response_cache import CachePolicy, ResponseCache, get_response_cache, make_cache_key
+from .single_flight import SingleFlight
+from .deadline import DeadlineExceeded, bound_timeout, create_task_without_deadline, current_deadline, remaining, wait_within_deadline
+from .circuit_breaker import CircuitBreaker, CircuitOpenError, circuit_stats, get_circuit_breaker
+from .prefetch import Prefetcher, get_prefetcher
+from .session_store import SqliteSessionService, get_session_service
+from .telemetry import TurnRecorder, add_event, annotate, format_summary, setup_telemetry, span, turn_summaries
+from .admission import AdmissionController, AdmissionRejected, SessionLocks
+from .shared_store import SharedStore, get_shared_store
+from .startup import mark, startup_stats
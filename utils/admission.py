@@ -0,0 +1,211 @@
+"""
+admission.py
+
+Admission control for the serving entry point.
+- Bounds the number of turns in flight and queues a limited number of others.
+- Rejects work it cannot start in time (backpressure), with a Retry-After estimate.
+- Serializes the turns of one session while turns of other sessions run concurrently.
+"""
+
+# --- Imports ---
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Hashable, Optional
+
+
+class AdmissionRejected(Exception):
+    """Raised when a turn cannot be admitted; `retry_after` is the suggested wait in seconds."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"{reason}; retry in {retry_after:.0f}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+# --- Admission Controller ---
+class AdmissionController:
+    """
+    A counting semaphore with a bounded FIFO queue and a bounded wait.
+
+    Turns start immediately while fewer than `max_concurrent` are running. Beyond
+    that up to `max_queue` turns wait, each for at most `max_wait` seconds; the
+    rest are rejected at once, so an overloaded server answers quickly instead of
+    piling up work it cannot finish before the turn deadline.
+    """
+
+    def __init__(self, max_concurrent: int = 32, max_queue: int = 64, max_wait: float = 5.0):
+        """
+        Args:
+            max_concurrent (int): Turns allowed to run at the same time.
+            max_queue (int): Turns allowed to wait for a slot.
+            max_wait (float): Longest wait for a slot, in seconds.
+        """
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.running = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._mean_hold = 1.0  # Smoothed seconds a slot is held, for Retry-After.
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.total_wait = 0.0
+        self.max_observed_wait = 0.0
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for future in self._waiters if not future.done())
+
+    @property
+    def saturated(self) -> bool:
+        """True when a new turn would be rejected without waiting."""
+        return self.running >= self.max_concurrent and self.queued >= self.max_queue
+
+    def retry_after(self) -> float:
+        """Estimates when a slot frees up for a new turn, in seconds (at least 1)."""
+        backlog = self.queued + 1
+        return max(1.0, math.ceil(self._mean_hold * backlog / max(1, self.max_concurrent)))
+
+    async def acquire(self):
+        """
+        Waits for a slot.
+
+        Raises:
+            AdmissionRejected: If the queue is full or no slot frees up within max_wait.
+        """
+        if self.running < self.max_concurrent and not self.queued:
+            self.running += 1
+            self.admitted += 1
+            return
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise AdmissionRejected("Server is at capacity", self.retry_after())
+
+        started = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.max_wait)
+        except asyncio.TimeoutError:
+            if not future.done():
+                future.cancel()
+                self.timed_out += 1
+                raise AdmissionRejected("Timed out waiting for capacity", self.retry_after()) from None
+            # The slot was handed over just as the wait ran out: keep it.
+        except BaseException:
+            # Cancelled while queued: give back a slot that was already handed over.
+            if future.done() and not future.cancelled():
+                self.release()
+            else:
+                future.cancel()
+            raise
+        finally:
+            if future in self._waiters and future.done():
+                self._waiters.remove(future)
+        waited = time.monotonic() - started
+        self.admitted += 1
+        self.total_wait += waited
+        self.max_observed_wait = max(self.max_observed_wait, waited)
+
+    def release(self, held: Optional[float] = None):
+        """
+        Frees a slot, handing it straight to the longest-waiting turn if there is one.
+
+        Args:
+            held (Optional[float]): Seconds the slot was held, to refine the Retry-After estimate.
+        """
+        if held is not None:
+            self._mean_hold = 0.8 * self._mean_hold + 0.2 * held
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)  # The slot passes on; `running` is unchanged.
+                return
+        self.running -= 1
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Holds a slot for the duration of the block; see acquire()."""
+        await self.acquire()
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+    def stats(self) -> Dict[str, float]:
+        """Returns the load, the limits and the admission and wait statistics."""
+        waited = self.admitted or 1
+        return {
+            "running": self.running,
+            "queued": self.queued,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "mean_wait": round(self.total_wait / waited, 3),
+            "max_wait": round(self.max_observed_wait, 3),
+            "mean_hold": round(self._mean_hold, 3),
+        }
+
+
+# --- Per-Session Serialization ---
+class SessionLocks:
+    """
+    One lock per session, so a session runs a single turn at a time.
+
+    Each session may have at most `max_waiting` turns queued behind the running
+    one; more are rejected (a client sending several messages at once gets a 429
+    rather than an ever-growing queue). Locks are dropped once nobody holds or
+    waits for them, so idle sessions cost nothing.
+    """
+
+    def __init__(self, max_waiting: int = 1):
+        """
+        Args:
+            max_waiting (int): Turns of one session allowed to wait behind the running one.
+        """
+        self.max_waiting = max_waiting
+        self._locks: Dict[Hashable, asyncio.Lock] = {}
+        self._users: Dict[Hashable, int] = {}
+        self.rejected = 0
+
+    @asynccontextmanager
+    async def hold(self, key: Hashable) -> AsyncIterator[None]:
+        """
+        Holds the session's lock for the duration of the block.
+
+        Args:
+            key (Hashable): The session, e.g. (user_id, session_id).
+
+        Raises:
+            AdmissionRejected: If too many turns of the session are already waiting.
+        """
+        users = self._users.get(key, 0)
+        if users > self.max_waiting:
+            self.rejected += 1
+            raise AdmissionRejected("A turn of this session is already in progress", 1.0)
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        self._users[key] = users + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._users[key] -= 1
+            if not self._users[key]:
+                del self._users[key]
+                del self._locks[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns the number of sessions with a turn in progress, waiting turns and rejections."""
+        return {
+            "active_sessions": len(self._locks),
+            "waiting": sum(max(0, users - 1) for users in self._users.values()),
+            "rejected": self.rejected,
+        }
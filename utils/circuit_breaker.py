@@ -0,0 +1,129 @@
+"""
+circuit_breaker.py
+
+Per-upstream circuit breakers for the shared HTTP client.
+- Opens after consecutive failures, so calls to a backend that is down fail immediately.
+- Lets a single probe through after a cool-down and closes again when it succeeds.
+"""
+
+# --- Imports ---
+import time
+from typing import Dict, Optional
+
+import httpx
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(httpx.TransportError):
+    """Raised instead of sending a request while the upstream's circuit is open."""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"Circuit for '{name}' is open; retrying in {retry_in:.0f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    Tracks the health of one upstream.
+
+    closed: requests flow; `failure_threshold` consecutive failures open the circuit.
+    open: requests fail fast with CircuitOpenError for `reset_timeout` seconds.
+    half_open: one probe request is let through; success closes the circuit,
+    failure opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        Args:
+            name (str): Upstream name, used in errors and stats.
+            failure_threshold (int): Consecutive failures that open the circuit.
+            reset_timeout (float): Seconds the circuit stays open before a probe.
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self._stats = {"successes": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return CLOSED
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return OPEN
+        return HALF_OPEN
+
+    def before_call(self):
+        """
+        Checks whether a request may be sent.
+
+        Raises:
+            CircuitOpenError: While the circuit is open, or a half-open probe is already running.
+        """
+        state = self.state
+        if state == CLOSED:
+            return
+        if state == HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return
+        self._stats["rejected"] += 1
+        retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+        raise CircuitOpenError(self.name, retry_in)
+
+    def record_success(self):
+        """Records a healthy answer; closes the circuit."""
+        self._stats["successes"] += 1
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        """Records a transport error or server error; may open the circuit."""
+        self._stats["failures"] += 1
+        self.consecutive_failures += 1
+        if self._probe_in_flight or self.consecutive_failures >= self.failure_threshold:
+            if self.opened_at is None or self._probe_in_flight:
+                self._stats["opened"] += 1
+            self.opened_at = time.monotonic()
+        self._probe_in_flight = False
+
+    def release(self):
+        """Ends a call that neither succeeded nor failed (e.g. cancelled) without changing the state."""
+        self._probe_in_flight = False
+
+    def stats(self) -> Dict[str, object]:
+        """Returns the state, the consecutive failure count and outcome counters."""
+        return dict(self._stats, state=self.state, consecutive_failures=self.consecutive_failures)
+
+
+# Breakers are shared by every client in the process: an upstream is down for all of them.
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_circuit_breaker(name: str, failure_threshold: int = 5, reset_timeout: float = 30.0) -> CircuitBreaker:
+    """
+    Returns the process-wide breaker for an upstream, creating it on first use.
+
+    Args:
+        name (str): Upstream name.
+        failure_threshold (int): Used when the breaker is created.
+        reset_timeout (float): Used when the breaker is created.
+
+    Returns:
+        CircuitBreaker: The shared breaker.
+    """
+    breaker = _breakers.get(name)
+    if breaker is None:
+        breaker = _breakers[name] = CircuitBreaker(name, failure_threshold, reset_timeout)
+    return breaker
+
+
+def circuit_stats() -> Dict[str, Dict[str, object]]:
+    """Returns CircuitBreaker.stats() for every upstream seen so far."""
+    return {name: breaker.stats() for name, breaker in _breakers.items()}
@@ -0,0 +1,106 @@
+"""
+deadline.py
+
+Invocation-wide deadline shared by every tool and upstream call of a user turn.
+- Carries the absolute deadline in a context variable, so tasks started for a step inherit it.
+- Bounds per-request timeouts by the time left and fails fast once the budget is spent.
+- Starts shared and background work without the starting caller's deadline; each
+  waiter applies its own deadline to its wait instead.
+"""
+
+# --- Imports ---
+import asyncio
+import contextvars
+import time
+from contextvars import ContextVar
+from typing import Any, Coroutine, Optional
+
+import httpx
+
+# Absolute time.monotonic() deadline of the current step, or None for no limit.
+current_deadline: ContextVar[Optional[float]] = ContextVar("current_deadline", default=None)
+
+
+class DeadlineExceeded(httpx.TimeoutException):
+    """Raised when a request is attempted after the invocation deadline has passed."""
+
+    def __init__(self, message: str = "Invocation deadline exceeded"):
+        super().__init__(message)
+
+
+def remaining() -> Optional[float]:
+    """
+    Returns the seconds left until the current deadline.
+
+    Returns:
+        Optional[float]: Seconds left (0.0 once passed), or None when no deadline is set.
+    """
+    deadline = current_deadline.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+def bound_timeout(timeout: Optional[float]) -> Optional[float]:
+    """
+    Shortens a timeout so it ends no later than the current deadline.
+
+    Args:
+        timeout (Optional[float]): The timeout that would otherwise apply, in seconds.
+
+    Returns:
+        Optional[float]: min(timeout, remaining()); None if neither limit is set.
+
+    Raises:
+        DeadlineExceeded: If the deadline has already passed.
+    """
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise DeadlineExceeded()
+    return left if timeout is None else min(timeout, left)
+
+
+def create_task_without_deadline(coro: Coroutine[Any, Any, Any]) -> asyncio.Task:
+    """
+    Starts a task in a copy of the current context with no deadline.
+
+    For work shared by several callers or outliving its caller (coalesced requests,
+    background refreshes): it must not be cut short by whichever caller started it.
+
+    Args:
+        coro (Coroutine): The work to run.
+
+    Returns:
+        asyncio.Task: The task, on the running loop.
+    """
+    context = contextvars.copy_context()
+    context.run(current_deadline.set, None)
+    return asyncio.get_running_loop().create_task(coro, context=context)
+
+
+async def wait_within_deadline(task: asyncio.Future) -> Any:
+    """
+    Waits for a shared task, shielded, until the current deadline at most.
+
+    Args:
+        task (asyncio.Future): The shared task; leaving early does not cancel it.
+
+    Returns:
+        Any: The task's result.
+
+    Raises:
+        DeadlineExceeded: If the deadline passes before the task finishes.
+    """
+    left = remaining()
+    if left is None:
+        return await asyncio.shield(task)
+    if left <= 0:
+        raise DeadlineExceeded()
+    try:
+        return await asyncio.wait_for(asyncio.shield(task), left)
+    except TimeoutError:
+        if task.done():
+            raise  # The task's own error, not the deadline.
+        raise DeadlineExceeded() from None
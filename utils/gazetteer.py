@@ -0,0 +1,340 @@
+"""
+gazetteer.py
+
+Offline place-name index for resolving locations to coordinates.
+- Loads a bundled list of cities, spaceports and launch sites (utils/data/gazetteer.tsv) on first use.
+- Indexes normalized names and aliases for exact lookups, with fuzzy matching as a fallback.
+- Keeps a coarse latitude/longitude grid for nearest-place (reverse) lookups.
+"""
+
+# --- Imports ---
+import difflib
+import math
+import os
+import re
+import sys
+import threading
+import unicodedata
+from array import array
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Union
+
+# --- Constants ---
+DEFAULT_GAZETTEER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "gazetteer.tsv")
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.2
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize_place_name(name: str) -> str:
+    """
+    Normalizes a place name for indexing: accents stripped, lower-cased, punctuation removed.
+
+    Args:
+        name (str): Raw place name, e.g. "Kraków" or "Cape Canaveral SFS, FL".
+
+    Returns:
+        str: Words joined by single spaces, e.g. "krakow".
+    """
+    decomposed = unicodedata.normalize("NFKD", name or "")
+    ascii_name = "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+    return " ".join(_TOKEN_RE.findall(ascii_name))
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points, in kilometres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+@dataclass(frozen=True)
+class Place:
+    """
+    A gazetteer entry.
+
+    Attributes:
+        name (str): Display name.
+        kind (str): "city" or "spaceport".
+        country (str): ISO 3166-1 alpha-2 country code.
+        latitude (float): Latitude in decimal degrees.
+        longitude (float): Longitude in decimal degrees.
+    """
+    name: str
+    kind: str
+    country: str
+    latitude: float
+    longitude: float
+
+    def to_dict(self) -> Dict[str, Union[str, float]]:
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "country": self.country,
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+        }
+
+
+# --- Gazetteer ---
+class Gazetteer:
+    """
+    In-memory place index, loaded lazily from a tab-separated file.
+
+    Rows are stored column-wise: names and (interned) kinds/countries in lists and
+    coordinates in a flat array of doubles, so the index stays small. Place objects
+    are only built for the rows a query returns.
+    """
+
+    def __init__(self, path: str = DEFAULT_GAZETTEER_PATH, cell_degrees: float = 2.0, max_rings: int = 6):
+        """
+        Args:
+            path (str): Gazetteer file: name, kind, country, latitude, longitude and
+                '|'-separated aliases per line; lines starting with '#' are ignored.
+            cell_degrees (float): Size of the reverse-lookup grid cells, in degrees.
+            max_rings (int): Grid rings searched before a reverse lookup scans every place.
+        """
+        self.path = path
+        self.cell_degrees = cell_degrees
+        self.max_rings = max_rings
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._names: List[str] = []
+        self._kinds: List[str] = []
+        self._countries: List[str] = []
+        self._coords = array("d")
+        self._index: Dict[str, Union[int, Tuple[int, ...]]] = {}
+        self._grid: Dict[Tuple[int, int], array] = {}
+        self._max_words = 1
+
+    # --- Loading ---
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if not self._loaded:
+                self._load()
+                self._loaded = True
+
+    def load(self) -> "Gazetteer":
+        """Reads the file now instead of on the first query (e.g. to warm up a worker); returns self."""
+        self._ensure_loaded()
+        return self
+
+    def _load(self):
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip() or line.startswith("#"):
+                    continue
+                fields = line.rstrip("\n").split("\t")
+                if len(fields) < 5:
+                    continue
+                name, kind, country, lat, lon = fields[:5]
+                aliases = fields[5].split("|") if len(fields) > 5 and fields[5] else []
+                row = len(self._names)
+                self._names.append(name)
+                # Kinds and country codes repeat on every row; share one string each.
+                self._kinds.append(sys.intern(kind))
+                self._countries.append(sys.intern(country))
+                self._coords.extend((float(lat), float(lon)))
+                for alias in [name] + aliases:
+                    self._add_key(normalize_place_name(alias), row)
+                self._grid.setdefault(self._cell(float(lat), float(lon)), array("I")).append(row)
+
+    def _add_key(self, key: str, row: int):
+        if not key:
+            return
+        existing = self._index.get(key)
+        if existing is None:
+            self._index[key] = row
+        elif isinstance(existing, int):
+            if existing != row:
+                self._index[key] = (existing, row)
+        elif row not in existing:
+            self._index[key] = existing + (row,)
+        self._max_words = max(self._max_words, key.count(" ") + 1)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self.cell_degrees)), int(math.floor(lon / self.cell_degrees))
+
+    @staticmethod
+    def _ring_offsets(ring: int) -> List[Tuple[int, int]]:
+        if ring == 0:
+            return [(0, 0)]
+        offsets = [(d_lat, d_lon) for d_lat in (-ring, ring) for d_lon in range(-ring, ring + 1)]
+        offsets += [(d_lat, d_lon) for d_lon in (-ring, ring) for d_lat in range(-ring + 1, ring)]
+        return offsets
+
+    def __len__(self) -> int:
+        self._ensure_loaded()
+        return len(self._names)
+
+    # --- Rows ---
+    def _place(self, row: int) -> Place:
+        return Place(
+            name=self._names[row],
+            kind=self._kinds[row],
+            country=self._countries[row],
+            latitude=self._coords[2 * row],
+            longitude=self._coords[2 * row + 1],
+        )
+
+    def _rows(self, key: str, kind: Optional[str] = None) -> List[int]:
+        rows = self._index.get(key)
+        if rows is None:
+            return []
+        rows = [rows] if isinstance(rows, int) else list(rows)
+        return [r for r in rows if kind is None or self._kinds[r] == kind]
+
+    # --- Name Lookups ---
+    def lookup(self, name: str, kind: Optional[str] = None) -> Optional[Place]:
+        """
+        Finds a place by exact (normalized) name or alias.
+
+        A trailing qualifier after a comma ("Paris, FR", "Vandenberg SFB, CA, USA")
+        is used to pick among same-named places by country, and is dropped if the
+        full string is not a known name.
+
+        Args:
+            name (str): Place name.
+            kind (Optional[str]): Restrict to "city" or "spaceport".
+
+        Returns:
+            Optional[Place]: The first matching place, or None.
+        """
+        self._ensure_loaded()
+        rows = self._rows(normalize_place_name(name), kind)
+        if rows:
+            return self._place(rows[0])
+        head, _, qualifier = (name or "").partition(",")
+        rows = self._rows(normalize_place_name(head), kind)
+        if not rows:
+            return None
+        qualifiers = set(normalize_place_name(qualifier).split())
+        preferred = [r for r in rows if self._countries[r].lower() in qualifiers]
+        return self._place((preferred or rows)[0])
+
+    def search(self, name: str, limit: int = 5, cutoff: float = 0.75, kind: Optional[str] = None) -> List[Tuple[Place, float]]:
+        """
+        Finds places by name, tolerating typos and partial names.
+
+        Args:
+            name (str): Place name as typed by the user.
+            limit (int): Maximum number of results.
+            cutoff (float): Minimum similarity (0-1) for fuzzy matches.
+            kind (Optional[str]): Restrict to "city" or "spaceport".
+
+        Returns:
+            List[Tuple[Place, float]]: Places with their similarity, best first;
+            an exact name or alias match scores 1.0.
+        """
+        self._ensure_loaded()
+        exact = self.lookup(name, kind)
+        results: List[Tuple[Place, float]] = [(exact, 1.0)] if exact else []
+        key = normalize_place_name(name)
+        if not key:
+            return results
+        seen = {exact.name} if exact else set()
+        for match in difflib.get_close_matches(key, self._index.keys(), n=limit * 2, cutoff=cutoff):
+            score = round(difflib.SequenceMatcher(None, key, match).ratio(), 3)
+            for row in self._rows(match, kind):
+                if self._names[row] not in seen:
+                    seen.add(self._names[row])
+                    results.append((self._place(row), score))
+        results.sort(key=lambda item: item[1], reverse=True)
+        return results[:limit]
+
+    def find_in_text(self, text: str, kind: Optional[str] = None) -> Optional[Place]:
+        """
+        Finds the first known place name mentioned in free text (exact matches only).
+
+        Longer names win over shorter ones at the same position, so "cape canaveral"
+        is preferred over a place called "cape".
+
+        Args:
+            text (str): Free text such as a user query.
+            kind (Optional[str]): Restrict to "city" or "spaceport".
+
+        Returns:
+            Optional[Place]: The mentioned place, or None.
+        """
+        self._ensure_loaded()
+        words = normalize_place_name(text).split()
+        for start in range(len(words)):
+            for size in range(min(self._max_words, len(words) - start), 0, -1):
+                rows = self._rows(" ".join(words[start:start + size]), kind)
+                if rows:
+                    return self._place(rows[0])
+        return None
+
+    # --- Reverse Lookups ---
+    def nearest(self, lat: float, lon: float, max_km: Optional[float] = None, kind: Optional[str] = None) -> Optional[Tuple[Place, float]]:
+        """
+        Finds the place closest to a coordinate.
+
+        Searches grid rings outwards from the coordinate's cell and stops once no
+        unvisited cell can hold a closer place; far from any place it falls back to
+        a full scan.
+
+        Args:
+            lat (float): Latitude in decimal degrees.
+            lon (float): Longitude in decimal degrees.
+            max_km (Optional[float]): Ignore places farther away than this.
+            kind (Optional[str]): Restrict to "city" or "spaceport".
+
+        Returns:
+            Optional[Tuple[Place, float]]: The nearest place and its distance in km, or None.
+        """
+        self._ensure_loaded()
+        lat_cell, lon_cell = self._cell(lat, lon)
+        lon_cells = int(math.ceil(360 / self.cell_degrees))
+        best_row, best_km = None, math.inf if max_km is None else float(max_km)
+
+        def visit(rows):
+            nonlocal best_row, best_km
+            for row in rows:
+                if kind is not None and self._kinds[row] != kind:
+                    continue
+                km = haversine_km(lat, lon, self._coords[2 * row], self._coords[2 * row + 1])
+                if km <= best_km:
+                    best_row, best_km = row, km
+
+        for ring in range(self.max_rings + 1):
+            if ring >= 2:
+                # Every cell in this ring is at least (ring - 1) cells away in latitude
+                # or longitude; longitude degrees shrink towards the poles.
+                band_lat = min(90.0, abs(lat) + (ring + 1) * self.cell_degrees)
+                bound_km = (ring - 1) * self.cell_degrees * KM_PER_DEGREE * math.cos(math.radians(band_lat))
+                if bound_km > best_km:
+                    break
+            for d_lat, d_lon in self._ring_offsets(ring):
+                wrapped_lon = (lon_cell + d_lon + lon_cells // 2) % lon_cells - lon_cells // 2
+                visit(self._grid.get((lat_cell + d_lat, wrapped_lon), ()))
+        else:
+            # Nothing conclusive nearby (open ocean, polar regions): check every row.
+            best_row, best_km = None, math.inf if max_km is None else float(max_km)
+            visit(range(len(self._names)))
+
+        if best_row is None:
+            return None
+        return self._place(best_row), round(best_km, 1)
+
+
+_gazetteer: Optional[Gazetteer] = None
+
+
+def get_gazetteer() -> Gazetteer:
+    """
+    Returns the process-wide Gazetteer. Its file is only read on the first query,
+    so importing this module does not slow down startup.
+
+    Returns:
+        Gazetteer: The shared gazetteer.
+    """
+    global _gazetteer
+    if _gazetteer is None:
+        _gazetteer = Gazetteer(path=os.getenv("GAZETTEER_PATH", DEFAULT_GAZETTEER_PATH))
+    return _gazetteer
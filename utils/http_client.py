@@ -0,0 +1,331 @@
+"""
+http_client.py
+
+Shared asynchronous HTTP layer for the sub-agent tools.
+- Keeps one keep-alive connection pool per upstream host (and per proxy).
+- Applies per-upstream timeouts and retries with exponential backoff.
+- Schedules requests through per-upstream rate budgets and honors Retry-After.
+- Respects the invocation deadline and fails fast while an upstream's circuit is open.
+- Never blocks the event loop, so concurrent sessions keep making progress.
+- Records a telemetry span per request with its upstream, status and retry count.
+- Can send an upstream's requests to another base URL (e.g. a local stand-in server).
+"""
+
+# --- Imports ---
+import asyncio
+import dataclasses
+import os
+import random
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+import httpx
+
+from .circuit_breaker import CircuitOpenError, get_circuit_breaker
+from .deadline import bound_timeout, remaining
+from .rate_limiter import RequestScheduler, parse_retry_after
+from .telemetry import add_event, span
+
+# --- Upstream Configuration ---
+@dataclass(frozen=True)
+class UpstreamConfig:
+    """
+    Connection and retry settings for one upstream service.
+
+    Attributes:
+        name (str): Short name of the upstream (e.g. "open-meteo").
+        timeout (float): Total read/write/pool timeout per attempt, in seconds.
+        connect_timeout (float): Timeout for establishing a connection, in seconds.
+        max_connections (int): Maximum concurrent connections in the pool.
+        max_keepalive_connections (int): Idle connections kept open for reuse.
+        keepalive_expiry (float): Seconds an idle connection is kept alive.
+        retries (int): Extra attempts after a transport error or retryable status.
+        backoff_base (float): First backoff delay, doubled on each retry.
+        backoff_max (float): Upper bound for a single backoff delay.
+        retry_statuses (Tuple[int, ...]): HTTP statuses that are retried.
+        max_retry_after (float): Longest Retry-After (429/503) that is waited out
+            before retrying; longer ones return the response immediately.
+        failure_threshold (int): Consecutive failures that open the upstream's circuit.
+        reset_timeout (float): Seconds an open circuit fails fast before probing again.
+        base_url (Optional[str]): Replaces the scheme, host and port of every request
+            URL (the path is appended to it), e.g. a local stand-in server.
+    """
+    name: str
+    timeout: float = 10.0
+    connect_timeout: float = 5.0
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    keepalive_expiry: float = 30.0
+    retries: int = 2
+    backoff_base: float = 0.5
+    backoff_max: float = 8.0
+    retry_statuses: Tuple[int, ...] = (500, 502, 503, 504)
+    max_retry_after: float = 30.0
+    failure_threshold: int = 5
+    reset_timeout: float = 30.0
+    base_url: Optional[str] = None
+
+
+UPSTREAMS: Dict[str, UpstreamConfig] = {
+    # Proxy rotation in launches_agent already moves on to another proxy on failure.
+    "spacedevs": UpstreamConfig(name="spacedevs", retries=0, max_connections=50),
+    "open-meteo": UpstreamConfig(name="open-meteo"),
+    "newsapi": UpstreamConfig(name="newsapi"),
+    "proxy-list": UpstreamConfig(name="proxy-list", retries=1),
+}
+
+UPSTREAM_HOSTS: Dict[str, str] = {
+    "ll.thespacedevs.com": "spacedevs",
+    "api.open-meteo.com": "open-meteo",
+    "newsapi.org": "newsapi",
+    "free-proxy-list.net": "proxy-list",
+}
+
+
+def base_url_from_env(upstream: str) -> Optional[str]:
+    """
+    Reads UPSTREAM_URL_<NAME> (e.g. UPSTREAM_URL_OPEN_METEO = http://127.0.0.1:8102).
+
+    Args:
+        upstream (str): Upstream name.
+
+    Returns:
+        Optional[str]: The base URL, or None if it is not overridden.
+    """
+    return os.getenv("UPSTREAM_URL_" + upstream.upper().replace("-", "_"), "").strip() or None
+
+
+def rebase_url(url: str, base_url: str) -> str:
+    """Moves a URL onto another base URL, keeping its path and query."""
+    base, parts = urlsplit(base_url), urlsplit(url)
+    return urlunsplit((base.scheme, base.netloc, base.path.rstrip("/") + parts.path, parts.query, parts.fragment))
+
+
+# --- Client ---
+class AsyncHttpClient:
+    """
+    Pooled async HTTP client shared by all tools running on one event loop.
+
+    Each (upstream, proxy) pair gets its own httpx.AsyncClient, so connections to a
+    host are reused across tool calls and sessions. Proxied pools are kept in a
+    bounded LRU because proxies come and go. Every attempt first waits for its
+    upstream's rate budget (see rate_limiter.py).
+    """
+
+    def __init__(
+        self,
+        upstreams: Optional[Dict[str, UpstreamConfig]] = None,
+        max_proxy_clients: int = 64,
+        scheduler: Optional[RequestScheduler] = None,
+    ):
+        self._upstreams = {
+            name: dataclasses.replace(config, base_url=base_url_from_env(name) or config.base_url)
+            for name, config in (upstreams or UPSTREAMS).items()
+        }
+        self._max_proxy_clients = max_proxy_clients
+        self.scheduler = scheduler or RequestScheduler()
+        self._clients: Dict[Tuple[str, Optional[str]], httpx.AsyncClient] = {}
+        self._proxy_clients: "OrderedDict[Tuple[str, Optional[str]], httpx.AsyncClient]" = OrderedDict()
+
+    def upstream_for(self, url: str, upstream: Optional[str] = None) -> UpstreamConfig:
+        """
+        Resolves the upstream settings for a request.
+
+        Args:
+            url (str): The request URL, used when no upstream name is given.
+            upstream (Optional[str]): Explicit upstream name.
+
+        Returns:
+            UpstreamConfig: The configured settings, or defaults named after the host.
+        """
+        host = urlsplit(url).hostname or ""
+        name = upstream or UPSTREAM_HOSTS.get(host, host)
+        return self._upstreams.get(name) or UpstreamConfig(name=name)
+
+    def _client_for(self, config: UpstreamConfig, proxy: Optional[str]) -> httpx.AsyncClient:
+        key = (config.name, proxy)
+        if proxy is None:
+            client = self._clients.get(key)
+            if client is None:
+                client = self._clients[key] = self._build_client(config, None)
+            return client
+
+        client = self._proxy_clients.get(key)
+        if client is not None:
+            self._proxy_clients.move_to_end(key)
+            return client
+        client = self._proxy_clients[key] = self._build_client(config, proxy)
+        while len(self._proxy_clients) > self._max_proxy_clients:
+            _, evicted = self._proxy_clients.popitem(last=False)
+            asyncio.ensure_future(evicted.aclose())
+        return client
+
+    @staticmethod
+    def _build_client(config: UpstreamConfig, proxy: Optional[str]) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            timeout=httpx.Timeout(config.timeout, connect=config.connect_timeout),
+            limits=httpx.Limits(
+                max_connections=config.max_connections,
+                max_keepalive_connections=config.max_keepalive_connections,
+                keepalive_expiry=config.keepalive_expiry,
+            ),
+            proxy=proxy,
+            follow_redirects=True,
+        )
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        *,
+        upstream: Optional[str] = None,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        proxy: Optional[str] = None,
+        timeout: Optional[float] = None,
+        retries: Optional[int] = None,
+        priority: Optional[int] = None,
+    ) -> httpx.Response:
+        """
+        Sends a request with the upstream's pool, rate budget, timeout and retry policy.
+
+        Transport errors and retryable statuses are retried with jittered
+        exponential backoff, as long as the invocation deadline leaves time for
+        it. A 429 (or 503) with Retry-After pauses the upstream's budget for that
+        long and is retried if the delay is short enough. Other statuses are
+        returned to the caller as-is.
+
+        Args:
+            method (str): HTTP method.
+            url (str): Target URL.
+            upstream (Optional[str]): Upstream name; derived from the host if omitted.
+            params (Optional[Dict[str, Any]]): Query parameters.
+            headers (Optional[Dict[str, str]]): Request headers.
+            proxy (Optional[str]): Proxy URL such as 'http://IP:PORT'.
+            timeout (Optional[float]): Overrides the upstream timeout for this call.
+            retries (Optional[int]): Overrides the upstream retry count for this call.
+            priority (Optional[int]): Scheduling priority (rate_limiter.INTERACTIVE or
+                BACKGROUND); defaults to the calling task's request_priority.
+
+        Returns:
+            httpx.Response: The final response.
+
+        Raises:
+            httpx.TransportError: If every attempt failed at the transport level.
+            RateLimitExceeded: If the upstream's budget would delay the request too long.
+            DeadlineExceeded: If the invocation deadline passed before an attempt.
+            CircuitOpenError: If the upstream's circuit is open.
+        """
+        config = self.upstream_for(url, upstream)
+        if config.base_url:
+            url = rebase_url(url, config.base_url)
+        client = self._client_for(config, proxy)
+        attempts = 1 + (config.retries if retries is None else retries)
+        configured_timeout = timeout or config.timeout
+        # Failures through a proxy say more about the proxy than the upstream,
+        # so only direct requests feed the upstream's circuit breaker.
+        breaker = None
+        if proxy is None:
+            breaker = get_circuit_breaker(config.name, config.failure_threshold, config.reset_timeout)
+
+        parts = urlsplit(url)
+        with span(
+            f"http {method}",
+            upstream=config.name,
+            **{"http.request.method": method, "server.address": parts.hostname, "url.path": parts.path, "http.proxied": proxy is not None},
+        ) as request_span:
+            response, error = None, None
+            for attempt in range(attempts):
+                is_last = attempt == attempts - 1
+                request_span.set_attribute("http.retries", attempt)
+                attempt_timeout = bound_timeout(configured_timeout)
+                await self.scheduler.acquire(config.name, proxy, priority, max_wait=remaining())
+                if breaker is not None:
+                    try:
+                        breaker.before_call()
+                    except CircuitOpenError:
+                        # Our own failed attempts opened the circuit: report the last of them.
+                        if response is not None:
+                            return response
+                        if error is not None:
+                            raise error
+                        raise
+                response, error = None, None
+                try:
+                    response = await client.request(
+                        method, url, params=params, headers=headers,
+                        timeout=httpx.Timeout(attempt_timeout, connect=min(attempt_timeout, config.connect_timeout)),
+                    )
+                except httpx.TransportError as e:
+                    error = e
+                    add_event("attempt_failed", error=type(e).__name__)
+                    # A timeout cut short by the invocation deadline is not the upstream's fault.
+                    if breaker is not None and attempt_timeout < configured_timeout and isinstance(e, httpx.TimeoutException):
+                        breaker.release()
+                    elif breaker is not None:
+                        breaker.record_failure()
+                    if is_last:
+                        raise
+                except BaseException:
+                    if breaker is not None:
+                        breaker.release()
+                    raise
+                else:
+                    request_span.set_attribute("http.response.status_code", response.status_code)
+                    if breaker is not None:
+                        if response.status_code >= 500:
+                            breaker.record_failure()
+                        else:
+                            breaker.record_success()
+                    retry_after = parse_retry_after(response) if response.status_code in (429, 503) else None
+                    if retry_after is not None:
+                        # The upstream said when to come back: hold every request to it until then.
+                        self.scheduler.pause(config.name, retry_after, proxy)
+                        left = remaining()
+                        if is_last or retry_after > config.max_retry_after or (left is not None and retry_after >= left):
+                            return response
+                        if config.name not in self.scheduler.budgets:
+                            await asyncio.sleep(retry_after)
+                        continue
+                    if response.status_code not in config.retry_statuses or is_last:
+                        return response
+                delay = min(config.backoff_max, config.backoff_base * 2 ** attempt) * random.uniform(0.5, 1.0)
+                left = remaining()
+                if left is not None and delay >= left:
+                    # No time left for another attempt: report what we have.
+                    if response is not None:
+                        return response
+                    raise error
+                await asyncio.sleep(delay)
+
+    async def get(self, url: str, **kwargs: Any) -> httpx.Response:
+        """Sends a GET request; see request() for the accepted keyword arguments."""
+        return await self.request("GET", url, **kwargs)
+
+    async def aclose(self):
+        """Closes every pooled connection."""
+        clients = list(self._clients.values()) + list(self._proxy_clients.values())
+        self._clients.clear()
+        self._proxy_clients.clear()
+        await asyncio.gather(*(client.aclose() for client in clients), return_exceptions=True)
+
+
+# httpx pools are bound to the event loop that created them, so keep one client per loop.
+_clients_by_loop: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncHttpClient]" = weakref.WeakKeyDictionary()
+
+
+def get_http_client() -> AsyncHttpClient:
+    """
+    Returns the shared AsyncHttpClient for the running event loop.
+
+    Returns:
+        AsyncHttpClient: The client, created on first use.
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients_by_loop.get(loop)
+    if client is None:
+        client = _clients_by_loop[loop] = AsyncHttpClient()
+    return client
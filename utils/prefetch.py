@@ -0,0 +1,166 @@
+"""
+prefetch.py
+
+Speculative request prefetching.
+- Starts probable upstream requests early, keyed by their canonical cache key and
+  grouped by invocation.
+- Hands a prefetched result to the tool that later makes the same request.
+- Cancels prefetches that turn out to be unneeded and counts hits and waste.
+"""
+
+# --- Imports ---
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+from .telemetry import add_event
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class _Prefetch:
+    task: asyncio.Task
+    tag: str
+
+
+class Prefetcher:
+    """
+    Registry of speculative requests, one group per scope (an invocation id).
+
+    A prefetch is used at most once: `take` hands it to the first caller with the
+    same scope and key, and `discard` cancels (or writes off) whatever is left.
+    """
+
+    def __init__(self, max_scopes: int = 256):
+        """
+        Args:
+            max_scopes (int): Scopes kept at once; the oldest is discarded beyond this.
+        """
+        self.max_scopes = max_scopes
+        self._scopes: "OrderedDict[str, Dict[str, _Prefetch]]" = OrderedDict()
+        self._stats = {"started": 0, "hits": 0, "misses": 0, "cancelled": 0, "wasted": 0, "failed": 0}
+
+    def start(self, scope: str, key: str, fetch: Callable[[], Awaitable[Any]], tag: str = "") -> bool:
+        """
+        Starts a prefetch unless the same request is already prefetched in the scope.
+
+        Must be called with a running event loop.
+
+        Args:
+            scope (str): Group of the prefetch, e.g. the invocation id.
+            key (str): Canonical request key (make_cache_key).
+            fetch (Callable): Coroutine function performing the request.
+            tag (str): Label used to settle prefetches by origin, e.g. the agent name.
+
+        Returns:
+            bool: True if a new prefetch was started.
+        """
+        entries = self._scopes.get(scope)
+        if entries is None:
+            entries = self._scopes[scope] = {}
+            while len(self._scopes) > self.max_scopes:
+                self.discard(next(iter(self._scopes)))
+        if key in entries:
+            return False
+        entries[key] = _Prefetch(asyncio.get_running_loop().create_task(fetch()), tag)
+        self._stats["started"] += 1
+        return True
+
+    async def take(self, scope: str, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Returns the prefetched result for a request, or performs it now.
+
+        A prefetch that failed is not reused; the request is made again instead.
+        If the caller is cancelled while waiting, the prefetch is cancelled too (no
+        one else can take it) and the cancellation propagates.
+
+        Args:
+            scope (str): The caller's scope.
+            key (str): Canonical request key.
+            fetch (Callable): Coroutine function performing the request.
+
+        Returns:
+            Any: The response.
+        """
+        entry = self._scopes.get(scope, {}).pop(key, None)
+        if entry is not None:
+            try:
+                # Shielded, so a cancelled caller can be told apart from a cancelled prefetch.
+                result = await asyncio.shield(entry.task)
+            except asyncio.CancelledError:
+                caller = asyncio.current_task()
+                if (caller is not None and caller.cancelling()) or not entry.task.cancelled():
+                    entry.task.cancel()
+                    self._stats["cancelled"] += 1
+                    raise
+                self._stats["failed"] += 1
+            except Exception as e:
+                logger.info("Prefetch failed (%s); fetching again.", type(e).__name__)
+                add_event("prefetch_error", error=type(e).__name__)
+                self._stats["failed"] += 1
+            else:
+                self._stats["hits"] += 1
+                add_event("prefetch", result="hit")
+                return result
+        self._stats["misses"] += 1
+        add_event("prefetch", result="miss" if entry is None else "failed")
+        return await fetch()
+
+    def tags(self, scope: str) -> Dict[str, str]:
+        """Returns the unused prefetches of a scope as {key: tag}."""
+        return {key: entry.tag for key, entry in self._scopes.get(scope, {}).items()}
+
+    def discard(self, scope: str, keep: Iterable[str] = ()):
+        """
+        Drops the unused prefetches of a scope: running ones are cancelled,
+        finished ones are counted as wasted.
+
+        Args:
+            scope (str): The scope to settle.
+            keep (Iterable[str]): Keys that may still be taken; the scope is
+                removed entirely when empty.
+        """
+        keep = set(keep)
+        entries = self._scopes.get(scope)
+        if entries is None:
+            return
+        for key in [k for k in entries if k not in keep]:
+            entry = entries.pop(key)
+            if entry.task.done():
+                self._stats["wasted"] += 1
+                if not entry.task.cancelled():
+                    entry.task.exception()  # Retrieved, so asyncio does not log it.
+            else:
+                entry.task.cancel()
+                self._stats["cancelled"] += 1
+        if not keep:
+            del self._scopes[scope]
+
+    def stats(self) -> Dict[str, float]:
+        """Returns prefetch counters with hit rate and waste rate (of started prefetches)."""
+        started = self._stats["started"]
+        unused = self._stats["cancelled"] + self._stats["wasted"]
+        return dict(
+            self._stats,
+            hit_rate=round(self._stats["hits"] / started, 3) if started else 0.0,
+            waste_rate=round(unused / started, 3) if started else 0.0,
+            active=sum(len(entries) for entries in self._scopes.values()),
+        )
+
+
+_prefetcher: Optional[Prefetcher] = None
+
+
+def get_prefetcher() -> Prefetcher:
+    """
+    Returns the process-wide Prefetcher.
+
+    Returns:
+        Prefetcher: The shared prefetcher.
+    """
+    global _prefetcher
+    if _prefetcher is None:
+        _prefetcher = Prefetcher()
+    return _prefetcher
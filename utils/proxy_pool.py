@@ -0,0 +1,392 @@
+"""
+proxy_pool.py
+
+Long-lived, health-scored pool of HTTP proxies.
+- Refreshes its proxy list in the background instead of scraping on every call.
+- Scores each proxy by smoothed success rate and latency, evicting dead ones.
+- Races the best N proxies in parallel (hedged requests); the first good answer wins.
+- Records each fetch as a span with one event per round.
+- Can keep proxy health in a SharedStore, so worker processes learn from each other.
+"""
+
+# --- Imports ---
+import asyncio
+import random
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from .deadline import DeadlineExceeded, create_task_without_deadline, remaining, wait_within_deadline
+from .http_client import get_http_client
+from .rate_limiter import BACKGROUND, INTERACTIVE, RateLimitExceeded, request_priority
+from .shared_store import SharedStore
+from .telemetry import add_event, span
+
+
+# --- Proxy Health ---
+@dataclass
+class ProxyStats:
+    """
+    Health record of a single proxy.
+
+    Attributes:
+        successes (int): Number of good answers.
+        failures (int): Number of errors, timeouts and bad statuses.
+        consecutive_failures (int): Failures since the last success.
+        latency_ewma (Optional[float]): Exponentially weighted latency of successes, in seconds.
+        last_used (float): Wall-clock time (time.time()) of the last finished attempt.
+    """
+    successes: int = 0
+    failures: int = 0
+    consecutive_failures: int = 0
+    latency_ewma: Optional[float] = None
+    last_used: float = 0.0
+
+    @property
+    def success_rate(self) -> float:
+        """Success rate with a Laplace prior, so untested proxies start at 0.5."""
+        return (self.successes + 1) / (self.successes + self.failures + 2)
+
+
+class ProxyPool:
+    """
+    A pool of proxies shared by every tool call in the process.
+
+    The pool is filled by an async `fetch_proxies` callable. When it runs low or
+    gets stale, a refresh starts in the background; callers only wait for it when
+    the pool is empty.
+
+    With a SharedStore, health updates and bans are written to the store and the
+    local view is reloaded from it at most every `sync_interval` seconds; a lease
+    keeps the workers from scraping the proxy list at the same time.
+    """
+
+    def __init__(
+        self,
+        fetch_proxies: Callable[[], Awaitable[List[str]]],
+        refresh_interval: float = 600.0,
+        min_size: int = 10,
+        max_consecutive_failures: int = 3,
+        min_success_rate: float = 0.2,
+        min_attempts_for_rate: int = 5,
+        ban_seconds: float = 1800.0,
+        latency_reference: float = 2.0,
+        latency_alpha: float = 0.3,
+        store: Optional[SharedStore] = None,
+        sync_interval: float = 1.0,
+        refresh_lease: float = 60.0,
+    ):
+        """
+        Args:
+            fetch_proxies (Callable): Coroutine function returning proxy URLs.
+            refresh_interval (float): Seconds after which the list is refreshed.
+            min_size (int): Refresh early when fewer proxies than this remain.
+            max_consecutive_failures (int): Evict a proxy after this many failures in a row.
+            min_success_rate (float): Evict a proxy whose success rate drops below this...
+            min_attempts_for_rate (int): ...once it has been tried at least this often.
+            ban_seconds (float): How long an evicted proxy is ignored by later refreshes.
+            latency_reference (float): Latency (s) that halves a proxy's score.
+            latency_alpha (float): Weight of the newest sample in the latency EWMA.
+            store (Optional[SharedStore]): Shares proxy health with other processes.
+            sync_interval (float): Seconds between reloads of the shared records.
+            refresh_lease (float): Shortest gap between two refreshes by different processes.
+        """
+        self._fetch_proxies = fetch_proxies
+        self.refresh_interval = refresh_interval
+        self.min_size = min_size
+        self.max_consecutive_failures = max_consecutive_failures
+        self.min_success_rate = min_success_rate
+        self.min_attempts_for_rate = min_attempts_for_rate
+        self.ban_seconds = ban_seconds
+        self.latency_reference = latency_reference
+        self.latency_alpha = latency_alpha
+        self.store = store
+        self.sync_interval = sync_interval
+        self.refresh_lease = refresh_lease
+
+        self._synced = 0.0
+        self._stats: Dict[str, ProxyStats] = {}
+        self._banned: Dict[str, float] = {}
+        self._last_refresh = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    # --- Pool Maintenance ---
+    def __len__(self) -> int:
+        return len(self._stats)
+
+    def add_proxies(self, proxies: List[str]):
+        """
+        Merges freshly scraped proxies into the pool, keeping existing health data.
+
+        Args:
+            proxies (List[str]): Proxy URLs such as 'http://IP:PORT'.
+        """
+        now = time.monotonic()
+        self._last_refresh = now
+        if self.store is not None and self._shared(self.store.add_proxies, proxies):
+            self.sync(force=True)
+            return
+        self._banned = {p: until for p, until in self._banned.items() if until > time.time()}
+        for proxy in proxies:
+            if proxy not in self._banned:
+                self._stats.setdefault(proxy, ProxyStats())
+
+    def sync(self, force: bool = False):
+        """Reloads the local view from the SharedStore, at most every sync_interval unless forced."""
+        now = time.monotonic()
+        if self.store is None or (not force and now - self._synced < self.sync_interval):
+            return
+        self._synced = now
+        try:
+            usable, self._banned = self.store.load_proxies(time.time())
+        except sqlite3.Error as e:
+            add_event("shared_store_busy", operation="load_proxies", error=str(e))
+            return  # Keeps the current view until the next sync.
+        self._stats = {proxy: ProxyStats(*record) for proxy, record in usable.items()}
+
+    def _shared(self, operation: Callable[..., Any], *args: Any) -> bool:
+        """Runs a SharedStore write; returns False if the store was busy and only the local view changed."""
+        try:
+            operation(*args)
+        except sqlite3.Error as e:
+            add_event("shared_store_busy", operation=operation.__name__, error=str(e))
+            return False
+        return True
+
+    async def refresh(self, priority: int = INTERACTIVE):
+        """
+        Scrapes a new proxy list and merges it into the pool.
+
+        Args:
+            priority (int): Scheduling priority of the scrape request.
+        """
+        request_priority.set(priority)
+        try:
+            proxies = await self._fetch_proxies()
+        except Exception as e:
+            add_event("proxy_refresh_failed", error=f"{type(e).__name__}: {e}")
+            return
+        self.add_proxies(proxies or [])
+
+    def _needs_refresh(self) -> bool:
+        stale = time.monotonic() - self._last_refresh > self.refresh_interval
+        return stale or len(self._stats) < self.min_size
+
+    async def ensure_fresh(self):
+        """
+        Starts a background refresh when the pool is low or stale.
+
+        Only waits for the refresh when the pool is completely empty.
+        """
+        self.sync()
+        if not self._needs_refresh():
+            return
+        if self.store is not None and self._stats and not self._lease_refresh():
+            # Another worker is refreshing (or the store is busy); its proxies arrive with the next sync.
+            self._last_refresh = time.monotonic()
+            return
+        loop = asyncio.get_running_loop()
+        task = self._refresh_task
+        if task is None or task.done() or task.get_loop() is not loop:
+            # Nobody waits for a refresh of a non-empty pool, so it yields to tool calls.
+            priority = BACKGROUND if self._stats else INTERACTIVE
+            task = self._refresh_task = create_task_without_deadline(self.refresh(priority))
+        if not self._stats:
+            await wait_within_deadline(task)
+
+    def _lease_refresh(self) -> bool:
+        try:
+            return self.store.try_lease("proxy-refresh", self.refresh_lease, time.time())
+        except sqlite3.Error as e:
+            add_event("shared_store_busy", operation="try_lease", error=str(e))
+            return False
+
+    def _evict(self, proxy: str):
+        self._stats.pop(proxy, None)
+        self._banned[proxy] = time.time() + self.ban_seconds
+        if self.store is not None:
+            self._shared(self.store.ban_proxy, proxy, self._banned[proxy])
+
+    # --- Health Scoring ---
+    def record_success(self, proxy: str, latency: float):
+        """Records a good answer from `proxy` that took `latency` seconds."""
+        stats = self._stats.get(proxy)
+        if stats is None:
+            return
+        if self.store is not None:
+            self._shared(self.store.record_proxy_success, proxy, latency, self.latency_alpha, time.time())
+        stats.successes += 1
+        stats.consecutive_failures = 0
+        stats.last_used = time.time()
+        if stats.latency_ewma is None:
+            stats.latency_ewma = latency
+        else:
+            stats.latency_ewma += self.latency_alpha * (latency - stats.latency_ewma)
+
+    def record_failure(self, proxy: str):
+        """Records a failed attempt through `proxy`, evicting it if it looks dead."""
+        stats = self._stats.get(proxy)
+        if stats is None:
+            return
+        if self.store is not None:
+            self._shared(self.store.record_proxy_failure, proxy, time.time())
+        stats.failures += 1
+        stats.consecutive_failures += 1
+        stats.last_used = time.time()
+        attempts = stats.successes + stats.failures
+        if stats.consecutive_failures >= self.max_consecutive_failures or (
+            attempts >= self.min_attempts_for_rate and stats.success_rate < self.min_success_rate
+        ):
+            self._evict(proxy)
+
+    def score(self, proxy: str) -> float:
+        """
+        Scores a proxy: smoothed success rate, discounted by its typical latency.
+
+        Args:
+            proxy (str): Proxy URL.
+
+        Returns:
+            float: Higher is better; 0.0 for proxies that are not in the pool.
+        """
+        stats = self._stats.get(proxy)
+        if stats is None:
+            return 0.0
+        latency = self.latency_reference if stats.latency_ewma is None else stats.latency_ewma
+        return stats.success_rate / (1.0 + latency / self.latency_reference)
+
+    def best(self, n: int, exclude: Optional[set] = None) -> List[str]:
+        """
+        Returns the `n` best-scored proxies, breaking ties randomly.
+
+        Args:
+            n (int): Number of proxies to return.
+            exclude (Optional[set]): Proxies to skip (e.g. already tried this call).
+
+        Returns:
+            List[str]: Proxy URLs, best first.
+        """
+        exclude = exclude or set()
+        candidates = [p for p in self._stats if p not in exclude]
+        candidates.sort(key=lambda p: (self.score(p), random.random()), reverse=True)
+        return candidates[:n]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Returns pool size, banned count and the current top proxies with their scores."""
+        return {
+            "size": len(self._stats),
+            "banned": len(self._banned),
+            "seconds_since_refresh": round(time.monotonic() - self._last_refresh, 1) if self._last_refresh else None,
+            "top": [
+                {"proxy": p, "score": round(self.score(p), 3), "success_rate": round(self._stats[p].success_rate, 3),
+                 "latency_ewma": self._stats[p].latency_ewma}
+                for p in self.best(5)
+            ],
+        }
+
+    # --- Hedged Fetching ---
+    async def _attempt(
+        self,
+        proxy: str,
+        url: str,
+        params: Optional[Dict[str, Any]],
+        headers: Dict[str, str],
+        upstream: Optional[str],
+        attempt_timeout: float,
+        cut_short: bool = False,
+    ) -> Optional[Any]:
+        # cut_short: attempt_timeout was shortened to the invocation deadline's time left.
+        started = time.monotonic()
+        try:
+            response = await get_http_client().get(
+                url, params=params, headers=headers, proxy=proxy,
+                timeout=attempt_timeout, retries=0, upstream=upstream,
+            )
+            if response.status_code == 200:
+                data = response.json()
+                self.record_success(proxy, time.monotonic() - started)
+                return data
+        except RateLimitExceeded:
+            return None  # This proxy's budget is spent; that says nothing about its health.
+        except DeadlineExceeded:
+            return None  # The turn ran out of time, not the proxy.
+        except httpx.TimeoutException:
+            if cut_short:
+                return None  # Timed out on the deadline, before the proxy had its full attempt_timeout.
+        except (httpx.HTTPError, ValueError):
+            pass
+        self.record_failure(proxy)
+        return None
+
+    async def fetch_json(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        headers_factory: Callable[[], Dict[str, str]] = dict,
+        upstream: Optional[str] = None,
+        hedge: int = 3,
+        attempt_timeout: float = 8.0,
+        max_rounds: int = 3,
+    ) -> Optional[Any]:
+        """
+        Fetches JSON through the pool, racing the best `hedge` proxies per round.
+
+        Each round starts `hedge` attempts at once through different proxies. The
+        first 200 response with a JSON body wins and the other attempts are
+        cancelled (without counting against their proxies). The worst case is
+        bounded by roughly max_rounds * attempt_timeout, and never runs past the
+        invocation deadline.
+
+        Args:
+            url (str): Target URL.
+            params (Optional[Dict[str, Any]]): Query parameters.
+            headers_factory (Callable): Builds the headers for each attempt.
+            upstream (Optional[str]): Upstream name for the shared HTTP client.
+            hedge (int): Number of proxies raced in parallel per round.
+            attempt_timeout (float): Timeout of a single attempt, in seconds.
+            max_rounds (int): Maximum number of rounds.
+
+        Returns:
+            Optional[Any]: Decoded JSON, or None if every attempt failed.
+        """
+        with span("proxy_fetch", upstream=upstream, **{"proxy.hedge": hedge, "proxy.max_rounds": max_rounds}) as fetch_span:
+            await self.ensure_fresh()
+            tried: set = set()
+
+            for round_number in range(1, max_rounds + 1):
+                left = remaining()
+                if left is not None and left <= 0:
+                    fetch_span.set_attribute("proxy.result", "deadline")
+                    return None
+                round_timeout = attempt_timeout if left is None else min(attempt_timeout, left)
+                cut_short = round_timeout < attempt_timeout
+                candidates = self.best(hedge, exclude=tried)
+                if not candidates:
+                    break
+                tried.update(candidates)
+                fetch_span.set_attribute("proxy.rounds", round_number)
+                add_event("proxy_round", round=round_number, proxies=len(candidates))
+
+                attempts = [
+                    asyncio.ensure_future(self._attempt(p, url, params, headers_factory(), upstream, round_timeout, cut_short))
+                    for p in candidates
+                ]
+                try:
+                    for next_done in asyncio.as_completed(attempts):
+                        data = await next_done
+                        if data is not None:
+                            fetch_span.set_attribute("proxy.result", "ok")
+                            return data
+                finally:
+                    for attempt in attempts:
+                        attempt.cancel()
+                    await asyncio.gather(*attempts, return_exceptions=True)
+
+                # Losing proxies may have been evicted; top up in the background.
+                await self.ensure_fresh()
+
+            fetch_span.set_attribute("proxy.result", "exhausted")
+            return None
@@ -0,0 +1,379 @@
+"""
+rate_limiter.py
+
+Per-upstream request scheduling for the shared HTTP client.
+- Spends each upstream's quota through a token bucket with a configurable budget.
+- Serves waiting requests by priority, so interactive tool calls go ahead of background refreshes.
+- Pauses an upstream when it answers with Retry-After, and sheds requests that would wait too long.
+- Reports queue depth and wait times per upstream.
+- Can keep the buckets in a SharedStore, so several worker processes share one budget.
+"""
+
+# --- Imports ---
+import asyncio
+import heapq
+import itertools
+import os
+import sqlite3
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from .shared_store import SharedStore, get_shared_store
+from .telemetry import add_event
+
+# --- Priorities ---
+# Lower values are served first.
+INTERACTIVE = 0
+BACKGROUND = 10
+
+# Priority of the requests made by the current task. Background work (cache
+# refreshes, proxy list refreshes) sets BACKGROUND in its own task.
+request_priority: ContextVar[int] = ContextVar("request_priority", default=INTERACTIVE)
+
+
+# --- Budgets ---
+@dataclass(frozen=True)
+class RateBudget:
+    """
+    Request budget of one upstream.
+
+    Attributes:
+        rate (float): Sustained requests per second.
+        burst (float): Bucket size: requests that may be sent back to back.
+        max_wait (float): Requests expected to wait longer than this are rejected
+            immediately instead of queueing.
+        per_proxy (bool): Keep a separate bucket per proxy (the upstream limits per client IP).
+    """
+    rate: float
+    burst: float
+    max_wait: float = 10.0
+    per_proxy: bool = False
+
+
+RATE_BUDGETS: Dict[str, RateBudget] = {
+    # The Launch Library free tier allows 15 requests per hour and client IP.
+    "spacedevs": RateBudget(rate=15 / 3600, burst=15, max_wait=5.0, per_proxy=True),
+    # open-meteo's free tier: 600 per minute, 5,000 per hour.
+    "open-meteo": RateBudget(rate=5000 / 3600, burst=100),
+    # NewsAPI developer keys: 100 requests per day.
+    "newsapi": RateBudget(rate=100 / 86400, burst=20, max_wait=5.0),
+    "proxy-list": RateBudget(rate=0.1, burst=3, max_wait=30.0),
+}
+
+
+def budget_from_env(upstream: str, default: Optional[RateBudget]) -> Optional[RateBudget]:
+    """
+    Reads a budget override such as RATE_LIMIT_NEWSAPI="500/86400" (requests/seconds)
+    or "500/86400/50" (with burst); "off" disables limiting for the upstream.
+
+    Args:
+        upstream (str): Upstream name.
+        default (Optional[RateBudget]): Budget used when no override is set.
+
+    Returns:
+        Optional[RateBudget]: The effective budget, or None for no limit.
+    """
+    value = os.getenv("RATE_LIMIT_" + upstream.upper().replace("-", "_"), "").strip()
+    if not value:
+        return default
+    if value.lower() in ("off", "none", "0"):
+        return None
+    parts = [float(p) for p in value.split("/")]
+    rate = parts[0] / parts[1] if len(parts) > 1 else parts[0]
+    burst = parts[2] if len(parts) > 2 else (default.burst if default else max(1.0, parts[0]))
+    if default is None:
+        return RateBudget(rate=rate, burst=burst)
+    return RateBudget(rate=rate, burst=burst, max_wait=default.max_wait, per_proxy=default.per_proxy)
+
+
+def parse_retry_after(response: httpx.Response) -> Optional[float]:
+    """
+    Returns the delay requested by a Retry-After header, in seconds.
+
+    Args:
+        response (httpx.Response): The upstream response.
+
+    Returns:
+        Optional[float]: Seconds to wait, or None if the header is missing or invalid.
+    """
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimitExceeded(httpx.HTTPError):
+    """Raised when a request would wait longer than its upstream's max_wait."""
+
+    def __init__(self, upstream: str, wait: float):
+        super().__init__(f"Rate limit for '{upstream}' reached; next slot in {wait:.1f}s")
+        self.upstream = upstream
+        self.wait = wait
+
+
+# --- Token Bucket ---
+class TokenBucket:
+    """
+    A token bucket with a priority queue of waiting requests.
+
+    Requests take a token immediately when one is available and nobody is
+    queued. Otherwise they queue by (priority, arrival) and a single pump task
+    hands out tokens as they refill.
+    """
+
+    def __init__(self, name: str, budget: RateBudget):
+        self.name = name
+        self.budget = budget
+        self.tokens = float(budget.burst)
+        self.paused_until = 0.0
+        self._updated = time.monotonic()
+        self._queue: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._pump: Optional[asyncio.Task] = None
+        self.granted = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_observed_wait = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.budget.burst, self.tokens + (now - self._updated) * self.budget.rate)
+        self._updated = now
+
+    def _state(self, now: float) -> Tuple[float, float]:
+        """Returns (tokens, paused_until) after refilling."""
+        self._refill(now)
+        return self.tokens, self.paused_until
+
+    def _take(self, now: float) -> bool:
+        """Takes a token if one is available and the bucket is not paused."""
+        self._refill(now)
+        if now < self.paused_until or self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def _estimated_wait(self, priority: int, now: float) -> float:
+        tokens, paused_until = self._state(now)
+        ahead = sum(1 for p, _, future in self._queue if p <= priority and not future.done())
+        missing = ahead + 1 - tokens
+        wait = missing / self.budget.rate if missing > 0 else 0.0
+        return max(wait, paused_until - now)
+
+    def pause(self, seconds: float):
+        """Stops handing out tokens for `seconds` (e.g. after a 429 with Retry-After)."""
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens = min(self.tokens, 0.0)
+        self.paused_until = max(self.paused_until, now + seconds)
+
+    async def acquire(self, priority: int = INTERACTIVE, max_wait: Optional[float] = None):
+        """
+        Waits for a token.
+
+        Args:
+            priority (int): Queue priority; lower values are served first.
+            max_wait (Optional[float]): Tighter limit than the budget's max_wait
+                (e.g. the time left before the invocation deadline).
+
+        Raises:
+            RateLimitExceeded: If the expected wait exceeds the allowed wait.
+        """
+        now = time.monotonic()
+        if not self._queue and self._take(now):
+            self.granted += 1
+            return
+
+        expected = self._estimated_wait(priority, now)
+        if expected > (self.budget.max_wait if max_wait is None else min(max_wait, self.budget.max_wait)):
+            self.rejected += 1
+            raise RateLimitExceeded(self.name, expected)
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._sequence), future))
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.get_running_loop().create_task(self._run_pump())
+        await future  # Cancelling the caller cancels the future; the pump skips it.
+        waited = time.monotonic() - now
+        self.granted += 1
+        self.total_wait += waited
+        self.max_observed_wait = max(self.max_observed_wait, waited)
+
+    async def _run_pump(self):
+        while self._queue:
+            if self._queue[0][2].done():
+                heapq.heappop(self._queue)  # Cancelled while waiting.
+                continue
+            now = time.monotonic()
+            if not self._take(now):
+                tokens, paused_until = self._state(now)
+                await asyncio.sleep(max(paused_until - now, (1 - tokens) / self.budget.rate, 0.001))
+                continue
+            _, _, future = heapq.heappop(self._queue)
+            future.set_result(None)
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for _, _, future in self._queue if not future.done())
+
+    def stats(self) -> Dict[str, float]:
+        """Returns tokens, queue depth, pause time and wait statistics."""
+        now = time.monotonic()
+        tokens, paused_until = self._state(now)
+        return {
+            "tokens": round(tokens, 2),
+            "queue_depth": self.queue_depth,
+            "paused_for": round(max(0.0, paused_until - now), 1),
+            "granted": self.granted,
+            "rejected": self.rejected,
+            "mean_wait": round(self.total_wait / self.granted, 3) if self.granted else 0.0,
+            "max_wait": round(self.max_observed_wait, 3),
+        }
+
+
+class SharedTokenBucket(TokenBucket):
+    """
+    A TokenBucket whose tokens and pause live in a SharedStore, so every process
+    using the store spends the same budget. The queue of waiting requests stays
+    local to the process. While the store is busy (locked by another process
+    for longer than its busy timeout), the bucket falls back to its local state.
+    """
+
+    def __init__(self, name: str, budget: RateBudget, store: SharedStore):
+        super().__init__(name, budget)
+        self.store = store
+        self.store_busy = 0
+
+    def _store_busy(self, operation: str, error: sqlite3.Error):
+        self.store_busy += 1
+        add_event("shared_store_busy", operation=operation, bucket=self.name, error=str(error))
+
+    # The store keeps wall-clock times; the bucket's callers pass and expect monotonic ones.
+    def _state(self, now: float) -> Tuple[float, float]:
+        offset = time.time() - time.monotonic()
+        try:
+            tokens, paused_until = self.store.bucket_state(self.name, self.budget.rate, self.budget.burst, now + offset)
+        except sqlite3.Error as e:
+            self._store_busy("bucket_state", e)
+            return super()._state(now)
+        return tokens, paused_until - offset
+
+    def _take(self, now: float) -> bool:
+        try:
+            return self.store.take_token(self.name, self.budget.rate, self.budget.burst, now + time.time() - time.monotonic())
+        except sqlite3.Error as e:
+            self._store_busy("take_token", e)
+            return super()._take(now)
+
+    def pause(self, seconds: float):
+        now = time.time()
+        try:
+            self.store.pause_bucket(self.name, self.budget.rate, self.budget.burst, now, now + seconds)
+        except sqlite3.Error as e:
+            self._store_busy("pause_bucket", e)
+            super().pause(seconds)
+
+    def stats(self) -> Dict[str, float]:
+        stats = super().stats()
+        stats["store_busy"] = self.store_busy
+        return stats
+
+
+# --- Scheduler ---
+class RequestScheduler:
+    """
+    Token buckets for every rate-limited upstream, created on demand.
+
+    Upstreams without a budget are never delayed. Budgets marked per_proxy get
+    one bucket per proxy, since such limits apply per client IP. With a
+    SharedStore the buckets are shared with the other processes using it.
+    """
+
+    def __init__(
+        self,
+        budgets: Optional[Dict[str, RateBudget]] = None,
+        max_buckets: int = 512,
+        store: Optional[SharedStore] = None,
+    ):
+        """
+        Args:
+            budgets (Optional[Dict[str, RateBudget]]): Per-upstream budgets; defaults to
+                RATE_BUDGETS with RATE_LIMIT_<UPSTREAM> environment overrides.
+            max_buckets (int): Idle, full per-proxy buckets are dropped beyond this many.
+            store (Optional[SharedStore]): Defaults to get_shared_store() (None when
+                state is not shared).
+        """
+        self.max_buckets = max_buckets
+        self.store = store if store is not None else get_shared_store()
+        if budgets is None:
+            budgets = {name: budget_from_env(name, budget) for name, budget in RATE_BUDGETS.items()}
+        self.budgets = {name: budget for name, budget in budgets.items() if budget is not None}
+        self._buckets: Dict[Tuple[str, Optional[str]], TokenBucket] = {}
+
+    def _bucket(self, upstream: str, proxy: Optional[str]) -> Optional[TokenBucket]:
+        budget = self.budgets.get(upstream)
+        if budget is None:
+            return None
+        key = (upstream, proxy if budget.per_proxy else None)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_buckets:
+                self._prune()
+            name = upstream if key[1] is None else f"{upstream} via {proxy}"
+            if self.store is not None:
+                bucket = self._buckets[key] = SharedTokenBucket(name, budget, self.store)
+            else:
+                bucket = self._buckets[key] = TokenBucket(name, budget)
+        return bucket
+
+    def _prune(self):
+        # A full bucket with nobody waiting behaves exactly like a new one.
+        now = time.monotonic()
+        for key, bucket in list(self._buckets.items()):
+            tokens, paused_until = bucket._state(now)
+            if key[1] is not None and not bucket.queue_depth and tokens >= bucket.budget.burst and now >= paused_until:
+                del self._buckets[key]
+
+    async def acquire(
+        self,
+        upstream: str,
+        proxy: Optional[str] = None,
+        priority: Optional[int] = None,
+        max_wait: Optional[float] = None,
+    ):
+        """
+        Waits until a request to `upstream` may be sent.
+
+        Args:
+            upstream (str): Upstream name.
+            proxy (Optional[str]): Proxy the request goes through.
+            priority (Optional[int]): Queue priority; defaults to the task's request_priority.
+            max_wait (Optional[float]): Tighter limit than the budget's max_wait.
+
+        Raises:
+            RateLimitExceeded: If the request would wait longer than allowed.
+        """
+        bucket = self._bucket(upstream, proxy)
+        if bucket is not None:
+            await bucket.acquire(request_priority.get() if priority is None else priority, max_wait)
+
+    def pause(self, upstream: str, seconds: float, proxy: Optional[str] = None):
+        """Pauses an upstream (or one of its proxies) for `seconds`, e.g. after HTTP 429."""
+        bucket = self._bucket(upstream, proxy)
+        if bucket is not None:
+            bucket.pause(seconds)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Returns TokenBucket.stats() for every bucket, keyed by upstream (and proxy)."""
+        return {bucket.name: bucket.stats() for bucket in self._buckets.values()}
@@ -0,0 +1,286 @@
+"""
+response_cache.py
+
+Cross-tool cache for upstream API responses.
+- Builds canonical cache keys from the request parameters (API keys excluded).
+- Applies per-upstream TTLs, with stale-while-revalidate after the TTL expires.
+- Keeps hot entries in an in-memory LRU backed by a local SQLite file that survives restarts.
+- Coalesces concurrent misses for the same key into a single upstream request.
+"""
+
+# --- Imports ---
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from .deadline import create_task_without_deadline
+from .rate_limiter import BACKGROUND, request_priority
+from .single_flight import SingleFlight
+from .telemetry import add_event
+
+logger = logging.getLogger(__name__)
+
+# --- Cache Policies ---
+@dataclass(frozen=True)
+class CachePolicy:
+    """
+    Freshness rules for one upstream.
+
+    Attributes:
+        ttl (float): Seconds an entry is served as fresh.
+        stale_ttl (float): Extra seconds a stale entry may be served while it is refreshed.
+    """
+    ttl: float
+    stale_ttl: float = 0.0
+
+
+CACHE_POLICIES: Dict[str, CachePolicy] = {
+    "spacedevs": CachePolicy(ttl=300, stale_ttl=3600),
+    "open-meteo": CachePolicy(ttl=900, stale_ttl=3 * 3600),
+    "newsapi": CachePolicy(ttl=600, stale_ttl=3600),
+}
+DEFAULT_POLICY = CachePolicy(ttl=60)
+
+# Request parameters that never become part of a cache key.
+SECRET_PARAMS = frozenset({"apikey", "api_key", "key", "token", "access_token"})
+
+DEFAULT_CACHE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "responses.sqlite3"
+)
+
+
+def make_cache_key(upstream: str, url: str, params: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Builds a canonical cache key for a request.
+
+    Parameters are sorted, None values are dropped, values are compared as strings
+    and credentials (see SECRET_PARAMS) are excluded, so equivalent requests from
+    different tools or sessions share one entry.
+
+    Args:
+        upstream (str): Upstream name, e.g. "open-meteo".
+        url (str): Request URL without query string.
+        params (Optional[Dict[str, Any]]): Query parameters.
+
+    Returns:
+        str: A hex SHA-256 digest.
+    """
+    canonical = {
+        str(k): str(v)
+        for k, v in (params or {}).items()
+        if v is not None and str(k).lower() not in SECRET_PARAMS
+    }
+    payload = json.dumps([upstream, url.rstrip("/"), canonical], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# --- Cache ---
+class ResponseCache:
+    """
+    Two-tier response cache with stale-while-revalidate.
+
+    Fresh hits are served from memory (or SQLite, then promoted to memory). Stale
+    hits are served immediately while a single background refresh per key runs.
+    Misses call the upstream and store the result; concurrent misses for the same
+    key share one upstream call. Returned values are shared and must be treated
+    as read-only.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = DEFAULT_CACHE_PATH,
+        max_memory_entries: int = 256,
+        policies: Optional[Dict[str, CachePolicy]] = None,
+    ):
+        """
+        Args:
+            path (Optional[str]): SQLite file; None keeps the cache in memory only.
+            max_memory_entries (int): Size of the in-memory LRU tier.
+            policies (Optional[Dict[str, CachePolicy]]): Per-upstream policies.
+        """
+        self.policies = dict(CACHE_POLICIES if policies is None else policies)
+        self.max_memory_entries = max_memory_entries
+        self._memory: "OrderedDict[str, Tuple[Any, float, float]]" = OrderedDict()
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self._flights = SingleFlight()
+        self._stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "refresh_errors": 0}
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, upstream TEXT, value TEXT, stored_at REAL, expires_at REAL)"
+            )
+            self._db.execute("DELETE FROM responses WHERE expires_at < ?", (time.time(),))
+
+    def policy_for(self, upstream: str) -> CachePolicy:
+        """Returns the policy configured for `upstream`, or DEFAULT_POLICY."""
+        return self.policies.get(upstream, DEFAULT_POLICY)
+
+    # --- Storage Tiers ---
+    def _remember(self, key: str, value: Any, stored_at: float, expires_at: float):
+        self._memory[key] = (value, stored_at, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _read_db(self, key: str) -> Optional[Tuple[Any, float, float]]:
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT value, stored_at, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        return None if row is None else (json.loads(row[0]), row[1], row[2])
+
+    def _write_db(self, key: str, upstream: str, value: Any, stored_at: float, expires_at: float):
+        encoded = json.dumps(value, separators=(",", ":"))
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, upstream, value, stored_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (key, upstream, encoded, stored_at, expires_at),
+            )
+
+    async def _load(self, key: str) -> Optional[Tuple[Any, float, float]]:
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+            return entry
+        if self._db is None:
+            return None
+        entry = await asyncio.to_thread(self._read_db, key)
+        if entry is not None:
+            self._remember(key, *entry)
+        return entry
+
+    async def _store(self, key: str, upstream: str, value: Any):
+        policy = self.policy_for(upstream)
+        stored_at = time.time()
+        expires_at = stored_at + policy.ttl + policy.stale_ttl
+        self._remember(key, value, stored_at, expires_at)
+        if self._db is not None:
+            await asyncio.to_thread(self._write_db, key, upstream, value, stored_at, expires_at)
+
+    # --- Public API ---
+    async def get_or_fetch(
+        self,
+        upstream: str,
+        url: str,
+        params: Optional[Dict[str, Any]],
+        fetch: Callable[[], Awaitable[Any]],
+        should_cache: Callable[[Any], bool] = lambda value: value is not None,
+    ) -> Any:
+        """
+        Returns the cached response for a request, fetching it when needed.
+
+        Args:
+            upstream (str): Upstream name; selects the CachePolicy.
+            url (str): Request URL.
+            params (Optional[Dict[str, Any]]): Query parameters (credentials are ignored).
+            fetch (Callable): Coroutine function that calls the upstream.
+            should_cache (Callable): Decides whether a fetched value may be stored
+                (e.g. only successful API responses).
+
+        Returns:
+            Any: The fresh, stale or newly fetched response.
+        """
+        key = make_cache_key(upstream, url, params)
+        policy = self.policy_for(upstream)
+        entry = await self._load(key)
+
+        if entry is not None:
+            value, stored_at, expires_at = entry
+            now = time.time()
+            if now - stored_at < policy.ttl:
+                self._stats["hits"] += 1
+                add_event("cache", upstream=upstream, result="hit")
+                return value
+            if now < expires_at:
+                self._stats["stale_hits"] += 1
+                add_event("cache", upstream=upstream, result="stale")
+                self._schedule_refresh(key, upstream, fetch, should_cache)
+                return value
+
+        self._stats["misses"] += 1
+        add_event("cache", upstream=upstream, result="miss")
+
+        async def fetch_and_store():
+            value = await fetch()
+            if should_cache(value):
+                await self._store(key, upstream, value)
+            return value
+
+        return await self._flights.do(key, fetch_and_store)
+
+    def _schedule_refresh(self, key: str, upstream: str, fetch: Callable[[], Awaitable[Any]], should_cache: Callable[[Any], bool]):
+        task = self._refreshing.get(key)
+        if task is not None and not task.done():
+            return
+
+        async def refresh():
+            # Someone already has an answer; let interactive requests go first.
+            request_priority.set(BACKGROUND)
+            try:
+                value = await fetch()
+                if should_cache(value):
+                    await self._store(key, upstream, value)
+                self._stats["refreshes"] += 1
+            except Exception as e:
+                self._stats["refresh_errors"] += 1
+                logger.warning("Background cache refresh for %s failed: %s", upstream, e)
+                add_event("cache_refresh_failed", upstream=upstream, error=type(e).__name__)
+            finally:
+                self._refreshing.pop(key, None)
+
+        # Not bounded by the deadline of the request that found the entry stale.
+        self._refreshing[key] = create_task_without_deadline(refresh())
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns hit, stale-hit, miss and refresh counters, the memory tier size and
+        how many misses were coalesced into another caller's upstream request.
+        """
+        flights = self._flights.stats()
+        return dict(
+            self._stats,
+            memory_entries=len(self._memory),
+            upstream_calls=flights["executions"],
+            coalesced=flights["coalesced"],
+            in_flight=flights["in_flight"],
+        )
+
+    def clear(self):
+        """Drops every cached response from both tiers."""
+        self._memory.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM responses")
+
+
+_response_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> ResponseCache:
+    """
+    Returns the process-wide ResponseCache.
+
+    The SQLite location comes from RESPONSE_CACHE_PATH; set it to an empty string
+    to keep the cache in memory only.
+
+    Returns:
+        ResponseCache: The shared cache, created on first use.
+    """
+    global _response_cache
+    if _response_cache is None:
+        path = os.getenv("RESPONSE_CACHE_PATH", DEFAULT_CACHE_PATH)
+        _response_cache = ResponseCache(path=path or None)
+    return _response_cache
@@ -0,0 +1,399 @@
+"""
+session_store.py
+
+Persistent ADK session service backed by SQLite.
+- Stores sessions, events and app/user-scoped state in a local SQLite file, compactly
+  serialized (JSON, zlib-compressed when large).
+- Loads a session only when it is first used and keeps recently used sessions in an
+  in-memory LRU; idle sessions are evicted and reloaded on demand.
+- Gives every user/session its own copy of the state and its own lock.
+"""
+
+# --- Imports ---
+import asyncio
+import copy
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, Session
+from google.adk.sessions.base_session_service import GetSessionConfig, ListSessionsResponse
+from google.adk.sessions.state import State
+
+# --- Constants ---
+DEFAULT_SESSION_STORE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "sessions.sqlite3"
+)
+
+# Blob prefixes: plain JSON or zlib-compressed JSON.
+_PLAIN = b"j"
+_COMPRESSED = b"z"
+
+SessionKey = Tuple[str, str, str]
+
+
+def pack_blob(data: bytes, compress_min_bytes: int = 512) -> bytes:
+    """
+    Prefixes serialized data with its encoding, compressing it when it is large.
+
+    Args:
+        data (bytes): UTF-8 JSON.
+        compress_min_bytes (int): Payloads at least this large are zlib-compressed.
+
+    Returns:
+        bytes: The stored blob.
+    """
+    if len(data) >= compress_min_bytes:
+        return _COMPRESSED + zlib.compress(data, 6)
+    return _PLAIN + data
+
+
+def unpack_blob(blob: bytes) -> bytes:
+    """Reverses pack_blob."""
+    return zlib.decompress(blob[1:]) if blob[:1] == _COMPRESSED else blob[1:]
+
+
+def encode_blob(value: Any, compress_min_bytes: int = 512) -> bytes:
+    """Serializes a JSON-compatible value (e.g. a state dict) compactly."""
+    return pack_blob(json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8"), compress_min_bytes)
+
+
+def decode_blob(blob: bytes) -> Any:
+    """Reverses encode_blob."""
+    return json.loads(unpack_blob(blob))
+
+
+# --- Session Service ---
+class SqliteSessionService(BaseSessionService):
+    """
+    ADK session service with SQLite persistence and an LRU of loaded sessions.
+
+    Every change is written through to SQLite, so evicting a session from memory
+    never loses data. Session-scoped state lives with the session; "app:" and
+    "user:" keys are stored once per app and per user and merged into the
+    sessions handed out, as with the built-in services. Callers always get a copy,
+    so concurrent users never share state objects.
+    """
+
+    def __init__(self, path: Optional[str] = DEFAULT_SESSION_STORE_PATH, max_cached_sessions: int = 1024, compress_min_bytes: int = 512):
+        """
+        Args:
+            path (Optional[str]): SQLite file; None keeps the (still compact) store in memory.
+            max_cached_sessions (int): Loaded sessions kept in memory; idle ones beyond this are evicted.
+            compress_min_bytes (int): Serialized states and events at least this large are compressed.
+        """
+        self.path = path
+        self.max_cached_sessions = max_cached_sessions
+        self.compress_min_bytes = compress_min_bytes
+        self._sessions: "OrderedDict[SessionKey, Session]" = OrderedDict()
+        self._locks: Dict[SessionKey, asyncio.Lock] = {}
+        self._app_state: Dict[str, Dict[str, Any]] = {}
+        self._user_state: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._stats = {"hits": 0, "loads": 0, "evictions": 0, "events_written": 0}
+        self._db_lock = threading.Lock()
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path or ":memory:", check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " app_name TEXT, user_id TEXT, session_id TEXT, state BLOB, last_update_time REAL,"
+            " PRIMARY KEY (app_name, user_id, session_id));"
+            "CREATE TABLE IF NOT EXISTS events ("
+            " app_name TEXT, user_id TEXT, session_id TEXT, seq INTEGER, data BLOB,"
+            " PRIMARY KEY (app_name, user_id, session_id, seq));"
+            "CREATE TABLE IF NOT EXISTS scoped_state ("
+            " app_name TEXT, user_id TEXT, state BLOB, PRIMARY KEY (app_name, user_id));"
+        )
+
+    # --- Locks & Cache ---
+    def session_lock(self, app_name: str, user_id: str, session_id: str) -> asyncio.Lock:
+        """
+        Returns the lock of one session, e.g. to run a single turn at a time per session.
+        Appending events takes the same lock.
+
+        Args:
+            app_name (str): App name.
+            user_id (str): User id.
+            session_id (str): Session id.
+
+        Returns:
+            asyncio.Lock: The session's lock.
+        """
+        key = (app_name, user_id, session_id)
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        return lock
+
+    def _cache(self, key: SessionKey, session: Session):
+        self._sessions[key] = session
+        self._sessions.move_to_end(key)
+        if len(self._sessions) <= self.max_cached_sessions:
+            return
+        for old_key in list(self._sessions):
+            if len(self._sessions) <= self.max_cached_sessions:
+                break
+            lock = self._locks.get(old_key)
+            if old_key == key or (lock is not None and lock.locked()):
+                continue  # In use: evicting it would let a second copy diverge.
+            del self._sessions[old_key]
+            self._locks.pop(old_key, None)
+            self._stats["evictions"] += 1
+
+    # --- SQLite ---
+    def _execute(self, sql: str, params: tuple = ()) -> List[tuple]:
+        with self._db_lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def _read_session(self, key: SessionKey) -> Optional[Session]:
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT state, last_update_time FROM sessions WHERE app_name = ? AND user_id = ? AND session_id = ?", key
+            ).fetchone()
+            if row is None:
+                return None
+            event_rows = self._db.execute(
+                "SELECT data FROM events WHERE app_name = ? AND user_id = ? AND session_id = ? ORDER BY seq", key
+            ).fetchall()
+        return Session(
+            app_name=key[0],
+            user_id=key[1],
+            id=key[2],
+            state=decode_blob(row[0]),
+            events=[Event.model_validate_json(unpack_blob(data)) for (data,) in event_rows],
+            last_update_time=row[1],
+        )
+
+    def _write_event(self, key: SessionKey, seq: int, event: Event, session: Session, state_changed: bool, scoped: Dict[Tuple[str, str], Dict[str, Any]]):
+        event_blob = pack_blob(event.model_dump_json(exclude_none=True).encode("utf-8"), self.compress_min_bytes)
+        state_blob = encode_blob(session.state, self.compress_min_bytes) if state_changed else None
+        with self._db_lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.execute("INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?)", key + (seq, event_blob))
+                if state_blob is not None:
+                    self._db.execute(
+                        "UPDATE sessions SET state = ?, last_update_time = ? WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                        (state_blob, session.last_update_time) + key,
+                    )
+                else:
+                    self._db.execute(
+                        "UPDATE sessions SET last_update_time = ? WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                        (session.last_update_time,) + key,
+                    )
+                for (app_name, user_id), state in scoped.items():
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO scoped_state VALUES (?, ?, ?)",
+                        (app_name, user_id, encode_blob(state, self.compress_min_bytes)),
+                    )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    async def _scoped_state(self, app_name: str, user_id: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        app_state = self._app_state.get(app_name)
+        if app_state is None:
+            rows = await asyncio.to_thread(self._execute, "SELECT state FROM scoped_state WHERE app_name = ? AND user_id = ''", (app_name,))
+            app_state = self._app_state[app_name] = decode_blob(rows[0][0]) if rows else {}
+        user_state = self._user_state.get((app_name, user_id))
+        if user_state is None:
+            rows = await asyncio.to_thread(self._execute, "SELECT state FROM scoped_state WHERE app_name = ? AND user_id = ?", (app_name, user_id))
+            user_state = self._user_state[(app_name, user_id)] = decode_blob(rows[0][0]) if rows else {}
+        return app_state, user_state
+
+    async def _load(self, key: SessionKey) -> Optional[Session]:
+        session = self._sessions.get(key)
+        if session is not None:
+            self._sessions.move_to_end(key)
+            self._stats["hits"] += 1
+            return session
+        session = await asyncio.to_thread(self._read_session, key)
+        if session is None:
+            return None
+        # Another task may have loaded it meanwhile; keep the first copy.
+        cached = self._sessions.get(key)
+        if cached is not None:
+            return cached
+        self._stats["loads"] += 1
+        self._cache(key, session)
+        return session
+
+    async def _merged_copy(self, session: Session) -> Session:
+        copied = copy.deepcopy(session)
+        app_state, user_state = await self._scoped_state(session.app_name, session.user_id)
+        copied.state.update({State.APP_PREFIX + k: v for k, v in app_state.items()})
+        copied.state.update({State.USER_PREFIX + k: v for k, v in user_state.items()})
+        return copied
+
+    # --- BaseSessionService ---
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[Dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        """
+        Creates and stores a session.
+
+        Raises:
+            ValueError: If a session with the same id already exists for the user.
+        """
+        session_id = session_id.strip() if session_id and session_id.strip() else str(uuid.uuid4())
+        key = (app_name, user_id, session_id)
+        session_state = {}
+        app_delta: Dict[str, Any] = {}
+        user_delta: Dict[str, Any] = {}
+        for name, value in (state or {}).items():
+            if name.startswith(State.APP_PREFIX):
+                app_delta[name[len(State.APP_PREFIX):]] = value
+            elif name.startswith(State.USER_PREFIX):
+                user_delta[name[len(State.USER_PREFIX):]] = value
+            elif not name.startswith(State.TEMP_PREFIX):
+                session_state[name] = value
+        session = Session(app_name=app_name, user_id=user_id, id=session_id, state=session_state, last_update_time=time.time())
+
+        def insert():
+            with self._db_lock:
+                try:
+                    self._db.execute(
+                        "INSERT INTO sessions VALUES (?, ?, ?, ?, ?)",
+                        key + (encode_blob(session_state, self.compress_min_bytes), session.last_update_time),
+                    )
+                except sqlite3.IntegrityError:
+                    raise ValueError(f"Session '{session_id}' already exists for user '{user_id}'.") from None
+
+        await asyncio.to_thread(insert)
+        if app_delta or user_delta:
+            app_state, user_state = await self._scoped_state(app_name, user_id)
+            app_state.update(app_delta)
+            user_state.update(user_delta)
+            await asyncio.to_thread(self._write_scoped, app_name, user_id, app_state, user_state)
+        self._cache(key, session)
+        return await self._merged_copy(session)
+
+    def _write_scoped(self, app_name: str, user_id: str, app_state: Dict[str, Any], user_state: Dict[str, Any]):
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO scoped_state VALUES (?, '', ?)",
+                (app_name, encode_blob(app_state, self.compress_min_bytes)),
+            )
+            self._db.execute(
+                "INSERT OR REPLACE INTO scoped_state VALUES (?, ?, ?)",
+                (app_name, user_id, encode_blob(user_state, self.compress_min_bytes)),
+            )
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        """Returns a copy of the session (loading it if needed), or None if it does not exist."""
+        session = await self._load((app_name, user_id, session_id))
+        if session is None:
+            return None
+        copied = await self._merged_copy(session)
+        if config:
+            if config.num_recent_events:
+                copied.events = copied.events[-config.num_recent_events:]
+            if config.after_timestamp:
+                copied.events = [e for e in copied.events if e.timestamp >= config.after_timestamp]
+        return copied
+
+    async def list_sessions(self, *, app_name: str, user_id: str) -> ListSessionsResponse:
+        """Lists a user's sessions without their events and state."""
+        rows = await asyncio.to_thread(
+            self._execute,
+            "SELECT session_id, last_update_time FROM sessions WHERE app_name = ? AND user_id = ? ORDER BY last_update_time",
+            (app_name, user_id),
+        )
+        return ListSessionsResponse(sessions=[
+            Session(app_name=app_name, user_id=user_id, id=session_id, state={}, last_update_time=updated)
+            for session_id, updated in rows
+        ])
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        """Deletes a session and its events."""
+        key = (app_name, user_id, session_id)
+
+        def delete():
+            with self._db_lock:
+                self._db.execute("DELETE FROM events WHERE app_name = ? AND user_id = ? AND session_id = ?", key)
+                self._db.execute("DELETE FROM sessions WHERE app_name = ? AND user_id = ? AND session_id = ?", key)
+
+        await asyncio.to_thread(delete)
+        self._sessions.pop(key, None)
+        self._locks.pop(key, None)
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        """Appends an event to the caller's session and to the stored session."""
+        if event.partial:
+            return event
+        await super().append_event(session=session, event=event)
+        session.last_update_time = event.timestamp
+
+        key = (session.app_name, session.user_id, session.id)
+        async with self.session_lock(*key):
+            stored = await self._load(key)
+            if stored is None:
+                return event
+            delta = event.actions.state_delta if event.actions and event.actions.state_delta else {}
+            app_state, user_state = await self._scoped_state(session.app_name, session.user_id)
+            scoped: Dict[Tuple[str, str], Dict[str, Any]] = {}
+            state_changed = False
+            for name, value in delta.items():
+                if name.startswith(State.APP_PREFIX):
+                    app_state[name[len(State.APP_PREFIX):]] = value
+                    scoped[(session.app_name, "")] = app_state
+                elif name.startswith(State.USER_PREFIX):
+                    user_state[name[len(State.USER_PREFIX):]] = value
+                    scoped[(session.app_name, session.user_id)] = user_state
+                elif not name.startswith(State.TEMP_PREFIX):
+                    stored.state[name] = value
+                    state_changed = True
+            stored.events.append(event)
+            stored.last_update_time = event.timestamp
+            await asyncio.to_thread(self._write_event, key, len(stored.events) - 1, event, stored, state_changed, scoped)
+            self._stats["events_written"] += 1
+        return event
+
+    def stats(self) -> Dict[str, int]:
+        """Returns cache hits, loads from SQLite, evictions, written events and the cached session count."""
+        return dict(self._stats, cached_sessions=len(self._sessions))
+
+
+_session_service: Optional[SqliteSessionService] = None
+
+
+def get_session_service() -> SqliteSessionService:
+    """
+    Returns the process-wide session service.
+
+    The SQLite location comes from SESSION_STORE_PATH (an empty value keeps the store
+    in memory) and the LRU size from SESSION_CACHE_SIZE.
+
+    Returns:
+        SqliteSessionService: The shared service, created on first use.
+    """
+    global _session_service
+    if _session_service is None:
+        path = os.getenv("SESSION_STORE_PATH", DEFAULT_SESSION_STORE_PATH)
+        _session_service = SqliteSessionService(
+            path=path or None,
+            max_cached_sessions=int(os.getenv("SESSION_CACHE_SIZE", "1024")),
+        )
+    return _session_service
@@ -0,0 +1,221 @@
+"""
+shared_store.py
+
+SQLite-backed state shared by the worker processes of one host.
+- Token buckets whose tokens and pauses every process spends atomically, so N
+  workers together stay within an upstream's budget.
+- Proxy health records, updated with deltas so no process overwrites another's.
+- Leases, so a periodic job (e.g. the proxy list refresh) runs in one process at a time.
+
+Times are time.time() values: the file outlives the processes (and reboots), and
+monotonic clocks restart with the host. Every operation is a single short
+transaction and runs synchronously, on the caller's event loop: a lock held by
+another process is waited for only briefly, then sqlite3.OperationalError is
+raised and the caller carries on with its process-local state.
+"""
+
+# --- Imports ---
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_SHARED_STATE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "shared.sqlite3"
+)
+# Seconds an operation waits for another process's write lock before giving up.
+DEFAULT_BUSY_TIMEOUT = 0.05
+# Opening the file (WAL switch, schema) happens once per process and may wait longer.
+OPEN_TIMEOUT = 5.0
+
+
+class SharedStore:
+    """State shared across processes through one SQLite file (WAL mode)."""
+
+    def __init__(self, path: str, busy_timeout: float = DEFAULT_BUSY_TIMEOUT):
+        """
+        Args:
+            path (str): SQLite file, shared by every process that should see the same state.
+            busy_timeout (float): Seconds to wait for another process's write transaction.
+        """
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=max(busy_timeout, OPEN_TIMEOUT), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            " key TEXT PRIMARY KEY, tokens REAL, updated REAL, paused_until REAL);"
+            "CREATE TABLE IF NOT EXISTS proxies ("
+            " proxy TEXT PRIMARY KEY, successes INTEGER DEFAULT 0, failures INTEGER DEFAULT 0,"
+            " consecutive_failures INTEGER DEFAULT 0, latency_ewma REAL, last_used REAL DEFAULT 0,"
+            " banned_until REAL DEFAULT 0);"
+            "CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, until REAL);"
+        )
+        self._db.execute(f"PRAGMA busy_timeout = {int(busy_timeout * 1000)}")
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        # BEGIN IMMEDIATE takes the write lock up front, so read-modify-write is atomic.
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    # --- Token Buckets ---
+    @staticmethod
+    def _refilled(db: sqlite3.Connection, key: str, rate: float, burst: float, now: float) -> Tuple[float, float]:
+        row = db.execute("SELECT tokens, updated, paused_until FROM buckets WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return float(burst), 0.0
+        tokens, updated, paused_until = row
+        return min(burst, tokens + max(0.0, now - updated) * rate), paused_until
+
+    def bucket_state(self, key: str, rate: float, burst: float, now: float) -> Tuple[float, float]:
+        """
+        Reads a bucket.
+
+        Args:
+            key (str): Bucket key, e.g. the upstream name.
+            rate (float): Refill rate in tokens per second.
+            burst (float): Bucket size (a new bucket starts full).
+            now (float): Current time.time().
+
+        Returns:
+            Tuple[float, float]: (tokens available now, paused_until).
+        """
+        with self._lock:
+            return self._refilled(self._db, key, rate, burst, now)
+
+    def take_token(self, key: str, rate: float, burst: float, now: float) -> bool:
+        """
+        Takes a token from a bucket if one is available and the bucket is not paused.
+
+        Args:
+            key (str): Bucket key.
+            rate (float): Refill rate in tokens per second.
+            burst (float): Bucket size.
+            now (float): Current time.time().
+
+        Returns:
+            bool: True if a token was taken.
+        """
+        with self._transaction() as db:
+            tokens, paused_until = self._refilled(db, key, rate, burst, now)
+            taken = now >= paused_until and tokens >= 1
+            db.execute(
+                "INSERT OR REPLACE INTO buckets (key, tokens, updated, paused_until) VALUES (?, ?, ?, ?)",
+                (key, tokens - 1 if taken else tokens, now, paused_until),
+            )
+        return taken
+
+    def pause_bucket(self, key: str, rate: float, burst: float, now: float, until: float):
+        """Empties a bucket and stops it from handing out tokens until `until`."""
+        with self._transaction() as db:
+            tokens, paused_until = self._refilled(db, key, rate, burst, now)
+            db.execute(
+                "INSERT OR REPLACE INTO buckets (key, tokens, updated, paused_until) VALUES (?, ?, ?, ?)",
+                (key, min(tokens, 0.0), now, max(paused_until, until)),
+            )
+
+    # --- Proxy Health ---
+    def add_proxies(self, proxies: List[str]):
+        """Adds proxies that are not known yet (known and banned ones keep their record)."""
+        with self._transaction() as db:
+            db.executemany("INSERT OR IGNORE INTO proxies (proxy) VALUES (?)", [(proxy,) for proxy in proxies])
+
+    def record_proxy_success(self, proxy: str, latency: float, alpha: float, now: float):
+        """Counts a success and folds `latency` into the proxy's latency EWMA."""
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE proxies SET successes = successes + 1, consecutive_failures = 0, last_used = ?,"
+                " latency_ewma = CASE WHEN latency_ewma IS NULL THEN ? ELSE latency_ewma + ? * (? - latency_ewma) END"
+                " WHERE proxy = ?",
+                (now, latency, alpha, latency, proxy),
+            )
+
+    def record_proxy_failure(self, proxy: str, now: float):
+        """Counts a failed attempt."""
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE proxies SET failures = failures + 1, consecutive_failures = consecutive_failures + 1,"
+                " last_used = ? WHERE proxy = ?",
+                (now, proxy),
+            )
+
+    def ban_proxy(self, proxy: str, until: float):
+        """Takes a proxy out of rotation for every process until `until`; its record is reset."""
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE proxies SET successes = 0, failures = 0, consecutive_failures = 0, latency_ewma = NULL,"
+                " banned_until = ? WHERE proxy = ?",
+                (until, proxy),
+            )
+
+    def load_proxies(self, now: float) -> Tuple[Dict[str, Tuple[int, int, int, Optional[float], float]], Dict[str, float]]:
+        """
+        Reads every proxy record.
+
+        Args:
+            now (float): Current time.time(); bans that ended are not reported.
+
+        Returns:
+            Tuple[Dict, Dict]: Records of the usable proxies, as (successes, failures,
+            consecutive_failures, latency_ewma, last_used) by proxy, and the banned
+            proxies with the end of their ban.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT proxy, successes, failures, consecutive_failures, latency_ewma, last_used, banned_until FROM proxies"
+            ).fetchall()
+        usable = {row[0]: row[1:6] for row in rows if row[6] <= now}
+        banned = {row[0]: row[6] for row in rows if row[6] > now}
+        return usable, banned
+
+    # --- Leases ---
+    def try_lease(self, name: str, seconds: float, now: float) -> bool:
+        """
+        Claims a lease unless another process holds an unexpired one.
+
+        Args:
+            name (str): Lease name, e.g. 'proxy-refresh'.
+            seconds (float): How long the lease is held (it is not released early).
+            now (float): Current time.time().
+
+        Returns:
+            bool: True if this process now holds the lease.
+        """
+        with self._transaction() as db:
+            row = db.execute("SELECT until FROM leases WHERE name = ?", (name,)).fetchone()
+            if row is not None and row[0] > now:
+                return False
+            db.execute("INSERT OR REPLACE INTO leases (name, until) VALUES (?, ?)", (name, now + seconds))
+        return True
+
+
+_shared_store: Optional[SharedStore] = None
+
+
+def get_shared_store() -> Optional[SharedStore]:
+    """
+    Returns the process-wide SharedStore, or None when state is not shared.
+
+    State is shared when SHARED_STATE_PATH is set (the multi-process supervisor
+    sets it for its workers); a single process keeps this state in memory.
+
+    Returns:
+        Optional[SharedStore]: The store, opened on first use.
+    """
+    global _shared_store
+    path = os.getenv("SHARED_STATE_PATH", "").strip()
+    if not path:
+        return None
+    if _shared_store is None or _shared_store.path != path:
+        _shared_store = SharedStore(path)
+    return _shared_store
@@ -0,0 +1,82 @@
+"""
+single_flight.py
+
+Request coalescing for identical concurrent calls.
+- Runs one in-flight call per key; concurrent callers with the same key share its result.
+- Keeps the shared call running when a single waiter is cancelled, and cancels
+  it once every waiter has left (e.g. a discarded prefetch), so nobody pays for it.
+- Runs the shared call without a deadline; each caller waits until its own deadline.
+- Counts executions, coalesced and abandoned calls.
+"""
+
+# --- Imports ---
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from .deadline import create_task_without_deadline, wait_within_deadline
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into one execution.
+
+    The first caller for a key starts the call as its own task; callers arriving
+    while it runs await the same task and get the same result or exception. Once
+    it finishes, the next call for the key runs again. Results are shared, so
+    callers must treat them as read-only. The call is cancelled when its last
+    waiter is cancelled or gives up at its deadline.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, Tuple[asyncio.AbstractEventLoop, asyncio.Task]] = {}
+        self._waiters: Dict[asyncio.Task, int] = {}
+        self._stats = {"calls": 0, "executions": 0, "coalesced": 0, "abandoned": 0}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Runs `fn` once for all concurrent callers with the same `key`.
+
+        Args:
+            key (Hashable): Identity of the call, e.g. a canonical cache key.
+            fn (Callable): Coroutine function performing the call.
+
+        Returns:
+            Any: The shared result.
+        """
+        loop = asyncio.get_running_loop()
+        self._stats["calls"] += 1
+        entry = self._in_flight.get(key)
+        # Tasks belong to one event loop; callers on another loop run their own call.
+        if entry is not None and entry[0] is loop and not entry[1].done() and not entry[1].cancelling():
+            self._stats["coalesced"] += 1
+            task = entry[1]
+        else:
+            self._stats["executions"] += 1
+            task = create_task_without_deadline(fn())
+            self._in_flight[key] = (loop, task)
+            task.add_done_callback(lambda done, key=key: self._forget(key, done))
+        # Shielded: one impatient caller must not cancel the call for everyone else.
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await wait_within_deadline(task)
+        finally:
+            left = self._waiters.get(task, 1) - 1
+            if left:
+                self._waiters[task] = left
+            else:
+                self._waiters.pop(task, None)
+                if not task.done():
+                    task.cancel()  # The last waiter left early; nobody needs the result.
+                    self._stats["abandoned"] += 1
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        entry = self._in_flight.get(key)
+        if entry is not None and entry[1] is task:
+            del self._in_flight[key]
+        self._waiters.pop(task, None)
+        if not task.cancelled():
+            task.exception()  # Mark the exception as retrieved even if every waiter left.
+
+    def stats(self) -> Dict[str, int]:
+        """Returns call, execution, coalesced and abandoned counters and the number of calls in flight."""
+        return dict(self._stats, in_flight=len(self._in_flight))
@@ -0,0 +1,53 @@
+"""
+startup.py
+
+Cold-start milestones of the serving process.
+- Times are measured from when the OS started the process (read from /proc on Linux),
+  so interpreter start-up and every import count.
+- mark(name) records the first time a milestone is reached: agent module imported,
+  warm-up finished, first request received, first answer sent.
+- startup_stats() returns them for /metrics; benchmarks/startup_profile.py adds
+  the import time of each module.
+"""
+
+# --- Imports ---
+import os
+import time
+from typing import Any, Dict
+
+
+def process_start_time() -> float:
+    """Returns the wall-clock time the process started, or now if the OS does not tell."""
+    try:
+        with open("/proc/self/stat", encoding="ascii") as f:
+            # Fields after "pid (comm)"; starttime (clock ticks after boot) is the 20th.
+            started_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime", encoding="ascii") as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - (uptime - started_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError, AttributeError):
+        return time.time()
+
+
+PROCESS_STARTED_AT = process_start_time()
+_milestones: Dict[str, float] = {}
+
+
+def mark(name: str) -> float:
+    """
+    Records a startup milestone the first time it is reached.
+
+    Args:
+        name (str): Milestone, e.g. "agent_imported" or "first_answer".
+
+    Returns:
+        float: Seconds from process start to the (first) milestone.
+    """
+    if name not in _milestones:
+        _milestones[name] = round(time.time() - PROCESS_STARTED_AT, 3)
+    return _milestones[name]
+
+
+def startup_stats() -> Dict[str, Any]:
+    """Returns the process start time and the seconds to each milestone reached so far."""
+    return {"process_started_at": round(PROCESS_STARTED_AT, 3), "milestones_s": dict(_milestones)}
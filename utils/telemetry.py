@@ -0,0 +1,430 @@
+"""
+telemetry.py
+
+Structured tracing of every turn with OpenTelemetry.
+- Records spans for the turn, each agent run and plan step, LLM calls (with token
+  counts), tool calls, HTTP requests (upstream, status, retries) and cache lookups.
+  ADK's own invocation/agent/LLM/tool spans are picked up as well.
+- Writes each finished turn to a local JSONL file, one OTLP/JSON
+  ExportTraceServiceRequest per line (readable by the collector's otlpjsonfile receiver).
+- Summarizes every turn: where the time went, tokens, requests, retries and cache hits.
+"""
+
+# --- Imports ---
+import contextvars
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+from opentelemetry import context as otel_context
+from opentelemetry import trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import ReadableSpan, SpanProcessor, TracerProvider
+
+logger = logging.getLogger(__name__)
+
+# --- Constants ---
+SERVICE_NAME = "multi-agent-system"
+DEFAULT_TELEMETRY_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "telemetry.jsonl")
+# The telemetry file is rotated to '<path>.1' beyond this size.
+DEFAULT_MAX_FILE_BYTES = 50 * 1024 * 1024
+# ADK records whole prompts, responses and tool payloads on its spans; they are
+# only exported with TELEMETRY_CAPTURE_CONTENT=true.
+CONTENT_ATTRIBUTES = (
+    "gcp.vertex.agent.llm_request",
+    "gcp.vertex.agent.llm_response",
+    "gcp.vertex.agent.tool_call_args",
+    "gcp.vertex.agent.tool_response",
+    "gcp.vertex.agent.data",
+)
+
+
+def get_tracer() -> trace.Tracer:
+    """Returns the tracer for this application's spans (a no-op until setup_telemetry runs)."""
+    return trace.get_tracer("multi_agent_system")
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[trace.Span]:
+    """
+    Records a span around a block; exceptions mark it as failed.
+
+    Args:
+        name (str): Span name, e.g. 'http GET'.
+        **attributes: Span attributes; None values are left out.
+
+    Yields:
+        trace.Span: The span, for attributes known only later (e.g. the status code).
+    """
+    with get_tracer().start_as_current_span(name, attributes={k: v for k, v in attributes.items() if v is not None}) as current:
+        yield current
+
+
+def start_span_in(context: contextvars.Context, name: str, **attributes: Any) -> trace.Span:
+    """
+    Starts a span as a child of the current span and makes it the current span
+    inside `context` (e.g. the context a concurrent task runs in). The caller ends it.
+
+    Args:
+        context (contextvars.Context): The context to run under the new span.
+        name (str): Span name.
+        **attributes: Span attributes; None values are left out.
+
+    Returns:
+        trace.Span: The started span.
+    """
+    started = get_tracer().start_span(name, attributes={k: v for k, v in attributes.items() if v is not None})
+    context.run(otel_context.attach, trace.set_span_in_context(started))
+    return started
+
+
+def end_span(ended: trace.Span, error: Optional[str] = None, **attributes: Any):
+    """Sets the final attributes of a span (and an error status if `error` is given) and ends it."""
+    ended.set_attributes({k: v for k, v in attributes.items() if v is not None})
+    if error is not None:
+        ended.set_status(trace.Status(trace.StatusCode.ERROR, error))
+    ended.end()
+
+
+def record_error(failed: trace.Span, error: BaseException):
+    """Marks a span as failed by an exception that was handled (and so not raised through it)."""
+    failed.record_exception(error)
+    failed.set_status(trace.Status(trace.StatusCode.ERROR, type(error).__name__))
+
+
+def annotate(**attributes: Any):
+    """Sets attributes on the current span; None values are left out."""
+    trace.get_current_span().set_attributes({k: v for k, v in attributes.items() if v is not None})
+
+
+def add_event(name: str, **attributes: Any):
+    """Adds an event (e.g. a cache hit) to the current span; None values are left out."""
+    trace.get_current_span().add_event(name, {k: v for k, v in attributes.items() if v is not None})
+
+
+# --- OTLP/JSON Encoding ---
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_otlp_value(v) for v in value]}}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items()]
+
+
+def _llm_usage(attributes: Dict[str, Any]) -> Dict[str, int]:
+    """Reads the token counts of an ADK call_llm span from its recorded response."""
+    try:
+        usage = json.loads(attributes.get("gcp.vertex.agent.llm_response") or "{}").get("usage_metadata") or {}
+    except (TypeError, ValueError):
+        return {}
+    counts = {
+        "gen_ai.usage.input_tokens": usage.get("prompt_token_count"),
+        "gen_ai.usage.output_tokens": usage.get("candidates_token_count"),
+    }
+    return {key: value for key, value in counts.items() if isinstance(value, int)}
+
+
+def span_attributes(span: ReadableSpan, capture_content: bool = False) -> Dict[str, Any]:
+    """
+    Returns a span's attributes for export: LLM token counts are added and, unless
+    capture_content is set, prompts, responses and tool payloads are dropped.
+    """
+    attributes = dict(span.attributes or {})
+    if span.name == "call_llm":
+        attributes.update(_llm_usage(attributes))
+    if not capture_content:
+        for key in CONTENT_ATTRIBUTES:
+            attributes.pop(key, None)
+    return attributes
+
+
+def encode_spans(spans: List[ReadableSpan], capture_content: bool = False) -> Dict[str, Any]:
+    """
+    Encodes spans as an OTLP/JSON ExportTraceServiceRequest.
+
+    Args:
+        spans (List[ReadableSpan]): Finished spans.
+        capture_content (bool): Keep prompt, response and tool payload attributes.
+
+    Returns:
+        Dict[str, Any]: The request, ready for json.dumps.
+    """
+    scopes: Dict[str, List[Dict[str, Any]]] = {}
+    for s in spans:
+        context = s.context
+        encoded = {
+            "traceId": format(context.trace_id, "032x"),
+            "spanId": format(context.span_id, "016x"),
+            "parentSpanId": format(s.parent.span_id, "016x") if s.parent else "",
+            "name": s.name,
+            "kind": s.kind.value + 1,  # OTLP numbers SPAN_KIND_INTERNAL as 1.
+            "startTimeUnixNano": str(s.start_time),
+            "endTimeUnixNano": str(s.end_time),
+            "attributes": _otlp_attributes(span_attributes(s, capture_content)),
+            "events": [
+                {"timeUnixNano": str(e.timestamp), "name": e.name, "attributes": _otlp_attributes(dict(e.attributes or {}))}
+                for e in s.events
+            ],
+            "status": {"code": s.status.status_code.value, "message": s.status.description or ""},
+        }
+        scope = s.instrumentation_scope.name if s.instrumentation_scope else ""
+        scopes.setdefault(scope, []).append(encoded)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes({"service.name": SERVICE_NAME})},
+            "scopeSpans": [{"scope": {"name": name}, "spans": encoded} for name, encoded in scopes.items()],
+        }]
+    }
+
+
+# --- Turn Summaries ---
+def _is_root(span: ReadableSpan) -> bool:
+    return span.parent is None or span.parent.is_remote
+
+
+def _ms(span: ReadableSpan) -> float:
+    return (span.end_time - span.start_time) / 1e6 if span.end_time and span.start_time else 0.0
+
+
+def summarize_turn(spans: List[ReadableSpan]) -> Dict[str, Any]:
+    """
+    Aggregates the spans of one turn.
+
+    Args:
+        spans (List[ReadableSpan]): Every span of the turn's trace.
+
+    Returns:
+        Dict[str, Any]: Turn duration; per-agent run time; LLM calls and tokens per
+        agent; tool calls; HTTP requests, retries and statuses per upstream; plan
+        step outcomes; cache and prefetch hits.
+    """
+    by_id = {s.context.span_id: s for s in spans}
+    root = next((s for s in spans if _is_root(s)), spans[-1])
+
+    def owner(s: ReadableSpan) -> str:
+        # The agent whose run the span belongs to.
+        while s is not None:
+            if s.name.startswith("agent_run ["):
+                return s.name[len("agent_run ["):-1]
+            s = by_id.get(s.parent.span_id) if s.parent else None
+        return ""
+
+    summary: Dict[str, Any] = {
+        "trace_id": format(root.context.trace_id, "032x"),
+        "invocation_id": None,
+        "duration_ms": round(_ms(root), 1),
+        "agents": {},
+        "steps": {},
+        "llm": {"calls": 0, "input_tokens": 0, "output_tokens": 0, "duration_ms": 0.0, "by_agent": {}},
+        "tools": {},
+        "http": {},
+        "cache": {},
+        "prefetch": {},
+        "errors": 0,
+    }
+    for s in spans:
+        attributes = s.attributes or {}
+        summary["invocation_id"] = summary["invocation_id"] or attributes.get("gcp.vertex.agent.invocation_id")
+        if s.status.status_code.value == 2:
+            summary["errors"] += 1
+        if s.name.startswith("agent_run ["):
+            agent = summary["agents"].setdefault(s.name[len("agent_run ["):-1], {"runs": 0, "duration_ms": 0.0})
+            agent["runs"] += 1
+            agent["duration_ms"] = round(agent["duration_ms"] + _ms(s), 1)
+        elif s.name.startswith("plan_step "):
+            summary["steps"][attributes.get("plan.step.key", s.name[len("plan_step "):])] = {
+                "outcome": attributes.get("plan.step.outcome"),
+                "duration_ms": round(_ms(s), 1),
+            }
+        elif s.name == "call_llm":
+            usage = _llm_usage(attributes)
+            llm = summary["llm"]
+            agent = llm["by_agent"].setdefault(owner(s), {"calls": 0, "input_tokens": 0, "output_tokens": 0, "duration_ms": 0.0})
+            for target in (llm, agent):
+                target["calls"] += 1
+                target["input_tokens"] += usage.get("gen_ai.usage.input_tokens", 0)
+                target["output_tokens"] += usage.get("gen_ai.usage.output_tokens", 0)
+                target["duration_ms"] = round(target["duration_ms"] + _ms(s), 1)
+        elif s.name.startswith("execute_tool ") and "gen_ai.tool.name" in attributes:
+            tool = summary["tools"].setdefault(attributes["gen_ai.tool.name"], {"calls": 0, "errors": 0, "duration_ms": 0.0})
+            tool["calls"] += 1
+            tool["errors"] += s.status.status_code.value == 2
+            tool["duration_ms"] = round(tool["duration_ms"] + _ms(s), 1)
+        elif s.name.startswith("http "):
+            http = summary["http"].setdefault(
+                attributes.get("upstream", "?"), {"requests": 0, "retries": 0, "errors": 0, "statuses": {}, "duration_ms": 0.0}
+            )
+            http["requests"] += 1
+            http["retries"] += attributes.get("http.retries", 0)
+            status = attributes.get("http.response.status_code")
+            if status is not None:
+                http["statuses"][str(status)] = http["statuses"].get(str(status), 0) + 1
+            if s.status.status_code.value == 2 or (status or 0) >= 400:
+                http["errors"] += 1
+            http["duration_ms"] = round(http["duration_ms"] + _ms(s), 1)
+        for event in s.events:
+            if event.name in ("cache", "prefetch"):
+                result = (event.attributes or {}).get("result", "?")
+                summary[event.name][result] = summary[event.name].get(result, 0) + 1
+    return summary
+
+
+def format_summary(summary: Dict[str, Any]) -> str:
+    """Returns a one-line human-readable version of a turn summary."""
+    llm = summary["llm"]
+    http_requests = sum(h["requests"] for h in summary["http"].values())
+    retries = sum(h["retries"] for h in summary["http"].values())
+    cache = summary["cache"]
+    slowest = max(summary["steps"].items(), key=lambda item: item[1]["duration_ms"], default=None)
+    parts = [
+        f"📊 Turn {summary['duration_ms']:.0f} ms",
+        f"LLM {llm['calls']} call(s), {llm['input_tokens']} in / {llm['output_tokens']} out tokens, {llm['duration_ms']:.0f} ms",
+        f"tools {sum(t['calls'] for t in summary['tools'].values())}",
+        f"HTTP {http_requests} ({retries} retries)",
+        f"cache {cache.get('hit', 0) + cache.get('stale', 0)}/{sum(cache.values())} hits",
+    ]
+    if slowest is not None:
+        parts.append(f"slowest step {slowest[0]} {slowest[1]['duration_ms']:.0f} ms ({slowest[1]['outcome']})")
+    return " | ".join(parts)
+
+
+# --- Span Processor ---
+class TurnRecorder(SpanProcessor):
+    """
+    Buffers the spans of each trace (one turn) and, when its root span ends,
+    writes them as one OTLP/JSON line and records the turn summary (also
+    appended to '<path stem>-turns.jsonl').
+
+    Spans that end after their turn was written (e.g. background cache refreshes)
+    are written on their own line.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = DEFAULT_TELEMETRY_PATH,
+        capture_content: bool = False,
+        max_file_bytes: int = DEFAULT_MAX_FILE_BYTES,
+        max_open_traces: int = 256,
+        keep_summaries: int = 100,
+        log_summaries: bool = True,
+    ):
+        """
+        Args:
+            path (Optional[str]): JSONL file; None keeps summaries in memory only.
+            capture_content (bool): Export prompts, responses and tool payloads too.
+            max_file_bytes (int): Size at which the file is rotated to '<path>.1'.
+            max_open_traces (int): Unfinished traces kept; the oldest is written beyond this.
+            keep_summaries (int): Turn summaries kept for turn_summaries().
+            log_summaries (bool): Log a one-line summary (INFO) after every turn.
+        """
+        self.path = path
+        self.capture_content = capture_content
+        self.max_file_bytes = max_file_bytes
+        self.max_open_traces = max_open_traces
+        self.log_summaries = log_summaries
+        self.summaries: Deque[Dict[str, Any]] = deque(maxlen=keep_summaries)
+        self._traces: "OrderedDict[int, List[ReadableSpan]]" = OrderedDict()
+        self._finished: "OrderedDict[int, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def on_end(self, span: ReadableSpan):
+        trace_id = span.context.trace_id
+        with self._lock:
+            if trace_id in self._finished:
+                self._write([span])  # Outlived its turn.
+                return
+            buffered = self._traces.get(trace_id)
+            if buffered is None:
+                buffered = self._traces[trace_id] = []
+                while len(self._traces) > self.max_open_traces:
+                    _, stale = self._traces.popitem(last=False)
+                    self._write(stale)
+            buffered.append(span)
+            if not _is_root(span):
+                return
+            spans = self._traces.pop(trace_id)
+            self._finished[trace_id] = None
+            while len(self._finished) > self.max_open_traces:
+                self._finished.popitem(last=False)
+            self._write(spans)
+        summary = summarize_turn(spans)
+        self.summaries.append(summary)
+        if self.path:
+            self._append(os.path.splitext(self.path)[0] + "-turns.jsonl", json.dumps(summary, separators=(",", ":")))
+        if self.log_summaries:
+            logger.info(format_summary(summary))
+
+    def _write(self, spans: List[ReadableSpan]):
+        if self.path and spans:
+            self._append(self.path, json.dumps(encode_spans(spans, self.capture_content), separators=(",", ":")))
+
+    def _append(self, path: str, line: str):
+        try:
+            if os.path.exists(path) and os.path.getsize(path) > self.max_file_bytes:
+                os.replace(path, path + ".1")
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            logger.warning("Could not write telemetry to %s: %s", path, e)
+
+    def shutdown(self):
+        with self._lock:
+            for spans in self._traces.values():
+                self._write(spans)
+            self._traces.clear()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return True
+
+
+# --- Setup ---
+_recorder: Optional[TurnRecorder] = None
+
+
+def setup_telemetry() -> Optional[TurnRecorder]:
+    """
+    Starts recording spans, configured from the environment:
+    TELEMETRY ('false' disables it), TELEMETRY_PATH (JSONL file; an empty value
+    keeps summaries in memory only) and TELEMETRY_CAPTURE_CONTENT.
+
+    Installs a TracerProvider unless one is already set (e.g. by `adk web
+    --trace_to_cloud`), in which case the recorder is added to it. Safe to call
+    more than once.
+
+    Returns:
+        Optional[TurnRecorder]: The recorder, or None if telemetry is disabled.
+    """
+    global _recorder
+    if _recorder is not None:
+        return _recorder
+    if os.getenv("TELEMETRY", "true").lower() in ("0", "false", "no", "off"):
+        return None
+    _recorder = TurnRecorder(
+        path=os.getenv("TELEMETRY_PATH", DEFAULT_TELEMETRY_PATH) or None,
+        capture_content=os.getenv("TELEMETRY_CAPTURE_CONTENT", "false").lower() in ("1", "true", "yes", "on"),
+    )
+    provider = trace.get_tracer_provider()
+    if not hasattr(provider, "add_span_processor"):
+        provider = TracerProvider(resource=Resource.create({"service.name": SERVICE_NAME}))
+        trace.set_tracer_provider(provider)
+    provider.add_span_processor(_recorder)
+    return _recorder
+
+
+def turn_summaries() -> List[Dict[str, Any]]:
+    """Returns the summaries of the most recent turns, oldest first."""
+    return list(_recorder.summaries) if _recorder is not None else []
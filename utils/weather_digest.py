@@ -0,0 +1,170 @@
+"""
+weather_digest.py
+
+Vectorized reduction of open-meteo forecasts into a compact launch-weather digest.
+- Computes min/max/mean for every hourly variable in one NumPy pass.
+- Extracts the worst-case conditions in a window around the launch time.
+- Flags gusts, precipitation probability and cloud cover above launch thresholds.
+- Slices multi-day or multi-location forecasts down to the single day a launch needs.
+"""
+
+# --- Imports ---
+import warnings
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# --- Constants ---
+# For each hourly variable, which extreme is the worst case for a launch.
+WORST_CASE = {
+    "temperature_2m": "min",
+    "precipitation_probability": "max",
+    "precipitation": "max",
+    "cloudcover": "max",
+    "visibility": "min",
+    "wind_speed_10m": "max",
+    "wind_direction_10m": None,  # Not meaningful as an extreme
+    "wind_gusts_10m": "max",
+}
+
+# Threshold flags: variable, comparison and limit (open-meteo default units).
+DEFAULT_THRESHOLDS = {
+    "high_wind_gusts": ("wind_gusts_10m", ">=", 50.0),            # km/h
+    "precipitation_likely": ("precipitation_probability", ">=", 40.0),  # %
+    "heavy_cloud_cover": ("cloudcover", ">=", 75.0),              # %
+}
+
+
+def _round(value: float, digits: int = 1) -> Optional[float]:
+    return None if value is None or np.isnan(value) else round(float(value), digits)
+
+
+def _local_launch_time(launch_time: str, utc_offset_seconds: int) -> Optional[np.datetime64]:
+    """Converts a UTC ISO launch time to the forecast's local time, as open-meteo reports it."""
+    try:
+        parsed = datetime.fromisoformat(launch_time.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None) + timedelta(seconds=utc_offset_seconds)
+    return np.datetime64(parsed, "m")
+
+
+def slice_forecast(forecast: Dict[str, Any], date: str) -> Dict[str, Any]:
+    """
+    Restricts a forecast covering several days to a single day.
+
+    Parameters:
+    - forecast (Dict[str, Any]): Raw open-meteo response for one location.
+    - date (str): Day to keep, in 'YYYY-MM-DD' format.
+
+    Returns:
+    - Dict[str, Any]: The same response with only that day's hourly and daily values.
+    """
+    sliced = dict(forecast)
+    for block in ("hourly", "daily"):
+        values = forecast.get(block) or {}
+        times = values.get("time") or []
+        keep = [i for i, t in enumerate(times) if str(t)[:10] == date]
+        sliced[block] = {
+            k: [v[i] for i in keep] if isinstance(v, list) and len(v) == len(times) else v
+            for k, v in values.items()
+        }
+    return sliced
+
+
+def summarize_forecast(
+    forecast: Dict[str, Any],
+    launch_time: Optional[str] = None,
+    window_hours: int = 3,
+    thresholds: Optional[Dict[str, tuple]] = None,
+) -> Dict[str, Any]:
+    """
+    Reduces a raw open-meteo forecast to a compact digest for prompts.
+
+    Parameters:
+    - forecast (Dict[str, Any]): Raw open-meteo response with 'hourly' and 'daily' blocks.
+    - launch_time (Optional[str]): Launch time in ISO 8601 (UTC); the window is centred on it.
+      Without it the whole forecast period is used as the window.
+    - window_hours (int): Hours on each side of the launch time included in the window.
+    - thresholds (Optional[Dict[str, tuple]]): Overrides DEFAULT_THRESHOLDS.
+
+    Returns:
+    - Dict[str, Any]: Location, units, per-variable min/max/mean, daily values,
+      the launch window's worst-case values and the threshold flags.
+    """
+    thresholds = DEFAULT_THRESHOLDS if thresholds is None else thresholds
+    hourly = forecast.get("hourly") or {}
+    times = hourly.get("time") or []
+    names: List[str] = [k for k, v in hourly.items() if k != "time" and isinstance(v, list) and len(v) == len(times)]
+
+    digest: Dict[str, Any] = {
+        "location": {
+            "latitude": forecast.get("latitude"),
+            "longitude": forecast.get("longitude"),
+            "timezone": forecast.get("timezone"),
+        },
+        "period": [times[0], times[-1]] if times else [],
+        "units": {k: v for k, v in (forecast.get("hourly_units") or {}).items() if k in names},
+        "daily": {k: v[0] if isinstance(v, list) and len(v) == 1 else v for k, v in (forecast.get("daily") or {}).items() if k != "time"},
+    }
+    if not names:
+        digest.update({"variables": {}, "launch_window": None, "flags": {}})
+        return digest
+
+    # One (variables x hours) matrix; missing values become NaN.
+    values = np.array([hourly[name] for name in names], dtype=float)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # All-NaN rows simply yield NaN
+        mins = np.nanmin(values, axis=1)
+        maxs = np.nanmax(values, axis=1)
+        means = np.nanmean(values, axis=1)
+    digest["variables"] = {
+        name: {"min": _round(mins[i]), "max": _round(maxs[i]), "mean": _round(means[i])}
+        for i, name in enumerate(names)
+    }
+
+    # Launch window: hours within +/- window_hours of the launch time.
+    hour_stamps = np.array(times, dtype="datetime64[m]")
+    window = np.ones(len(times), dtype=bool)
+    center = _local_launch_time(launch_time, forecast.get("utc_offset_seconds") or 0) if launch_time else None
+    if center is not None:
+        distance = np.abs(hour_stamps - center).astype("timedelta64[m]").astype(int)
+        window = distance <= window_hours * 60
+        if not window.any():
+            window = np.ones(len(times), dtype=bool)
+            center = None
+
+    window_values = values[:, window]
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        window_max = np.nanmax(window_values, axis=1)
+        window_min = np.nanmin(window_values, axis=1)
+    worst: Dict[str, Optional[float]] = {}
+    for i, name in enumerate(names):
+        direction = WORST_CASE.get(name, "max")
+        if direction is not None:
+            worst[name] = _round(window_max[i] if direction == "max" else window_min[i])
+    window_times = [times[i] for i in np.flatnonzero(window)]
+    digest["launch_window"] = {
+        "center": str(center) if center is not None else None,
+        "hours": [window_times[0], window_times[-1]],
+        "worst": worst,
+    }
+
+    # Threshold flags over the launch window, with the hours that exceed them.
+    flags: Dict[str, Any] = {}
+    index = {name: i for i, name in enumerate(names)}
+    for flag, (name, op, limit) in thresholds.items():
+        if name not in index:
+            continue
+        series = window_values[index[name]]
+        hit = series >= limit if op == ">=" else series <= limit
+        flags[flag] = {
+            "triggered": bool(hit.any()),
+            "limit": limit,
+            "hours": [window_times[i][-5:] for i in np.flatnonzero(hit)],
+        }
+    digest["flags"] = flags
+    return digest